@@ -5,28 +5,55 @@
 from __future__ import annotations
 
 import argparse
+import bisect
+import cProfile
+import ctypes
+import fnmatch
+import functools
 import getpass
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
 import json
 import logging
+import math
 import os
+import platform
+import posixpath
+import pstats
+import random
+import re
+import select
+import selectors
 import signal
 import socket
 import sqlite3
+import struct
+import sys
 import threading
 import tempfile
+import time
+import traceback
+import tracemalloc
+import zlib
+from collections import Counter, OrderedDict, deque
 from datetime import datetime, timedelta, timezone
 
-from typing import Any, Callable, Dict, List, Optional, Set
+from typing import Any, Callable, Deque, Dict, IO, Iterable, Iterator, List, Optional, Sequence, Set
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from subprocess import CompletedProcess, TimeoutExpired, run
+from subprocess import PIPE, Popen, TimeoutExpired, run
 
 try:
     import grp
     import pwd
+    import resource
 except ImportError:  # pragma: no cover - non-POSIX systems
     grp = None  # type: ignore
     pwd = None  # type: ignore
+    resource = None  # type: ignore
 from urllib.parse import parse_qs, urlparse, urlsplit, urlunsplit, unquote
 
 ###############################################################################
@@ -39,15 +66,163 @@ DEFAULT_HOST = "0.0.0.0"
 DEFAULT_PORT = 28256
 DEFAULT_SOCKET_PATH = os.path.join(ROOT_DIR, "fn-scheduler.sock")
 DEFAULT_DB_PATH = os.path.join(ROOT_DIR, "scheduler.db")
-DB_LATEST_VERSION = 2
+DB_LATEST_VERSION = 13
 
 TASK_TIMEOUT = int(os.environ.get("SCHEDULER_TASK_TIMEOUT", "900"))
 CONDITION_TIMEOUT = int(os.environ.get("SCHEDULER_CONDITION_TIMEOUT", "60"))
+PROBE_TYPES = {"path_exists", "path_changed", "disk_free", "process", "port_open", "load", "pressure"}
+PROBE_MAX_DEPTH = 8
+PROBE_MAX_NODES = 64
+# /proc/<pid>/comm 被内核截断到 15 个字符，更长的进程名改为与 argv[0] 的文件名比较
+PROCESS_COMM_MAX = 15
+# 相同条件脚本（规范化文本 + 账户）的检查结果在该时长内共享，实际有效期不超过订阅任务的检查间隔
+CONDITION_CACHE_TTL = float(os.environ.get("SCHEDULER_CONDITION_CACHE_TTL", "30"))
+SPAWN_RATE = float(os.environ.get("SCHEDULER_SPAWN_RATE", "10"))
+SPAWN_BURST = int(os.environ.get("SCHEDULER_SPAWN_BURST", "10"))
+MAX_SPLAY_SECONDS = 3600
+TRIGGER_TYPES = {"schedule", "event", "interval"}
+# interval 任务每 N 秒触发一次，与秒级 cron 一起由 PreciseTimer 按单调时钟驱动
+MIN_INTERVAL_SECONDS = 1
+MAX_INTERVAL_SECONDS = 366 * 24 * 3600
+# /api/schedule/forecast 的窗口与输出上限
+FORECAST_MAX_DAYS = 31
+FORECAST_DEFAULT_LIMIT = 1000
+FORECAST_MAX_LIMIT = 10000
+# 并发预测中需逐一展开的时间点上限（整天按日汇总，相同时刻只算一次）
+FORECAST_MAX_EVENTS = 2_000_000
+FORECAST_MODES = ("list", "task", "hour")
+# /api/debug 剖析参数上限
+DEBUG_PROFILE_MODES = ("cprofile", "sample")
+DEBUG_PROFILE_MAX_SECONDS = 300
+DEBUG_SAMPLE_INTERVAL = 0.01
+DEBUG_TRACEMALLOC_KEYS = ("lineno", "filename", "traceback")
+# --simulate 中没有历史运行记录的任务采用的运行时长（秒）
+SIMULATE_DEFAULT_DURATION = 1.0
+# 系统压力阈值（PSI "some avg10" 百分比与每核 1 分钟负载），0 表示不检查
+PRESSURE_CPU_MAX = float(os.environ.get("SCHEDULER_PRESSURE_CPU_MAX", "60"))
+PRESSURE_IO_MAX = float(os.environ.get("SCHEDULER_PRESSURE_IO_MAX", "40"))
+PRESSURE_MEMORY_MAX = float(os.environ.get("SCHEDULER_PRESSURE_MEMORY_MAX", "20"))
+LOADAVG_PER_CPU_MAX = float(os.environ.get("SCHEDULER_LOADAVG_PER_CPU_MAX", "2.0"))
+DEFAULT_MAX_DEFER_SECONDS = 3600
+# 未真正运行的记录（压力推迟、关机时未启动），不计入最近一次运行结果与依赖检查
+UNSTARTED_STATUSES = ("deferred", "skipped")
+CONCURRENCY_POLICIES = {"skip", "queue", "replace", "parallel"}
+MAX_CONCURRENCY_LIMIT = 100
+# 任务可引用的调度优先级配置；任务上单独设置的字段优先于配置中的值
+PRIORITY_PROFILES: Dict[str, Dict[str, Any]] = {
+    "background": {"nice": 10, "ioprio_class": "idle", "sched_policy": "idle"},
+    "interactive": {"nice": 0, "ioprio_class": "best-effort", "ioprio_level": 0, "sched_policy": "other"},
+}
+SCHED_POLICIES = {"other": "SCHED_OTHER", "batch": "SCHED_BATCH", "idle": "SCHED_IDLE"}
+IOPRIO_CLASSES = {"best-effort": 2, "idle": 3}
+# ioprio_set 没有 libc 封装，按架构取系统调用号
+IOPRIO_SET_SYSCALLS = {
+    "x86_64": 251,
+    "amd64": 251,
+    "i386": 289,
+    "i686": 289,
+    "aarch64": 30,
+    "arm64": 30,
+    "riscv64": 30,
+    "armv7l": 314,
+    "armv6l": 314,
+    "mips": 4284,
+    "mips64": 5273,
+}
+TASK_KILL_GRACE = int(os.environ.get("SCHEDULER_TASK_KILL_GRACE", "10"))
+# 关机事件任务的总时限，需小于 cmd/main 中 300 秒的 SIGKILL 兜底，留出排空与清理的时间
+SHUTDOWN_DEADLINE = float(os.environ.get("SCHEDULER_SHUTDOWN_DEADLINE", "240"))
+HTTP_DRAIN_TIMEOUT = float(os.environ.get("SCHEDULER_HTTP_DRAIN_TIMEOUT", "10"))
+# 主循环心跳超过该秒数视为停滞：/api/health/live 返回 503，看门狗记录各线程栈
+LOOP_STALL_SECONDS = float(os.environ.get("SCHEDULER_LOOP_STALL_SECONDS", "30"))
+WATCHDOG_INTERVAL = 5.0
+HEALTH_DB_TIMEOUT = 2.0
+# SIGHUP 热重启时，旧进程通过该环境变量把交接状态文件的描述符传给 exec 后的新进程
+HANDOVER_FD_ENV = "SCHEDULER_HANDOVER_FD"
+OUTPUT_READ_SIZE = 64 * 1024
+# 流水线任务：各阶段为已有任务或内联脚本，相邻阶段以管道直接相连
+PIPELINE_MAX_STAGES = 16
+# tasks 表中由 _prepare_task_payload 产生、随创建/更新写入的列
+TASK_COLUMNS = (
+    "name",
+    "account",
+    "trigger_type",
+    "schedule_expression",
+    "interval_seconds",
+    "condition_script",
+    "condition_probe",
+    "condition_interval",
+    "event_type",
+    "event_name",
+    "mount_filter",
+    "is_active",
+    "pre_task_ids",
+    "script_body",
+    "pipeline_stages",
+    "splay_seconds",
+    "is_deferrable",
+    "max_defer_seconds",
+    "concurrency_policy",
+    "concurrency_limit",
+    "timeout_seconds",
+    "rlimit_as_mb",
+    "rlimit_cpu_seconds",
+    "rlimit_nofile",
+    "priority_profile",
+    "nice",
+    "ioprio_class",
+    "ioprio_level",
+    "sched_policy",
+    "cpu_affinity",
+    "last_run_at",
+    "next_run_at",
+    "last_condition_check_at",
+)
 MAX_LOOKAHEAD_MINUTES = 60 * 24 * 366  # one leap year
 EVENT_TYPE_SCRIPT = "script"
 EVENT_TYPE_BOOT = "system_boot"
 EVENT_TYPE_SHUTDOWN = "system_shutdown"
-EVENT_TYPES = {EVENT_TYPE_SCRIPT, EVENT_TYPE_BOOT, EVENT_TYPE_SHUTDOWN}
+EVENT_TYPE_NAMED = "named"
+EVENT_TYPE_MOUNT = "mount"
+EVENT_TYPES = {EVENT_TYPE_SCRIPT, EVENT_TYPE_BOOT, EVENT_TYPE_SHUTDOWN, EVENT_TYPE_NAMED, EVENT_TYPE_MOUNT}
+# 命名事件：POST /api/events/{name} 触发订阅该事件的任务，载荷经环境变量与 stdin 传给脚本
+EVENT_TRIGGER_PREFIX = "event:"
+EVENT_NAME_MAX_LENGTH = 64
+EVENT_PAYLOAD_MAX = 32 * 1024
+# 挂载事件：挂载表变化时内核对 mountinfo 发出 POLLPRI/POLLERR
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+DISK_LABEL_DIR = "/dev/disk/by-label"
+MOUNT_FILTER_FIELDS = ("mountpoint", "fstype", "source", "label")
+MOUNT_ACTIONS = {"mount", "unmount", "both"}
+FS_LIST_CACHE_TTL = float(os.environ.get("SCHEDULER_FS_LIST_CACHE_TTL", "5"))
+FS_LIST_CACHE_SIZE = 8
+FS_LIST_MAX_LIMIT = 5000
+FS_WRITE_CHUNK_SIZE = 64 * 1024
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get("SCHEDULER_HTTP_KEEPALIVE_TIMEOUT", "15"))
+HTTP_COMPRESS_MIN_SIZE = int(os.environ.get("SCHEDULER_HTTP_COMPRESS_MIN_SIZE", "1024"))
+HTTP_COMPRESS_LEVEL = 6
+STATIC_MIME_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".htm": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+    ".json": "application/json; charset=utf-8",
+    ".svg": "image/svg+xml",
+    ".txt": "text/plain; charset=utf-8",
+    ".xml": "application/xml; charset=utf-8",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".ico": "image/x-icon",
+    ".woff2": "font/woff2",
+}
+RESPONSE_CACHE_SIZE = 64
+STATIC_COMPRESSIBLE_EXTS = {".html", ".htm", ".css", ".js", ".json", ".svg", ".txt", ".xml"}
+STATIC_PAGE_EXTS = {".html", ".htm"}
+STATIC_VERSION_LENGTH = 12
+# 页面中引用本地资源的位置：href/src 属性、静态 import 与动态 import()
+STATIC_ASSET_REF_RE = re.compile(r"""(\b(?:href|src)\s*=\s*|\bfrom\s+|\bimport\s*\(\s*)(["'])([^"'?#:\s]+)\2""")
 
 def _detect_default_account() -> str:
     for env_key in ("SCHEDULER_DEFAULT_ACCOUNT", "USERNAME", "USER"):
@@ -90,14 +265,74 @@ logging.basicConfig(
 )
 
 
+def _load_priority_profiles(raw: Optional[str]) -> None:
+    """Merge SCHEDULER_PRIORITY_PROFILES over the built-in profiles; bad input keeps the defaults."""
+
+    if not raw:
+        return
+    try:
+        profiles = json.loads(raw)
+    except json.JSONDecodeError as exc:
+        logger.warning("Ignoring SCHEDULER_PRIORITY_PROFILES: invalid JSON (%s)", exc)
+        return
+    if not isinstance(profiles, dict) or not all(
+        isinstance(name, str) and isinstance(profile, dict) for name, profile in profiles.items()
+    ):
+        logger.warning("Ignoring SCHEDULER_PRIORITY_PROFILES: expected an object of profile objects")
+        return
+    PRIORITY_PROFILES.update(profiles)
+
+
+_load_priority_profiles(os.environ.get("SCHEDULER_PRIORITY_PROFILES"))
+
+
+class SystemClock:
+    """Wall-clock and monotonic time of the host."""
+
+    @staticmethod
+    def now() -> datetime:
+        IS_LOCAL_TIME = True
+        if IS_LOCAL_TIME:
+            # 返回本地时间（无时区信息，和服务器系统时间一致）
+            return datetime.now()
+        else:
+            # 带时区信息的 UTC 时间
+            return datetime.now(timezone.utc)
+
+    @staticmethod
+    def monotonic() -> float:
+        return time.monotonic()
+
+
+class VirtualClock:
+    """Clock that only moves when advanced; drives ``--simulate``."""
+
+    def __init__(self, start: datetime):
+        self._origin = start
+        self._now = start
+
+    def now(self) -> datetime:
+        return self._now
+
+    def monotonic(self) -> float:
+        return (self._now - self._origin).total_seconds()
+
+    def advance_to(self, moment: datetime) -> None:
+        if moment > self._now:
+            self._now = moment
+
+
+# 调度判断所用的时钟；模拟模式下替换为 VirtualClock
+CLOCK: Any = SystemClock()
+
+
+def install_clock(clock: Any) -> None:
+    global CLOCK  # pylint: disable=global-statement
+    CLOCK = clock
+
+
 def time_now() -> datetime:
-    IS_LOCAL_TIME = True
-    if IS_LOCAL_TIME:
-        # 返回本地时间（无时区信息，和服务器系统时间一致）
-        return datetime.now()
-    else:
-        # 带时区信息的 UTC 时间
-        return datetime.now(timezone.utc)
+    return CLOCK.now()
 
 
 def isoformat(dt: Optional[datetime]) -> Optional[str]:
@@ -121,6 +356,41 @@ def parse_iso(value: Optional[str]) -> Optional[datetime]:
         return None
 
 
+def file_etag(st: os.stat_result) -> str:
+    """Return a strong validator for a file derived from its mtime and size."""
+
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick ``gzip`` or ``deflate`` from an Accept-Encoding header, honouring q=0."""
+
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for candidate in ("gzip", "deflate"):
+        quality = accepted.get(candidate, accepted.get("*", 0.0))
+        if quality > 0:
+            return candidate
+    return None
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=HTTP_COMPRESS_LEVEL, mtime=0)
+    return zlib.compress(body, HTTP_COMPRESS_LEVEL)
+
+
 def list_allowed_accounts() -> List[str]:
     """Return distinct account names whose primary or supplemental group is allowed."""
 
@@ -171,8 +441,12 @@ def ensure_account_allowed(account: str) -> str:
 ###############################################################################
 
 class CronExpression:
-    """Minimal 5-field cron parser supporting ranges, lists, and steps."""
+    """Minimal 5-field cron parser supporting ranges, lists, and steps.
 
+    An optional leading sixth field selects seconds (``*/10 * * * * *``).
+    """
+
+    SECOND_SPEC = ("second", 0, 59, 60)
     FIELD_SPECS = (
         ("minute", 0, 59, 60),
         ("hour", 0, 23, 24),
@@ -183,10 +457,17 @@ class CronExpression:
 
     def __init__(self, expression: str):
         parts = expression.split()
-        if len(parts) != 5:
-            raise ValueError("Cron expression must contain 5 fields")
+        if len(parts) not in (5, 6):
+            raise ValueError("Cron expression must contain 5 or 6 fields")
+        # 秒字段为空表示传统的分钟精度（在第 0 秒触发）
+        self.seconds: Optional[List[int]] = None
+        if len(parts) == 6:
+            self.seconds, _ = self._expand_field(parts[0], self.SECOND_SPEC)
+            parts = parts[1:]
         self.fields: List[List[int]] = []
         self._wildcards: List[bool] = []
+        self._day_offsets: Optional[List[int]] = None
+        self._min_gap: Optional[int] = None
         for part, spec in zip(parts, self.FIELD_SPECS):
             expanded, wildcard = self._expand_field(part, spec)
             self.fields.append(expanded)
@@ -241,19 +522,56 @@ class CronExpression:
             return list(range(start, end + 1))
         raise ValueError("Unsupported cron token")
 
+    @property
+    def has_seconds(self) -> bool:
+        return self.seconds is not None
+
     def next_after(self, moment: datetime) -> datetime:
-        base = moment.replace(second=0, microsecond=0)
-        candidate = base
-        for _ in range(MAX_LOOKAHEAD_MINUTES):
-            candidate += timedelta(minutes=1)
-            if self._matches(candidate):
-                return candidate
+        # 分钟精度从下一分钟起找，秒级从下一秒起找；逐日判断日历，当天内二分查找
+        if self.seconds is not None:
+            lower = moment.replace(microsecond=0) + timedelta(seconds=1)
+        else:
+            lower = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = lower.replace(hour=0, minute=0, second=0)
+        threshold = int((lower - day).total_seconds())
+        day_offsets = self.day_offsets()
+        every_day = self._wildcards[2] and self._wildcards[3] and self._wildcards[4]
+        for index in range(MAX_LOOKAHEAD_MINUTES // 1440 + 1):
+            current = day + timedelta(days=index) if index else day
+            if every_day or (
+                current.month in self.fields[3] and self._calendar_matches(current.day, current.weekday())
+            ):
+                position = bisect.bisect_left(day_offsets, threshold if index == 0 else 0)
+                if position < len(day_offsets):
+                    return current + timedelta(seconds=day_offsets[position])
         raise ValueError("Unable to compute next run within lookahead window")
 
-    def _matches(self, candidate: datetime) -> bool:
-        minute, hour = candidate.minute, candidate.hour
-        day, month = candidate.day, candidate.month
-        weekday = candidate.weekday()
+    def day_offsets(self) -> List[int]:
+        """Sorted seconds after midnight at which the expression fires on a matching day."""
+
+        if self._day_offsets is None:
+            seconds = self.seconds if self.seconds is not None else [0]
+            self._day_offsets = [
+                hour * 3600 + minute * 60 + second for hour in self.fields[1] for minute in self.fields[0] for second in seconds
+            ]
+        return self._day_offsets
+
+    def min_gap(self) -> int:
+        """Smallest distance in seconds between two consecutive slots of a day, across midnight."""
+
+        if self._min_gap is None:
+            offsets = self.day_offsets()
+            gaps = [later - earlier for earlier, later in zip(offsets, offsets[1:])]
+            gaps.append(86400 - offsets[-1] + offsets[0])
+            self._min_gap = min(gaps)
+        return self._min_gap
+
+    def matches_day(self, month: int, day: int, weekday: int) -> bool:
+        # 日、月、星期均为通配时每天都匹配，跳过日历判断
+        every_day = self._wildcards[2] and self._wildcards[3] and self._wildcards[4]
+        return every_day or (month in self.fields[3] and self._calendar_matches(day, weekday))
+
+    def _calendar_matches(self, day: int, weekday: int) -> bool:
         dom_match = day in self.fields[2]
         dow_match = weekday in self.fields[4]
         dom_wildcard = self._wildcards[2]
@@ -267,8 +585,636 @@ class CronExpression:
             calendar_ok = dom_match
         else:
             calendar_ok = dom_match or dow_match
+        return calendar_ok
+
+    def _matches(self, candidate: datetime) -> bool:
+        return (
+            candidate.minute in self.fields[0]
+            and candidate.hour in self.fields[1]
+            and candidate.month in self.fields[3]
+            and self._calendar_matches(candidate.day, candidate.weekday())
+        )
+
+
+@functools.lru_cache(maxsize=64)
+def calendar_days(first_day: datetime, count: int) -> tuple[tuple[int, int, int], ...]:
+    """``(month, day, weekday)`` of ``count`` consecutive days from midnight ``first_day``."""
+
+    days = []
+    for index in range(count):
+        moment = first_day + timedelta(days=index)
+        days.append((moment.month, moment.day, moment.weekday()))
+    return tuple(days)
+
+
+def splay_offset(key: str, splay_seconds: int, window: int = 0) -> int:
+    """Deterministic per-task delay in ``[0, splay_seconds]`` derived from ``key``.
+
+    A positive ``window`` (the smallest gap between two schedule slots) caps
+    the delay below it, so a splayed run never passes the next slot.
+    """
+
+    if window > 0:
+        splay_seconds = min(splay_seconds, window - 1)
+    if splay_seconds <= 0:
+        return 0
+    return zlib.crc32(key.encode("utf-8")) % (splay_seconds + 1)
+
+
+def task_splay_offset(task: Dict[str, Any]) -> int:
+    splay_seconds = int(task.get("splay_seconds") or 0)
+    if splay_seconds <= 0:
+        return 0
+    window = 0
+    if task.get("trigger_type") == "schedule" and task.get("schedule_expression"):
+        window = parse_cron(task["schedule_expression"]).min_gap()
+    return splay_offset(task.get("name") or "", splay_seconds, window)
+
+
+def timer_driven(task: Dict[str, Any]) -> bool:
+    """Whether ``task`` is fired by :class:`PreciseTimer` rather than the 1s loop."""
+
+    if task.get("trigger_type") == "interval":
+        return True
+    return task.get("trigger_type") == "schedule" and len((task.get("schedule_expression") or "").split()) == 6
+
+
+def next_fire_time(cron: CronExpression, base: datetime, offset: int = 0) -> datetime:
+    """Next cron slot shifted by ``offset`` seconds that falls after ``base``.
+
+    The slot is searched from ``base - offset`` so a run fired at
+    ``slot + offset`` schedules the following slot rather than itself.
+    """
+
+    if offset <= 0:
+        return cron.next_after(base)
+    return cron.next_after(base - timedelta(seconds=offset)) + timedelta(seconds=offset)
+
+
+def parse_cpu_list(text: str) -> Set[int]:
+    """Parse a CPU list such as ``0-2,5`` into a set of CPU ids."""
+
+    cpus: Set[int] = set()
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            if "-" in item:
+                start_str, end_str = item.split("-", 1)
+                start, end = int(start_str), int(end_str)
+                if start > end:
+                    raise ValueError
+                cpus.update(range(start, end + 1))
+            else:
+                cpus.add(int(item))
+        except ValueError as exc:
+            raise ValueError(f"invalid cpu_affinity segment: {item}") from exc
+    if not cpus:
+        raise ValueError("cpu_affinity is empty")
+    cpu_count = os.cpu_count() or 1
+    if min(cpus) < 0 or max(cpus) >= cpu_count:
+        raise ValueError(f"cpu_affinity must only contain CPUs 0-{cpu_count - 1}")
+    return cpus
+
+
+def format_cpu_list(cpus: Set[int]) -> str:
+    return ",".join(str(cpu) for cpu in sorted(cpus))
+
+
+def validate_event_name(name: str) -> str:
+    if not name:
+        raise ValueError("event name is required")
+    if len(name) > EVENT_NAME_MAX_LENGTH or not all(ch.isascii() and (ch.isalnum() or ch in "._:-") for ch in name):
+        raise ValueError(f"event name must be 1-{EVENT_NAME_MAX_LENGTH} characters of letters, digits, '.', '_', ':' or '-'")
+    return name
+
+
+def event_environment(name: str, payload: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Environment passed to a run triggered by named event ``name``."""
+
+    env: Dict[str, str] = {}
+    for key, value in (payload or {}).items():
+        if isinstance(value, (str, int, float, bool)):
+            suffix = "".join(ch if ch.isascii() and ch.isalnum() else "_" for ch in str(key)).upper()
+            # 只由标点组成的键得不到有意义的变量名，直接跳过
+            if suffix.strip("_"):
+                env[f"SCHEDULER_EVENT_{suffix}"] = str(value).lower() if isinstance(value, bool) else str(value)
+    # 保留变量最后写入，不会被同名的 payload 键覆盖
+    env["SCHEDULER_EVENT"] = name
+    env["SCHEDULER_EVENT_PAYLOAD"] = json.dumps(payload or {})
+    return env
+
+
+def parse_mount_filter(value: Any) -> Dict[str, str]:
+    """Validate a mount event filter: ``on`` plus glob patterns for the mount fields."""
+
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError as exc:
+            raise ValueError("mount_filter format error") from exc
+    if not isinstance(value, dict):
+        raise ValueError("mount event tasks require a mount_filter object")
+    action = value.get("on") or "mount"
+    if action not in MOUNT_ACTIONS:
+        raise ValueError("mount_filter 'on' must be mount, unmount or both")
+    cleaned = {"on": action}
+    for key in MOUNT_FILTER_FIELDS:
+        pattern = value.get(key)
+        if pattern not in (None, ""):
+            cleaned[key] = str(pattern)
+    if len(cleaned) == 1:
+        raise ValueError(f"mount_filter requires at least one of {', '.join(MOUNT_FILTER_FIELDS)}")
+    return cleaned
+
+
+def parse_condition_probe(value: Any) -> Optional[Dict[str, Any]]:
+    """Validate a declarative condition probe (dict or JSON text); empty means none.
+
+    Leaf probes: ``path_exists``/``path_changed`` (``path``), ``disk_free``
+    (``path`` plus ``below``/``above`` percent), ``process`` (``name`` and/or
+    ``cmdline`` glob), ``port_open`` (``port``), ``load`` and ``pressure``
+    (``resource``) with ``below``/``above``. ``all``/``any`` take ``probes``,
+    ``not`` takes ``probe``.
+
+    A process ``name`` is compared with ``/proc/<pid>/comm``, which the kernel
+    truncates to 15 characters; longer names are matched against the file
+    name of ``argv[0]`` instead.
+    """
+
+    if value in (None, "", {}):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError as exc:
+            raise ValueError("condition_probe format error") from exc
+    count = [0]
+
+    def _check(node: Any, depth: int) -> Dict[str, Any]:
+        count[0] += 1
+        if depth > PROBE_MAX_DEPTH or count[0] > PROBE_MAX_NODES:
+            raise ValueError("condition_probe is too complex")
+        if not isinstance(node, dict):
+            raise ValueError("condition_probe must be an object")
+        kind = node.get("type")
+        if kind in ("all", "any"):
+            probes = node.get("probes")
+            if not isinstance(probes, list) or not probes:
+                raise ValueError(f"condition_probe '{kind}' requires a non-empty probes list")
+            return {"type": kind, "probes": [_check(item, depth + 1) for item in probes]}
+        if kind == "not":
+            return {"type": kind, "probe": _check(node.get("probe"), depth + 1)}
+        if kind not in PROBE_TYPES:
+            raise ValueError(f"condition_probe type must be one of {', '.join(sorted(PROBE_TYPES | {'all', 'any', 'not'}))}")
+        probe: Dict[str, Any] = {"type": kind}
+        if kind in ("path_exists", "path_changed", "disk_free"):
+            path = node.get("path")
+            if not isinstance(path, str) or not os.path.isabs(path):
+                raise ValueError(f"condition_probe '{kind}' requires an absolute path")
+            probe["path"] = path
+        if kind == "process":
+            for key in ("name", "cmdline"):
+                if node.get(key):
+                    probe[key] = str(node[key])
+            if len(probe) == 1:
+                raise ValueError("condition_probe 'process' requires name or cmdline")
+        if kind == "port_open":
+            try:
+                port = int(node.get("port"))
+            except (TypeError, ValueError) as exc:
+                raise ValueError("condition_probe 'port_open' requires a port") from exc
+            if not 0 < port < 65536:
+                raise ValueError("condition_probe port must be between 1 and 65535")
+            probe["port"] = port
+        if kind == "pressure":
+            if node.get("resource") not in AdmissionController.PSI_RESOURCES:
+                raise ValueError("condition_probe 'pressure' resource must be cpu, io or memory")
+            probe["resource"] = node["resource"]
+        if kind in ("disk_free", "load", "pressure"):
+            for key in ("below", "above"):
+                if node.get(key) is not None:
+                    try:
+                        probe[key] = float(node[key])
+                    except (TypeError, ValueError) as exc:
+                        raise ValueError(f"condition_probe '{key}' must be a number") from exc
+            if "below" not in probe and "above" not in probe:
+                raise ValueError(f"condition_probe '{kind}' requires below or above")
+        return probe
+
+    return _check(value, 1)
+
+
+###############################################################################
+# Schedule forecast
+###############################################################################
+
+@functools.lru_cache(maxsize=4096)
+def parse_cron(expression: str) -> CronExpression:
+    """Parse ``expression``, sharing the result between tasks with the same schedule."""
+
+    return CronExpression(expression)
+
+
+class ForecastSeries:
+    """Fire times shared by every task with the same schedule, as seconds after the forecast start.
+
+    A cron schedule is kept as its slot pattern plus the matching days of
+    the window (``(base, lo, hi)``: slots ``pattern[lo:hi]`` fire at
+    ``base + slot``), so counts and histograms come from per-day sums
+    instead of one entry per run. An interval schedule is a ``range``.
+    """
+
+    __slots__ = ("tasks", "pattern", "days", "runs", "min_gap")
+
+    def __init__(self, key: tuple, start: datetime, span: int):
+        self.tasks: List[Dict[str, Any]] = []
+        self.pattern: List[int] = []
+        self.days: List[tuple[int, int, int]] = []
+        if key[0] == "interval":
+            _, period, first = key
+            self.runs: Optional[range] = range(first, span, period)
+            self.min_gap = period
+            return
+        self.runs = None
+        _, expression, shift = key
+        cron = parse_cron(expression)
+        self.min_gap = cron.min_gap()
+        # 错峰后的槽位（相对槽位所在日零点的秒数），可能越过午夜
+        pattern = cron.day_offsets()
+        self.pattern = [offset + shift for offset in pattern] if shift else pattern
+        secs = start.hour * 3600 + start.minute * 60 + start.second
+        first_day = -((self.pattern[-1] - secs) // 86400)
+        last_day = (span + secs - self.pattern[0] - 1) // 86400
+        midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        calendar = calendar_days(midnight + timedelta(days=first_day), last_day - first_day + 1)
+        for day, (month, day_of_month, weekday) in enumerate(calendar, start=first_day):
+            if not cron.matches_day(month, day_of_month, weekday):
+                continue
+            base = day * 86400 - secs
+            lo = bisect.bisect_left(self.pattern, -base)
+            hi = bisect.bisect_left(self.pattern, span - base)
+            if lo < hi:
+                self.days.append((base, lo, hi))
+
+    @staticmethod
+    def key(task: Dict[str, Any], start: datetime) -> tuple:
+        if task.get("trigger_type") == "interval":
+            period = int(task.get("interval_seconds") or 0)
+            # 从持久化的 next_run_at 推算相位，与 PreciseTimer 的触发时刻一致
+            anchor = parse_iso(task.get("next_run_at")) or start
+            first = int((anchor - start).total_seconds())
+            return ("interval", period, first if first >= 0 else first % period)
+        return ("schedule", task["schedule_expression"], task_splay_offset(task))
+
+    def count(self) -> int:
+        if self.runs is not None:
+            return len(self.runs)
+        return sum(hi - lo for _, lo, hi in self.days)
+
+    def first(self) -> Optional[int]:
+        if self.runs is not None:
+            return self.runs[0] if self.runs else None
+        return self.days[0][0] + self.pattern[self.days[0][1]] if self.days else None
+
+    def last(self) -> Optional[int]:
+        if self.runs is not None:
+            return self.runs[-1] if self.runs else None
+        return self.days[-1][0] + self.pattern[self.days[-1][2] - 1] if self.days else None
+
+    def full_days(self) -> tuple[int, ...]:
+        """Bases of the days on which every slot of the pattern falls inside the window."""
+
+        return tuple(base for base, lo, hi in self.days if lo == 0 and hi == len(self.pattern))
+
+    def partial_offsets(self) -> Iterator[int]:
+        """Fire times on the days cut by the window edges."""
+
+        for base, lo, hi in self.days:
+            if lo or hi != len(self.pattern):
+                yield from map(base.__add__, itertools.islice(self.pattern, lo, hi))
+
+    def __iter__(self) -> Iterator[int]:
+        if self.runs is not None:
+            return iter(self.runs)
+        return itertools.chain.from_iterable(
+            map(base.__add__, itertools.islice(self.pattern, lo, hi)) for base, lo, hi in self.days
+        )
+
+
+def build_forecast(
+    tasks: List[Dict[str, Any]],
+    durations: Dict[int, float],
+    start: datetime,
+    end: datetime,
+    mode: str = "list",
+    limit: int = FORECAST_DEFAULT_LIMIT,
+) -> Dict[str, Any]:
+    """Summarise upcoming runs and project their peak concurrency.
+
+    ``mode`` selects the listing (``list``: individual runs up to ``limit``,
+    ``task``: runs per task, ``hour``: runs per hour). The projection assumes
+    each run lasts its historical mean duration from ``durations``; runs of
+    a ``skip`` policy task that would overlap its previous run are dropped.
+    """
+
+    start = start.replace(microsecond=0)
+    span = int((end - start).total_seconds())
+    # 相同调度（表达式 + 错峰偏移，或间隔 + 相位）的任务共用一个序列
+    series: Dict[tuple, ForecastSeries] = {}
+    for task in tasks:
+        if task.get("trigger_type") == "interval" and int(task.get("interval_seconds") or 0) <= 0:
+            continue
+        key = ForecastSeries.key(task, start)
+        entry = series.get(key)
+        if entry is None:
+            entry = series[key] = ForecastSeries(key, start, span)
+        entry.tasks.append(task)
+    groups = [entry for entry in series.values() if entry.count()]
+    total = sum(entry.count() * len(entry.tasks) for entry in groups)
+    if mode == "list":
+        # 各序列按时间有序，按堆归并惰性取前 limit 个
+        merged = heapq.merge(*(zip(entry, itertools.repeat(index)) for index, entry in enumerate(groups)))
+        data: List[Dict[str, Any]] = []
+        for offset, index in merged:
+            at = isoformat(start + timedelta(seconds=offset))
+            data.extend({"task_id": task["id"], "name": task["name"], "at": at} for task in groups[index].tasks)
+            if len(data) >= limit:
+                del data[limit:]
+                break
+    elif mode == "task":
+        rows = [(entry.count(), entry, task) for entry in groups for task in entry.tasks]
+        rows.sort(key=lambda row: -row[0])
+        data = [
+            {
+                "task_id": task["id"],
+                "name": task["name"],
+                "count": count,
+                "first": isoformat(start + timedelta(seconds=entry.first())),
+                "last": isoformat(start + timedelta(seconds=entry.last())),
+            }
+            for count, entry, task in rows
+        ]
+    else:
+        counts = forecast_hours(groups, start)
+        hour = start.replace(minute=0, second=0)
+        data = [{"hour": isoformat(hour + timedelta(hours=bucket)), "count": counts[bucket]} for bucket in sorted(counts)]
+    projection = project_concurrency(groups, durations)
+    peak_at = projection.pop("peak_offset")
+    projection["peak_at"] = isoformat(start + timedelta(seconds=peak_at)) if peak_at is not None else None
+    projection["tasks_without_history"] = sorted(
+        task["id"] for entry in groups for task in entry.tasks if task["id"] not in durations
+    )
+    return {
+        "from": isoformat(start),
+        "to": isoformat(end),
+        "mode": mode,
+        "total": total,
+        "truncated": mode == "list" and total > len(data),
+        "data": data,
+        "projection": projection,
+    }
+
+
+def forecast_hours(groups: List[ForecastSeries], start: datetime) -> Counter:
+    """Runs per hour bucket (hours after ``start``'s hour).
+
+    Whole days of a cron series add one per-day histogram, summed per set
+    of days before it is spread over them.
+    """
+
+    phase = start.minute * 60 + start.second
+    counts: Counter = Counter()
+    profiles: Dict[tuple[int, ...], Counter] = {}
+    for entry in groups:
+        weight = len(entry.tasks)
+        if entry.runs is not None:
+            offsets: Iterable[int] = entry.runs
+        else:
+            days = entry.full_days()
+            if days:
+                # 槽位所在日零点起算的小时；全天落在窗口内的日期只需按天累加
+                profile = profiles.setdefault(days, Counter())
+                for hour_of_day, runs in Counter(offset // 3600 for offset in entry.pattern).items():
+                    profile[hour_of_day] += runs * weight
+            offsets = entry.partial_offsets()
+        buckets = Counter((offset + phase) // 3600 for offset in offsets)
+        for bucket, runs in buckets.items():
+            counts[bucket] += runs * weight
+    for days, profile in profiles.items():
+        for base in days:
+            first_bucket = (base + phase) // 3600
+            for hour_of_day, runs in profile.items():
+                counts[first_bucket + hour_of_day] += runs
+    return counts
+
+
+def project_concurrency(groups: List[ForecastSeries], durations: Dict[int, float]) -> Dict[str, Any]:
+    """Peak number of overlapping runs if each lasts its mean duration.
+
+    Every run contributes a start and an end point; points are encoded as
+    ``2 * t`` (start) and ``2 * t + 1`` (end) so one integer sort orders
+    them with starts first on ties, and a running sum gives the concurrency.
+    Whole days of cron series are summed into per-day profiles first, so
+    the cost follows the number of distinct points rather than of runs.
+    """
+
+    points: Counter = Counter()
+    profiles: Dict[tuple[int, ...], Counter] = {}
+    skipped = 0
+    expanded = 0
+
+    def charge(count: int) -> None:
+        nonlocal expanded
+        expanded += count
+        if expanded > FORECAST_MAX_EVENTS:
+            raise ValueError(f"forecast window needs more than {FORECAST_MAX_EVENTS} distinct run times, narrow it")
+
+    for entry in groups:
+        weights: Counter = Counter()
+        for task in entry.tasks:
+            duration = max(0, round(durations.get(task["id"], 0.0)))
+            overlapping = duration >= entry.min_gap and (task.get("concurrency_policy") or "skip") == "skip"
+            weights[(duration, overlapping)] += 1
+        for (duration, overlapping), weight in weights.items():
+            if overlapping:
+                # skip 策略：上一次预计尚未结束时，本次触发会被跳过，只能逐次展开
+                charge(entry.count())
+                busy_until = -1
+                for offset in entry:
+                    if offset <= busy_until:
+                        skipped += weight
+                        continue
+                    busy_until = offset + duration
+                    points[offset * 2] += weight
+                    points[(offset + duration) * 2 + 1] -= weight
+                continue
+            if entry.runs is not None:
+                charge(entry.count())
+                offsets: Iterable[int] = entry.runs
+            else:
+                days = entry.full_days()
+                if days:
+                    profile = profiles.setdefault(days, Counter())
+                    end_shift = duration * 2 + 1
+                    for point in map((2).__mul__, entry.pattern):
+                        profile[point] += weight
+                        profile[point + end_shift] -= weight
+                charge(entry.count() - len(days) * len(entry.pattern))
+                offsets = entry.partial_offsets()
+            for offset in offsets:
+                points[offset * 2] += weight
+                points[(offset + duration) * 2 + 1] -= weight
+    for days, profile in profiles.items():
+        charge(len(days) * len(profile))
+    for days, profile in profiles.items():
+        for base in days:
+            shift = base * 2
+            for point, delta in profile.items():
+                points[point + shift] += delta
+    if not points:
+        return {"peak_concurrency": 0, "peak_offset": None, "skipped_overlaps": skipped}
+    ordered = sorted(points)
+    running = list(itertools.accumulate(map(points.__getitem__, ordered)))
+    peak = max(running)
+    return {"peak_concurrency": peak, "peak_offset": ordered[running.index(peak)] >> 1, "skipped_overlaps": skipped}
+
+
+###############################################################################
+# Task registry
+###############################################################################
+
+class TaskRecord:
+    """One ``tasks`` row held in memory by :class:`TaskRegistry`.
+
+    Supports the read side of the dict protocol (``record["name"]``,
+    ``record.get("name")``), so engine code handles records and task dicts
+    alike. JSON columns are decoded once, ``pre_task_ids`` is a tuple and
+    ``cron`` the parsed schedule expression.
+    """
+
+    FIELDS = ("id", *TASK_COLUMNS, "created_at", "updated_at")
+    # 取值重复度高的文本列，驻留后各记录共享同一个字符串对象
+    INTERNED_FIELDS = frozenset(
+        (
+            "account",
+            "trigger_type",
+            "schedule_expression",
+            "event_type",
+            "event_name",
+            "concurrency_policy",
+            "priority_profile",
+            "ioprio_class",
+            "sched_policy",
+            "cpu_affinity",
+        )
+    )
+    __slots__ = (*FIELDS, "cron")
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "TaskRecord":
+        record = cls.__new__(cls)
+        data = dict(row)
+        for field in cls.FIELDS:
+            value = data.get(field)
+            if field in cls.INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(record, field, value)
+        record.is_active = bool(record.is_active)
+        record.condition_interval = int(60 if record.condition_interval is None else record.condition_interval)
+        record.pre_task_ids = tuple(json.loads(record.pre_task_ids or "[]"))
+        record.condition_probe = json.loads(record.condition_probe) if record.condition_probe else None
+        record.mount_filter = json.loads(record.mount_filter) if record.mount_filter else None
+        record.pipeline_stages = json.loads(record.pipeline_stages) if record.pipeline_stages else None
+        record.event_type = record.event_type or EVENT_TYPE_SCRIPT
+        record.splay_seconds = int(record.splay_seconds or 0)
+        record.is_deferrable = bool(record.is_deferrable)
+        record.concurrency_policy = record.concurrency_policy or "skip"
+        record.concurrency_limit = int(record.concurrency_limit or 1)
+        record.cron = None
+        if record.trigger_type == "schedule" and record.schedule_expression:
+            try:
+                record.cron = parse_cron(record.schedule_expression)
+            except ValueError:
+                logger.warning("Task %s has an invalid schedule expression", record.id)
+        return record
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
 
-        return minute in self.fields[0] and hour in self.fields[1] and month in self.fields[3] and calendar_ok
+    def to_dict(self) -> Dict[str, Any]:
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data["pre_task_ids"] = list(self.pre_task_ids)
+        return data
+
+
+class TaskRegistry:
+    """Authoritative in-memory copy of the ``tasks`` table.
+
+    Loaded once when the database opens and kept current write-through by
+    the :class:`Database` mutation methods, which also serialise every
+    access under the database lock. Runtime columns (``next_run_at`` and
+    friends) are updated in place; a definition change replaces the record,
+    so holders of the old record keep a consistent old definition.
+    """
+
+    def __init__(self):
+        self._records: Dict[int, TaskRecord] = {}
+        # 按触发方式划分的启用任务视图，任务增删改时失效
+        self._views: Optional[Dict[str, List[TaskRecord]]] = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def load(self, rows: List[sqlite3.Row]) -> None:
+        self._records = {int(row["id"]): TaskRecord.from_row(row) for row in rows}
+        self._views = None
+
+    def put(self, row: sqlite3.Row) -> TaskRecord:
+        record = TaskRecord.from_row(row)
+        self._records[record.id] = record
+        self._views = None
+        return record
+
+    def remove(self, task_id: int) -> None:
+        if self._records.pop(task_id, None) is not None:
+            self._views = None
+
+    def touch(self, task_id: int, **fields: Any) -> None:
+        record = self._records.get(task_id)
+        if record is not None:
+            for field, value in fields.items():
+                setattr(record, field, value)
+
+    def get(self, task_id: int) -> Optional[TaskRecord]:
+        return self._records.get(task_id)
+
+    def records(self) -> List[TaskRecord]:
+        return list(self._records.values())
+
+    def view(self, name: str) -> List[TaskRecord]:
+        """Active tasks of one kind: ``scheduled`` (schedule and interval),
+        ``event`` or ``event:<event_type>``, in id order."""
+
+        if self._views is None:
+            views: Dict[str, List[TaskRecord]] = {"scheduled": [], "event": []}
+            for record in sorted(self._records.values(), key=lambda item: item.id):
+                if not record.is_active:
+                    continue
+                if record.trigger_type in ("schedule", "interval"):
+                    views["scheduled"].append(record)
+                elif record.trigger_type == "event":
+                    views["event"].append(record)
+                    views.setdefault(f"event:{record.event_type}", []).append(record)
+            self._views = views
+        return self._views.get(name, [])
 
 
 ###############################################################################
@@ -284,7 +1230,13 @@ class Database:
         self._lock = threading.RLock()
         self._conn = sqlite3.connect(self.path, check_same_thread=False)
         self._conn.row_factory = sqlite3.Row
+        # 每张表的修改代数，写操作提交后递增，用于让读缓存失效
+        # task_defs 只在任务定义变更时递增，不受运行时间戳更新影响
+        self._generations: Dict[str, int] = {"tasks": 0, "task_defs": 0, "task_results": 0, "templates": 0}
+        # 任务读取全部由内存注册表应答，写操作提交后同步更新
+        self.tasks = TaskRegistry()
         self._setup()
+        self._load_tasks()
 
     def _setup(self) -> None:
         with self._lock:
@@ -305,6 +1257,121 @@ class Database:
                         raise
                 cur.execute("PRAGMA user_version=2;")
                 version = 2
+            if version < 3:
+                try:
+                    cur.execute("ALTER TABLE tasks ADD COLUMN splay_seconds INTEGER NOT NULL DEFAULT 0;")
+                except sqlite3.OperationalError as exc:
+                    if "duplicate column name" not in str(exc).lower():
+                        raise
+                cur.execute("PRAGMA user_version=3;")
+                version = 3
+            if version < 4:
+                for column_ddl in (
+                    "timeout_seconds INTEGER",
+                    "rlimit_as_mb INTEGER",
+                    "rlimit_cpu_seconds INTEGER",
+                    "rlimit_nofile INTEGER",
+                ):
+                    try:
+                        cur.execute(f"ALTER TABLE tasks ADD COLUMN {column_ddl};")
+                    except sqlite3.OperationalError as exc:
+                        if "duplicate column name" not in str(exc).lower():
+                            raise
+                cur.execute("PRAGMA user_version=4;")
+                version = 4
+            if version < 5:
+                for column_ddl in (
+                    "priority_profile TEXT",
+                    "nice INTEGER",
+                    "ioprio_class TEXT",
+                    "ioprio_level INTEGER",
+                    "sched_policy TEXT",
+                    "cpu_affinity TEXT",
+                ):
+                    try:
+                        cur.execute(f"ALTER TABLE tasks ADD COLUMN {column_ddl};")
+                    except sqlite3.OperationalError as exc:
+                        if "duplicate column name" not in str(exc).lower():
+                            raise
+                cur.execute("PRAGMA user_version=5;")
+                version = 5
+            if version < 6:
+                for column_ddl in (
+                    "is_deferrable INTEGER NOT NULL DEFAULT 0",
+                    "max_defer_seconds INTEGER",
+                ):
+                    try:
+                        cur.execute(f"ALTER TABLE tasks ADD COLUMN {column_ddl};")
+                    except sqlite3.OperationalError as exc:
+                        if "duplicate column name" not in str(exc).lower():
+                            raise
+                cur.execute("PRAGMA user_version=6;")
+                version = 6
+            if version < 7:
+                for column_ddl in (
+                    "concurrency_policy TEXT NOT NULL DEFAULT 'skip'",
+                    "concurrency_limit INTEGER NOT NULL DEFAULT 1",
+                ):
+                    try:
+                        cur.execute(f"ALTER TABLE tasks ADD COLUMN {column_ddl};")
+                    except sqlite3.OperationalError as exc:
+                        if "duplicate column name" not in str(exc).lower():
+                            raise
+                cur.execute("PRAGMA user_version=7;")
+                version = 7
+            if version < 8:
+                for column_ddl in ("pid INTEGER", "pid_start_time INTEGER"):
+                    try:
+                        cur.execute(f"ALTER TABLE task_results ADD COLUMN {column_ddl};")
+                    except sqlite3.OperationalError as exc:
+                        if "duplicate column name" not in str(exc).lower():
+                            raise
+                cur.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_task_results_running ON task_results(status) WHERE status='running';"
+                )
+                cur.execute("PRAGMA user_version=8;")
+                version = 8
+            if version < 9:
+                try:
+                    cur.execute("ALTER TABLE tasks ADD COLUMN condition_probe TEXT;")
+                except sqlite3.OperationalError as exc:
+                    if "duplicate column name" not in str(exc).lower():
+                        raise
+                cur.execute("PRAGMA user_version=9;")
+                version = 9
+            if version < 10:
+                try:
+                    cur.execute("ALTER TABLE tasks ADD COLUMN event_name TEXT;")
+                except sqlite3.OperationalError as exc:
+                    if "duplicate column name" not in str(exc).lower():
+                        raise
+                cur.execute("PRAGMA user_version=10;")
+                version = 10
+            if version < 11:
+                try:
+                    cur.execute("ALTER TABLE tasks ADD COLUMN mount_filter TEXT;")
+                except sqlite3.OperationalError as exc:
+                    if "duplicate column name" not in str(exc).lower():
+                        raise
+                cur.execute("PRAGMA user_version=11;")
+                version = 11
+            if version < 12:
+                for table, column_ddl in (("tasks", "pipeline_stages TEXT"), ("task_results", "stage_results TEXT")):
+                    try:
+                        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column_ddl};")
+                    except sqlite3.OperationalError as exc:
+                        if "duplicate column name" not in str(exc).lower():
+                            raise
+                cur.execute("PRAGMA user_version=12;")
+                version = 12
+            if version < 13:
+                try:
+                    cur.execute("ALTER TABLE tasks ADD COLUMN interval_seconds INTEGER;")
+                except sqlite3.OperationalError as exc:
+                    if "duplicate column name" not in str(exc).lower():
+                        raise
+                cur.execute("PRAGMA user_version=13;")
+                version = 13
             if version < DB_LATEST_VERSION:
                 cur.execute(f"PRAGMA user_version={DB_LATEST_VERSION};")
             self._conn.commit()
@@ -342,12 +1409,32 @@ class Database:
                 account TEXT NOT NULL,
                 trigger_type TEXT NOT NULL,
                 schedule_expression TEXT,
+                interval_seconds INTEGER,
                 condition_script TEXT,
+                condition_probe TEXT,
                 condition_interval INTEGER NOT NULL DEFAULT 60,
                 event_type TEXT NOT NULL DEFAULT 'script',
+                event_name TEXT,
+                mount_filter TEXT,
                 is_active INTEGER NOT NULL DEFAULT 1,
                 pre_task_ids TEXT NOT NULL DEFAULT '[]',
                 script_body TEXT NOT NULL,
+                pipeline_stages TEXT,
+                splay_seconds INTEGER NOT NULL DEFAULT 0,
+                is_deferrable INTEGER NOT NULL DEFAULT 0,
+                max_defer_seconds INTEGER,
+                concurrency_policy TEXT NOT NULL DEFAULT 'skip',
+                concurrency_limit INTEGER NOT NULL DEFAULT 1,
+                timeout_seconds INTEGER,
+                rlimit_as_mb INTEGER,
+                rlimit_cpu_seconds INTEGER,
+                rlimit_nofile INTEGER,
+                priority_profile TEXT,
+                nice INTEGER,
+                ioprio_class TEXT,
+                ioprio_level INTEGER,
+                sched_policy TEXT,
+                cpu_affinity TEXT,
                 last_run_at TEXT,
                 next_run_at TEXT,
                 last_condition_check_at TEXT,
@@ -362,10 +1449,14 @@ class Database:
                 trigger_reason TEXT NOT NULL,
                 started_at TEXT NOT NULL,
                 finished_at TEXT,
-                log TEXT
+                log TEXT,
+                pid INTEGER,
+                pid_start_time INTEGER,
+                stage_results TEXT
             );
 
             CREATE INDEX IF NOT EXISTS idx_task_results_task ON task_results(task_id, started_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_task_results_running ON task_results(status) WHERE status='running';
             
             CREATE TABLE IF NOT EXISTS templates (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -383,13 +1474,23 @@ class Database:
             self._conn.close()
 
     # Utility methods -----------------------------------------------------
-    def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
-        data = dict(row)
-        data["is_active"] = bool(data.get("is_active"))
-        data["condition_interval"] = int(data.get("condition_interval", 60))
-        data["pre_task_ids"] = json.loads(data.get("pre_task_ids") or "[]")
-        data["event_type"] = data.get("event_type") or EVENT_TYPE_SCRIPT
-        return data
+    def _bump(self, *tables: str) -> None:
+        for table in tables:
+            self._generations[table] += 1
+
+    def generation(self, *tables: str) -> tuple:
+        return tuple(self._generations[table] for table in tables)
+
+    def _load_tasks(self) -> None:
+        with self._lock:
+            self.tasks.load(self._conn.execute("SELECT * FROM tasks ORDER BY id ASC").fetchall())
+
+    def _reload_task(self, task_id: int) -> None:
+        row = self._conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone()
+        if row is None:
+            self.tasks.remove(task_id)
+        else:
+            self.tasks.put(row)
 
     # Templates management ----------------------------------------------
     def list_templates(self) -> List[Dict[str, Any]]:
@@ -433,6 +1534,7 @@ class Database:
                     (key, name, script_body, now_iso, now_iso),
                 )
                 self._conn.commit()
+                self._bump("templates")
                 tid = cur.lastrowid
             except sqlite3.IntegrityError as exc:
                 msg = str(exc).lower()
@@ -460,6 +1562,7 @@ class Database:
                     (key, name, script_body, updated_at, template_id),
                 )
                 self._conn.commit()
+                self._bump("templates")
         except sqlite3.IntegrityError as exc:
             msg = str(exc).lower()
             if "unique" in msg or "templates.key" in msg:
@@ -471,6 +1574,7 @@ class Database:
         with self._lock:
             cur = self._conn.execute("DELETE FROM templates WHERE id=?", (template_id,))
             self._conn.commit()
+            self._bump("templates")
             return cur.rowcount > 0
 
     def import_templates(self, mapping: Dict[str, Dict[str, str]]) -> Dict[str, int]:
@@ -500,6 +1604,7 @@ class Database:
                     )
                     inserted += 1
             self._conn.commit()
+            self._bump("templates")
         return {"inserted": inserted, "updated": updated}
 
     def export_templates(self) -> Dict[str, Dict[str, str]]:
@@ -512,52 +1617,66 @@ class Database:
 
     def list_tasks(self) -> List[Dict[str, Any]]:
         with self._lock:
-            cur = self._conn.execute("SELECT * FROM tasks ORDER BY id ASC")
-            rows = [self._row_to_dict(row) for row in cur.fetchall()]
-        return rows
+            records = self.tasks.records()
+        return [record.to_dict() for record in sorted(records, key=lambda record: record.id)]
+
+    def ping(self, timeout: float = HEALTH_DB_TIMEOUT) -> float:
+        """Run a trivial query and return its latency; TimeoutError if the connection stays busy."""
+
+        started = time.monotonic()
+        if not self._lock.acquire(timeout=timeout):
+            raise TimeoutError(f"database connection busy for more than {timeout:g}s")
+        try:
+            self._conn.execute("SELECT 1").fetchone()
+        finally:
+            self._lock.release()
+        return time.monotonic() - started
+
+    def count_tasks(self) -> int:
+        with self._lock:
+            return len(self.tasks)
 
     def get_task(self, task_id: int) -> Optional[Dict[str, Any]]:
         with self._lock:
-            cur = self._conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,))
-            row = cur.fetchone()
-        return self._row_to_dict(row) if row else None
+            record = self.tasks.get(task_id)
+        return record.to_dict() if record else None
+
+    @staticmethod
+    def _result_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        data = dict(row)
+        data["stage_results"] = json.loads(data["stage_results"]) if data.get("stage_results") else None
+        return data
+
+    @staticmethod
+    def _task_values(task: Dict[str, Any]) -> List[Any]:
+        values: List[Any] = []
+        for column in TASK_COLUMNS:
+            value = task.get(column)
+            if column in ("is_active", "is_deferrable"):
+                value = 1 if value else 0
+            elif column == "pre_task_ids":
+                value = json.dumps(value or [])
+            elif column in ("condition_probe", "mount_filter", "pipeline_stages"):
+                value = json.dumps(value) if value else None
+            values.append(value)
+        return values
 
     def create_task(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         now = isoformat(time_now())
         task = self._prepare_task_payload(payload, is_update=False)
         task["created_at"] = now
         task["updated_at"] = now
+        columns = (*TASK_COLUMNS, "created_at", "updated_at")
         with self._lock:
             try:
                 cur = self._conn.execute(
-                    """
-                    INSERT INTO tasks (
-                        name, account, trigger_type, schedule_expression, condition_script,
-                        condition_interval, event_type, is_active, pre_task_ids, script_body,
-                        last_run_at, next_run_at, last_condition_check_at,
-                        created_at, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        task["name"],
-                        task["account"],
-                        task["trigger_type"],
-                        task.get("schedule_expression"),
-                        task.get("condition_script"),
-                        task["condition_interval"],
-                        task["event_type"],
-                        1 if task["is_active"] else 0,
-                        json.dumps(task["pre_task_ids"]),
-                        task["script_body"],
-                        task.get("last_run_at"),
-                        task.get("next_run_at"),
-                        task.get("last_condition_check_at"),
-                        task["created_at"],
-                        task["updated_at"],
-                    ),
+                    f"INSERT INTO tasks ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                    (*self._task_values(task), task["created_at"], task["updated_at"]),
                 )
                 task_id = cur.lastrowid
                 self._conn.commit()
+                self._reload_task(task_id)
+                self._bump("tasks", "task_defs")
             except sqlite3.IntegrityError as exc:
                 msg = str(exc).lower()
                 if "unique" in msg or "tasks.name" in msg:
@@ -569,47 +1688,33 @@ class Database:
             existing = self.get_task(task_id)
             if not existing:
                 return None
-            # 检查 Cron 表达式是否变更，变更则强制 next_run_at 重新计算
+            # 触发方式、Cron 表达式、间隔或错峰变更时，强制 next_run_at 重新计算
             old_expr = existing.get("schedule_expression")
             new_expr = payload.get("schedule_expression", old_expr)
+            old_splay = existing.get("splay_seconds", 0)
+            new_splay = payload.get("splay_seconds", old_splay)
+            old_interval = existing.get("interval_seconds")
+            new_interval = payload.get("interval_seconds", old_interval)
+            new_trigger = payload.get("trigger_type", existing.get("trigger_type"))
             if (
-                existing.get("trigger_type") == "schedule"
-                and old_expr != new_expr
-                and new_expr
+                new_trigger != existing.get("trigger_type")
+                or (new_trigger == "schedule" and (old_expr != new_expr or old_splay != new_splay))
+                or (new_trigger == "interval" and (old_interval != new_interval or old_splay != new_splay))
             ):
                 payload = dict(payload)
                 payload["next_run_at"] = None  # 让 _prepare_task_payload 自动计算
             task = self._prepare_task_payload({**existing, **payload}, is_update=True)
             task["updated_at"] = isoformat(time_now())
+            assignments = ", ".join(f"{column}=?" for column in (*TASK_COLUMNS, "updated_at"))
             try:
                 with self._lock:
                     self._conn.execute(
-                        """
-                        UPDATE tasks SET
-                            name=?, account=?, trigger_type=?, schedule_expression=?, condition_script=?,
-                            condition_interval=?, event_type=?, is_active=?, pre_task_ids=?, script_body=?,
-                            last_run_at=?, next_run_at=?, last_condition_check_at=?, updated_at=?
-                        WHERE id=?
-                        """,
-                        (
-                            task["name"],
-                            task["account"],
-                            task["trigger_type"],
-                            task.get("schedule_expression"),
-                            task.get("condition_script"),
-                            task["condition_interval"],
-                            task["event_type"],
-                            1 if task["is_active"] else 0,
-                            json.dumps(task["pre_task_ids"]),
-                            task["script_body"],
-                            task.get("last_run_at"),
-                            task.get("next_run_at"),
-                            task.get("last_condition_check_at"),
-                            task["updated_at"],
-                            task_id,
-                        ),
+                        f"UPDATE tasks SET {assignments} WHERE id=?",
+                        (*self._task_values(task), task["updated_at"], task_id),
                     )
                     self._conn.commit()
+                    self._reload_task(task_id)
+                    self._bump("tasks", "task_defs")
             except sqlite3.IntegrityError as exc:
                 msg = str(exc).lower()
                 if "unique" in msg or "tasks.name" in msg:
@@ -621,6 +1726,8 @@ class Database:
         with self._lock:
             cur = self._conn.execute("DELETE FROM tasks WHERE id=?", (task_id,))
             self._conn.commit()
+            self.tasks.remove(task_id)
+            self._bump("tasks", "task_defs", "task_results")
             return cur.rowcount > 0
 
     def record_result_start(self, task_id: int, trigger_reason: str) -> int:
@@ -634,16 +1741,70 @@ class Database:
                 (task_id, trigger_reason, now),
             )
             self._conn.commit()
+            self._bump("task_results")
+            return cur.lastrowid
+
+    def record_result_pid(self, result_id: int, pid: int, pid_start_time: Optional[int]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE task_results SET pid=?, pid_start_time=? WHERE id=?",
+                (pid, pid_start_time, result_id),
+            )
+            self._conn.commit()
+
+    def fetch_running_results(self) -> List[Dict[str, Any]]:
+        # 走 status='running' 的部分索引，代价与运行中的行数成正比而非历史总量
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT id, task_id, trigger_reason, started_at, pid, pid_start_time FROM task_results WHERE status='running'"
+            )
+            rows = [dict(row) for row in cur.fetchall()]
+        return rows
+
+    def abort_results(self, result_ids: List[int], log_text: str) -> None:
+        if not result_ids:
+            return
+        now = isoformat(time_now())
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE task_results SET status='aborted', finished_at=?, log=COALESCE(log || char(10), '') || ? WHERE id=?",
+                [(now, log_text, result_id) for result_id in result_ids],
+            )
+            self._conn.commit()
+            self._bump("task_results")
+
+    def record_deferral(self, task_id: int, trigger_reason: str, reason: str) -> int:
+        return self._record_unstarted(task_id, "deferred", trigger_reason, reason)
+
+    def record_skip(self, task_id: int, trigger_reason: str, reason: str) -> int:
+        return self._record_unstarted(task_id, "skipped", trigger_reason, reason)
+
+    def _record_unstarted(self, task_id: int, status: str, trigger_reason: str, reason: str) -> int:
+        now = isoformat(time_now())
+        with self._lock:
+            cur = self._conn.execute(
+                """
+                INSERT INTO task_results(task_id, status, trigger_reason, started_at, finished_at, log)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (task_id, status, trigger_reason, now, now, reason),
+            )
+            self._conn.commit()
+            self._bump("task_results")
             return cur.lastrowid
 
-    def finalize_result(self, result_id: int, status: str, log_text: str) -> None:
+    def finalize_result(
+        self, result_id: int, status: str, log_text: str, stage_results: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
         now = isoformat(time_now())
+        stages = json.dumps(stage_results) if stage_results is not None else None
         with self._lock:
             self._conn.execute(
-                "UPDATE task_results SET status=?, finished_at=?, log=? WHERE id=?",
-                (status, now, log_text, result_id),
+                "UPDATE task_results SET status=?, finished_at=?, log=?, stage_results=? WHERE id=?",
+                (status, now, log_text, stages, result_id),
             )
             self._conn.commit()
+            self._bump("task_results")
 
     def fetch_results(self, task_id: int, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
         with self._lock:
@@ -651,7 +1812,7 @@ class Database:
                 "SELECT * FROM task_results WHERE task_id=? ORDER BY started_at DESC LIMIT ? OFFSET ?",
                 (task_id, limit, offset),
             )
-            rows = [dict(row) for row in cur.fetchall()]
+            rows = [self._result_to_dict(row) for row in cur.fetchall()]
         return rows
 
     def fetch_result(self, task_id: int, result_id: int) -> Optional[Dict[str, Any]]:
@@ -661,7 +1822,7 @@ class Database:
                 (task_id, result_id),
             )
             row = cur.fetchone()
-        return dict(row) if row else None
+        return self._result_to_dict(row) if row else None
 
     def delete_results(self, task_id: int, result_id: Optional[int] = None) -> int:
         with self._lock:
@@ -673,86 +1834,234 @@ class Database:
                     (task_id, result_id),
                 )
             self._conn.commit()
+            self._bump("task_results")
             return cur.rowcount
 
     def get_latest_result(self, task_id: int) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            cur = self._conn.execute(
-                "SELECT * FROM task_results WHERE task_id=? ORDER BY started_at DESC LIMIT 1",
-                (task_id,),
-            )
-            row = cur.fetchone()
-        return dict(row) if row else None
+        """Latest actual run of ``task_id``; deferral and skip records are ignored."""
 
-    def has_running_instance(self, task_id: int) -> bool:
         with self._lock:
             cur = self._conn.execute(
-                "SELECT COUNT(1) FROM task_results WHERE task_id=? AND status='running'",
-                (task_id,),
+                f"""
+                SELECT * FROM task_results
+                WHERE task_id=? AND status NOT IN ({', '.join('?' for _ in UNSTARTED_STATUSES)})
+                ORDER BY started_at DESC LIMIT 1
+                """,
+                (task_id, *UNSTARTED_STATUSES),
             )
-            (count,) = cur.fetchone()
-        return count > 0
+            row = cur.fetchone()
+        return self._result_to_dict(row) if row else None
 
     def update_last_run(self, task_id: int) -> None:
+        now = isoformat(time_now())
         with self._lock:
             self._conn.execute(
                 "UPDATE tasks SET last_run_at=?, updated_at=? WHERE id=?",
-                (isoformat(time_now()), isoformat(time_now()), task_id),
+                (now, now, task_id),
             )
             self._conn.commit()
+            self.tasks.touch(task_id, last_run_at=now, updated_at=now)
+            self._bump("tasks")
 
-    def schedule_next_run(self, task_id: int, expression: str, base: Optional[datetime] = None) -> Optional[str]:
+    def schedule_next_run(
+        self,
+        task_id: int,
+        expression: str,
+        base: Optional[datetime] = None,
+        splay_offset: int = 0,
+    ) -> Optional[str]:
         if not expression:
             return None
-        cron = CronExpression(expression)
-        next_dt = cron.next_after(base or time_now())
+        cron = parse_cron(expression)
+        return self.set_next_run(task_id, next_fire_time(cron, base or time_now(), splay_offset))
+
+    def set_next_run(self, task_id: int, next_dt: datetime) -> Optional[str]:
         next_iso = isoformat(next_dt)
+        now = isoformat(time_now())
         with self._lock:
             self._conn.execute(
                 "UPDATE tasks SET next_run_at=?, updated_at=? WHERE id=?",
-                (next_iso, isoformat(time_now()), task_id),
+                (next_iso, now, task_id),
             )
             self._conn.commit()
+            self.tasks.touch(task_id, next_run_at=next_iso, updated_at=now)
+            self._bump("tasks")
         return next_iso
 
     def update_condition_check(self, task_id: int) -> None:
+        self.update_condition_checks([task_id])
+
+    def update_condition_checks(self, task_ids: List[int]) -> None:
+        if not task_ids:
+            return
+        now = isoformat(time_now())
         with self._lock:
-            self._conn.execute(
+            # 一轮检查只提交一次事务
+            self._conn.executemany(
                 "UPDATE tasks SET last_condition_check_at=?, updated_at=? WHERE id=?",
-                (isoformat(time_now()), isoformat(time_now()), task_id),
+                [(now, now, task_id) for task_id in task_ids],
             )
             self._conn.commit()
+            for task_id in task_ids:
+                self.tasks.touch(task_id, last_condition_check_at=now, updated_at=now)
+            self._bump("tasks")
+
+    def fetch_due_tasks(self, moment: datetime) -> List[TaskRecord]:
+        cutoff = isoformat(moment)
+        with self._lock:
+            # ISO 时间字符串可直接按字典序比较
+            due = [
+                record
+                for record in self.tasks.view("scheduled")
+                if record.trigger_type == "schedule" and record.next_run_at is not None and record.next_run_at <= cutoff
+            ]
+        due.sort(key=lambda record: record.next_run_at)
+        return due
+
+    def fetch_scheduled_tasks(self) -> List[TaskRecord]:
+        with self._lock:
+            return list(self.tasks.view("scheduled"))
+
+    def fetch_timer_tasks(self) -> List[TaskRecord]:
+        return [task for task in self.fetch_scheduled_tasks() if timer_driven(task)]
+
+    def fetch_run_samples(self) -> Dict[int, List[tuple[float, str]]]:
+        """``(duration seconds, status)`` of each finished success/failed run, per task."""
 
-    def fetch_due_tasks(self, moment: datetime) -> List[Dict[str, Any]]:
         with self._lock:
             cur = self._conn.execute(
                 """
-                SELECT * FROM tasks
-                WHERE trigger_type='schedule' AND is_active=1 AND next_run_at IS NOT NULL AND next_run_at <= ?
-                ORDER BY next_run_at ASC
-                """,
-                (isoformat(moment),),
+                SELECT task_id, (julianday(finished_at) - julianday(started_at)) * 86400.0, status
+                FROM task_results
+                WHERE status IN ('success', 'failed') AND finished_at IS NOT NULL
+                ORDER BY id ASC
+                """
             )
-            rows = [self._row_to_dict(row) for row in cur.fetchall()]
-        return rows
+            samples: Dict[int, List[tuple[float, str]]] = {}
+            for task_id, duration, status in cur.fetchall():
+                samples.setdefault(int(task_id), []).append((max(0.0, float(duration or 0.0)), status))
+        return samples
+
+    def load_copy(self, source_path: str) -> None:
+        """Replace this scratch database with a consistent copy of ``source_path``."""
+
+        source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+        try:
+            with self._lock:
+                source.backup(self._conn)
+        finally:
+            source.close()
+        self._setup()
+        self._load_tasks()
+        self._bump(*self._generations)
+
+    def fetch_mean_durations(self) -> Dict[int, float]:
+        """Mean wall-clock duration in seconds of finished runs, per task."""
 
-    def fetch_event_tasks(self, event_type: Optional[str] = None) -> List[Dict[str, Any]]:
-        query = "SELECT * FROM tasks WHERE trigger_type='event' AND is_active=1"
-        params: List[Any] = []
-        if event_type:
-            query += " AND event_type=?"
-            params.append(event_type)
-        query += " ORDER BY id ASC"
         with self._lock:
-            cur = self._conn.execute(query, params)
-            rows = [self._row_to_dict(row) for row in cur.fetchall()]
-        return rows
+            cur = self._conn.execute(
+                """
+                SELECT task_id, AVG((julianday(finished_at) - julianday(started_at)) * 86400.0)
+                FROM task_results
+                WHERE status IN ('success', 'failed', 'cancelled') AND finished_at IS NOT NULL
+                GROUP BY task_id
+                """
+            )
+            return {int(row[0]): max(0.0, float(row[1])) for row in cur.fetchall() if row[1] is not None}
+
+    def fetch_event_tasks(self, event_type: Optional[str] = None) -> List[TaskRecord]:
+        with self._lock:
+            return list(self.tasks.view(f"event:{event_type}" if event_type else "event"))
 
     # Payload utilities ---------------------------------------------------
+    @staticmethod
+    def _prepare_priority_fields(payload: Dict[str, Any]) -> Dict[str, Any]:
+        def _text(key: str) -> Optional[str]:
+            value = payload.get(key)
+            if value is None:
+                return None
+            value = str(value).strip()
+            return value or None
+
+        def _int(key: str, low: int, high: int) -> Optional[int]:
+            value = payload.get(key)
+            if value in (None, ""):
+                return None
+            try:
+                value = int(value)
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"{key} must be an integer") from exc
+            if not low <= value <= high:
+                raise ValueError(f"{key} must be between {low} and {high}")
+            return value
+
+        profile = _text("priority_profile")
+        if profile and profile not in PRIORITY_PROFILES:
+            raise ValueError(f"unknown priority profile: {profile}")
+        ioprio_class = _text("ioprio_class")
+        if ioprio_class and ioprio_class not in IOPRIO_CLASSES:
+            raise ValueError("ioprio_class must be 'idle' or 'best-effort'")
+        sched_policy = _text("sched_policy")
+        if sched_policy and sched_policy not in SCHED_POLICIES:
+            raise ValueError("sched_policy must be 'other', 'batch' or 'idle'")
+        cpu_affinity = _text("cpu_affinity")
+        if cpu_affinity:
+            cpu_affinity = format_cpu_list(parse_cpu_list(cpu_affinity))
+        return {
+            "priority_profile": profile,
+            "nice": _int("nice", -20, 19),
+            "ioprio_class": ioprio_class,
+            "ioprio_level": _int("ioprio_level", 0, 7),
+            "sched_policy": sched_policy,
+            "cpu_affinity": cpu_affinity,
+        }
+
+    def _prepare_pipeline_stages(self, value: Any, current_id: Optional[int]) -> Optional[List[Dict[str, Any]]]:
+        """Validate ``pipeline_stages``: a list of ``{"task_id"}`` or ``{"script"}`` entries."""
+
+        if value in (None, "", []):
+            return None
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError as exc:
+                raise ValueError("pipeline_stages format error") from exc
+        if not isinstance(value, list):
+            raise ValueError("pipeline_stages must be a list")
+        if len(value) < 2 or len(value) > PIPELINE_MAX_STAGES:
+            raise ValueError(f"pipeline_stages must contain 2 to {PIPELINE_MAX_STAGES} stages")
+        stages: List[Dict[str, Any]] = []
+        for index, item in enumerate(value, start=1):
+            if not isinstance(item, dict) or ("task_id" in item) == ("script" in item):
+                raise ValueError(f"pipeline stage {index} requires exactly one of task_id or script")
+            stage: Dict[str, Any] = {}
+            if "task_id" in item:
+                try:
+                    task_id = int(item["task_id"])
+                except (TypeError, ValueError) as exc:
+                    raise ValueError(f"pipeline stage {index} task_id must be an integer") from exc
+                source = self.get_task(task_id)
+                if not source:
+                    raise ValueError(f"pipeline stage {index} refers to missing task {task_id}")
+                # 阶段只能引用普通任务，避免嵌套或自引用形成环
+                if task_id == current_id or source.get("pipeline_stages"):
+                    raise ValueError(f"pipeline stage {index} cannot refer to a pipeline task")
+                stage["task_id"] = task_id
+            else:
+                script = item["script"].strip() if isinstance(item["script"], str) else ""
+                if not script:
+                    raise ValueError(f"pipeline stage {index} script is empty")
+                stage["script"] = script
+            name = (item.get("name") or "").strip() if isinstance(item.get("name"), str) else ""
+            if name:
+                stage["name"] = name
+            stages.append(stage)
+        return stages
+
     def _prepare_task_payload(self, payload: Dict[str, Any], is_update: bool) -> Dict[str, Any]:
         trigger_type = payload.get("trigger_type", "schedule")
-        if trigger_type not in {"schedule", "event"}:
-            raise ValueError("trigger_type must be 'schedule' or 'event'")
+        if trigger_type not in TRIGGER_TYPES:
+            raise ValueError("trigger_type must be 'schedule', 'event' or 'interval'")
         name = payload.get("name", "").strip()
         account_raw = payload.get("account", "")
         account = account_raw.strip()
@@ -763,8 +2072,12 @@ class Database:
         if not account:
             raise ValueError("account is required")
         account = ensure_account_allowed(account)
-        script_body = payload.get("script_body", "").strip()
-        if not script_body:
+        script_body = (payload.get("script_body") or "").strip()
+        current_id = payload.get("id")
+        if current_id is not None:
+            current_id = int(current_id)
+        pipeline_stages = self._prepare_pipeline_stages(payload.get("pipeline_stages"), current_id)
+        if not script_body and not pipeline_stages:
             raise ValueError("script body is required")
 
         is_active = bool(payload.get("is_active", True))
@@ -772,18 +2085,43 @@ class Database:
         schedule_expression = schedule_expression_raw.strip() if isinstance(schedule_expression_raw, str) else schedule_expression_raw
         condition_script_raw = payload.get("condition_script")
         condition_script = condition_script_raw.strip() if isinstance(condition_script_raw, str) else condition_script_raw
+        condition_probe = parse_condition_probe(payload.get("condition_probe"))
         condition_interval = max(10, int(payload.get("condition_interval", 60)))
+        splay_seconds = int(payload.get("splay_seconds") or 0)
+        if splay_seconds < 0 or splay_seconds > MAX_SPLAY_SECONDS:
+            raise ValueError(f"splay_seconds must be between 0 and {MAX_SPLAY_SECONDS}")
+        # 以下字段为空表示使用全局默认值（超时）或不限制（资源限制）
+        limits: Dict[str, Optional[int]] = {}
+        for key in ("timeout_seconds", "rlimit_as_mb", "rlimit_cpu_seconds", "rlimit_nofile", "max_defer_seconds"):
+            raw_value = payload.get(key)
+            if raw_value in (None, ""):
+                limits[key] = None
+                continue
+            try:
+                value = int(raw_value)
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"{key} must be an integer") from exc
+            if value <= 0:
+                raise ValueError(f"{key} must be greater than 0")
+            limits[key] = value
+        priority = self._prepare_priority_fields(payload)
+        deferrable = bool(payload.get("is_deferrable", False))
+        concurrency_policy = (payload.get("concurrency_policy") or "skip").strip()
+        if concurrency_policy not in CONCURRENCY_POLICIES:
+            raise ValueError("concurrency_policy must be one of skip/queue/replace/parallel")
+        concurrency_limit = int(payload.get("concurrency_limit") or 1)
+        if concurrency_limit < 1 or concurrency_limit > MAX_CONCURRENCY_LIMIT:
+            raise ValueError(f"concurrency_limit must be between 1 and {MAX_CONCURRENCY_LIMIT}")
         event_type_raw = payload.get("event_type")
         event_type = (event_type_raw or EVENT_TYPE_SCRIPT).strip() if isinstance(event_type_raw, str) else (event_type_raw or EVENT_TYPE_SCRIPT)
+        event_name = (payload.get("event_name") or "").strip() or None
+        mount_filter = payload.get("mount_filter")
         pre_task_ids = payload.get("pre_task_ids") or []
         if isinstance(pre_task_ids, str):
             try:
                 pre_task_ids = json.loads(pre_task_ids)
             except json.JSONDecodeError as exc:
                 raise ValueError("pre_task_ids format error") from exc
-        current_id = payload.get("id")
-        if current_id is not None:
-            current_id = int(current_id)
         cleaned: List[int] = []
         for tid in pre_task_ids:
             tid_int = int(tid)
@@ -796,24 +2134,50 @@ class Database:
         next_run_at: Optional[str] = payload.get("next_run_at")
         last_condition_check_at = payload.get("last_condition_check_at")
 
-        if trigger_type == "schedule":
+        interval_seconds: Optional[int] = None
+        if trigger_type == "interval":
+            try:
+                interval_seconds = int(payload.get("interval_seconds") or 0)
+            except (TypeError, ValueError) as exc:
+                raise ValueError("interval_seconds must be an integer") from exc
+            if interval_seconds < MIN_INTERVAL_SECONDS or interval_seconds > MAX_INTERVAL_SECONDS:
+                raise ValueError(f"interval_seconds must be between {MIN_INTERVAL_SECONDS} and {MAX_INTERVAL_SECONDS}")
+            if not is_update or not next_run_at:
+                offset = splay_offset(name, splay_seconds)
+                next_run_at = isoformat(time_now() + timedelta(seconds=interval_seconds + offset))
+            schedule_expression = None
+            condition_script = None
+            condition_probe = None
+            event_type = EVENT_TYPE_SCRIPT
+            event_name = None
+            mount_filter = None
+        elif trigger_type == "schedule":
             if not schedule_expression:
                 raise ValueError("schedule expression is required")
             cron = CronExpression(schedule_expression)
             if not is_update or not next_run_at:
-                next_run_at = isoformat(cron.next_after(time_now()))
+                next_run_at = isoformat(next_fire_time(cron, time_now(), splay_offset(name, splay_seconds, cron.min_gap())))
             condition_script = None
+            condition_probe = None
             event_type = EVENT_TYPE_SCRIPT
+            event_name = None
+            mount_filter = None
         else:
             if event_type not in EVENT_TYPES:
                 raise ValueError("event type is not supported")
             if event_type == EVENT_TYPE_SCRIPT:
-                if not condition_script:
-                    raise ValueError("event tasks require condition script")
+                if not condition_script and not condition_probe:
+                    raise ValueError("event tasks require condition script or condition probe")
                 last_condition_check_at = payload.get("last_condition_check_at")
             else:
                 condition_script = None
+                condition_probe = None
                 last_condition_check_at = None
+            if event_type == EVENT_TYPE_NAMED:
+                event_name = validate_event_name(event_name or "")
+            else:
+                event_name = None
+            mount_filter = parse_mount_filter(mount_filter) if event_type == EVENT_TYPE_MOUNT else None
             schedule_expression = None
 
         return {
@@ -821,12 +2185,23 @@ class Database:
             "account": account,
             "trigger_type": trigger_type,
             "schedule_expression": schedule_expression,
+            "interval_seconds": interval_seconds,
             "condition_script": condition_script,
+            "condition_probe": condition_probe,
             "condition_interval": condition_interval,
             "event_type": event_type,
+            "event_name": event_name,
+            "mount_filter": mount_filter,
             "is_active": is_active,
             "pre_task_ids": pre_task_ids,
             "script_body": script_body,
+            "pipeline_stages": pipeline_stages,
+            "splay_seconds": splay_seconds,
+            "is_deferrable": deferrable,
+            "concurrency_policy": concurrency_policy,
+            "concurrency_limit": concurrency_limit,
+            **limits,
+            **priority,
             "last_run_at": payload.get("last_run_at"),
             "next_run_at": next_run_at,
             "last_condition_check_at": last_condition_check_at,
@@ -837,28 +2212,524 @@ class Database:
 # Scheduler engine
 ###############################################################################
 
+class TokenBucket:
+    """Thread-safe token bucket; ``rate`` tokens per second, ``burst`` capacity."""
+
+    def __init__(self, rate: float, burst: int, monotonic: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._monotonic = monotonic
+        self._tokens = float(self.burst)
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+        # 正在等待令牌的调用方数量
+        self.waiting = 0
+
+    def available(self) -> float:
+        """Tokens available right now, without taking one."""
+
+        with self._lock:
+            return min(self.burst, self._tokens + (self._monotonic() - self._updated) * self.rate)
+
+    def reserve(self) -> float:
+        """Take one token without sleeping, borrowing it when the bucket is
+        empty; returns the seconds :meth:`acquire` would have waited."""
+
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate) - 1
+            self._updated = now
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available; returns seconds waited."""
+
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                self.waiting += 1
+            try:
+                time.sleep(delay)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+            waited += delay
+
+
+# 全局进程启动限速，避免整点大量任务同时 fork
+SPAWN_LIMITER = TokenBucket(SPAWN_RATE, SPAWN_BURST)
+
+
+def terminate_process_group(proc: Popen, grace: float = TASK_KILL_GRACE, members: Sequence[Any] = ()) -> None:
+    """Send SIGTERM to the process group of ``proc`` and SIGKILL after ``grace`` seconds.
+
+    ``members`` are further children in the same group (pipeline stages);
+    they are reaped alongside ``proc`` so their zombies do not keep the
+    group alive.
+    """
+
+    if os.name != "posix":
+        if proc.poll() is None:
+            proc.kill()
+        return
+    if not members:
+        terminate_pgid(proc.pid, grace, reap=proc.poll)
+        return
+    terminate_pgid(proc.pid, grace, reap=lambda: [child.poll() for child in (proc, *members)])
+
+
+def terminate_pgid(pgid: int, grace: float = TASK_KILL_GRACE, reap: Optional[Callable[[], Any]] = None) -> None:
+    """SIGTERM process group ``pgid``, escalating to SIGKILL after ``grace`` seconds."""
+
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        return
+    deadline = time.monotonic() + grace
+    while time.monotonic() < deadline:
+        if reap:
+            reap()
+        try:
+            # 信号 0 只检查进程组中是否还有存活进程
+            os.killpg(pgid, 0)
+        except (ProcessLookupError, PermissionError):
+            return
+        time.sleep(0.2)
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def read_process_start_time(pid: int) -> Optional[int]:
+    """Return the start time of ``pid`` in clock ticks since boot (``/proc/<pid>/stat`` field 22)."""
+
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as fh:
+            data = fh.read()
+    except OSError:
+        return None
+    try:
+        # comm 字段可能包含空格和括号，从最后一个 ')' 之后开始解析
+        return int(data[data.rindex(b")") + 2 :].split()[19])
+    except (ValueError, IndexError):
+        return None
+
+
+def wait_for_process_exit(pid: int, start_time: Optional[int]) -> None:
+    """Block until the process identified by ``pid`` and ``start_time`` is gone."""
+
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(pid)
+        except OSError:
+            return
+        try:
+            # 打开 pidfd 之后再核对启动时间，避免 pid 被复用
+            if read_process_start_time(pid) != start_time:
+                return
+            select.select([pidfd], [], [])
+        finally:
+            os.close(pidfd)
+        return
+    while read_process_start_time(pid) == start_time:
+        time.sleep(1)
+
+
+_LIBC: Any = None
+
+
+def _libc() -> Any:
+    global _LIBC  # pylint: disable=global-statement
+    if _LIBC is None:
+        _LIBC = ctypes.CDLL(None, use_errno=True)
+    return _LIBC
+
+
+@functools.lru_cache(maxsize=None)
+def _warn_ioprio_unsupported() -> None:
+    logger.warning("ioprio_set is not supported on %s; I/O priority settings are skipped", platform.machine())
+
+
+def _ioprio_set(io_class: int, level: int) -> None:
+    syscall_nr = IOPRIO_SET_SYSCALLS.get(platform.machine().lower())
+    if syscall_nr is None:
+        raise OSError("ioprio_set is not supported on this architecture")
+    ioprio_who_process = 1
+    if _libc().syscall(syscall_nr, ioprio_who_process, 0, (io_class << 13) | level) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def resolve_priority_settings(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge a task's own priority fields over its referenced profile."""
+
+    settings: Dict[str, Any] = dict(PRIORITY_PROFILES.get(task.get("priority_profile") or "", {}))
+    for key in ("nice", "ioprio_class", "ioprio_level", "sched_policy", "cpu_affinity"):
+        if task.get(key) is not None:
+            settings[key] = task[key]
+    return settings
+
+
+def apply_priority_settings(settings: Dict[str, Any]) -> None:
+    """Apply nice/ioprio/scheduling policy/affinity to the calling process."""
+
+    if settings.get("nice") is not None:
+        os.setpriority(os.PRIO_PROCESS, 0, int(settings["nice"]))
+    policy_name = SCHED_POLICIES.get(settings.get("sched_policy") or "")
+    if policy_name and hasattr(os, policy_name):
+        os.sched_setscheduler(0, getattr(os, policy_name), os.sched_param(0))
+    io_class = IOPRIO_CLASSES.get(settings.get("ioprio_class") or "")
+    if io_class:
+        level = settings.get("ioprio_level")
+        _ioprio_set(io_class, 0 if io_class == IOPRIO_CLASSES["idle"] else int(4 if level is None else level))
+    if settings.get("cpu_affinity"):
+        os.sched_setaffinity(0, parse_cpu_list(str(settings["cpu_affinity"])))
+
+
+def _decode_output(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def collect_output(
+    buffers: Dict[int, List[bytes]],
+    deadline: float,
+    detach: Optional[threading.Event] = None,
+) -> str:
+    """Read the pipes in ``buffers`` until EOF, ``deadline`` or ``detach``.
+
+    Returns ``eof``, ``timeout`` or ``detached``. Pipes stay open so a
+    detached run can be handed to the next daemon process.
+    """
+
+    with selectors.DefaultSelector() as selector:
+        for fd in buffers:
+            selector.register(fd, selectors.EVENT_READ)
+        while selector.get_map():
+            profile_checkpoint()
+            if detach is not None and detach.is_set():
+                return "detached"
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return "timeout"
+            # 限制单次等待时长，以便及时响应交接请求
+            for key, _ in selector.select(min(remaining, 0.5)):
+                data = os.read(key.fd, OUTPUT_READ_SIZE)
+                if data:
+                    buffers[key.fd].append(data)
+                else:
+                    selector.unregister(key.fd)
+    return "eof"
+
+
+class InheritedProcess:
+    """Popen-like handle for a child inherited across a handover re-exec."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.returncode: Optional[int] = None
+
+    def poll(self) -> Optional[int]:
+        if self.returncode is None:
+            try:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+            except ChildProcessError:
+                self.returncode = -1
+                return self.returncode
+            if pid:
+                self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def wait(self) -> int:
+        if self.returncode is None:
+            try:
+                _, status = os.waitpid(self.pid, 0)
+                self.returncode = os.waitstatus_to_exitcode(status)
+            except ChildProcessError:
+                self.returncode = -1
+        return self.returncode
+
+    def kill(self) -> None:
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class RunRecord:
+    """A live run of a task as tracked by :class:`RunRegistry`."""
+
+    __slots__ = ("task_id", "trigger_reason", "runner", "result_id", "pid", "started_at")
+
+    def __init__(self, task_id: int, trigger_reason: str):
+        self.task_id = task_id
+        self.trigger_reason = trigger_reason
+        self.runner: Optional["TaskRunner"] = None
+        self.result_id: Optional[int] = None
+        self.pid: Optional[int] = None
+        self.started_at = time_now()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "result_id": self.result_id,
+            "pid": self.pid,
+            "trigger_reason": self.trigger_reason,
+            "started_at": isoformat(self.started_at),
+        }
+
+
+# 排队中的一次派发：(task, trigger_reason, event payload)
+PendingRun = tuple[Dict[str, Any], str, Optional[Dict[str, Any]]]
+
+
+class RunRegistry:
+    """In-memory registry of live runs and queued dispatches per task.
+
+    This is the authority for overlap decisions; the dispatch path never
+    queries ``task_results`` for running rows.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._running: Dict[int, List[RunRecord]] = {}
+        self._pending: Dict[int, Deque[PendingRun]] = {}
+        # 与 _pending 一一对应的入队时刻（单调时钟）
+        self._pending_since: Dict[int, Deque[float]] = {}
+
+    def running(self, task_id: int) -> List[RunRecord]:
+        with self.lock:
+            return list(self._running.get(task_id, ()))
+
+    def is_running(self, task_id: int) -> bool:
+        with self.lock:
+            return bool(self._running.get(task_id))
+
+    def add(self, record: RunRecord) -> None:
+        with self.lock:
+            self._running.setdefault(record.task_id, []).append(record)
+
+    def remove(self, record: RunRecord) -> Optional[PendingRun]:
+        """Forget ``record`` and pop the next queued dispatch of its task, if any."""
+
+        with self.lock:
+            records = self._running.get(record.task_id, [])
+            if record not in records:
+                # 已被取消操作提前释放过，不再重复出队
+                return None
+            records.remove(record)
+            if not records:
+                self._running.pop(record.task_id, None)
+            pending = self._pending.get(record.task_id)
+            if not pending:
+                return None
+            item = pending.popleft()
+            self._pending_since[record.task_id].popleft()
+            if not pending:
+                self._pending.pop(record.task_id, None)
+                self._pending_since.pop(record.task_id, None)
+            return item
+
+    def enqueue(
+        self, task: Dict[str, Any], trigger_reason: str, limit: int, payload: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        with self.lock:
+            pending = self._pending.setdefault(task["id"], deque())
+            if len(pending) >= limit:
+                return False
+            pending.append((task, trigger_reason, payload))
+            self._pending_since.setdefault(task["id"], deque()).append(time.monotonic())
+            return True
+
+    def coalesce(self, task_id: int, trigger_reason: str, payload: Optional[Dict[str, Any]]) -> bool:
+        """Fold a dispatch into a queued one with the same trigger; the newest payload wins."""
+
+        with self.lock:
+            pending = self._pending.get(task_id, ())
+            for index, (task, queued_reason, _) in enumerate(pending):
+                if queued_reason == trigger_reason:
+                    pending[index] = (task, queued_reason, payload)  # type: ignore[index]
+                    return True
+            return False
+
+    def find(self, task_id: int, result_id: int) -> Optional[RunRecord]:
+        with self.lock:
+            for record in self._running.get(task_id, ()):
+                if record.result_id == result_id:
+                    return record
+            return None
+
+    def records(self) -> List[RunRecord]:
+        with self.lock:
+            return [record for records in self._running.values() for record in records]
+
+    def pending_items(self) -> List[PendingRun]:
+        with self.lock:
+            return [item for items in self._pending.values() for item in items]
+
+    def drop_pending(self, task_id: int) -> int:
+        with self.lock:
+            self._pending_since.pop(task_id, None)
+            return len(self._pending.pop(task_id, ()))
+
+    def load(self) -> Dict[str, Any]:
+        """Counts of live and queued runs and the monotonic time of the oldest queued one."""
+
+        with self.lock:
+            return {
+                "running": sum(len(records) for records in self._running.values()),
+                "queued": sum(len(items) for items in self._pending.values()),
+                "oldest_queued": min((since[0] for since in self._pending_since.values()), default=None),
+            }
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "running": [record.to_dict() for records in self._running.values() for record in records],
+                "pending": {str(task_id): len(items) for task_id, items in self._pending.items()},
+            }
+
+
+class AdoptedRun(threading.Thread):
+    """Monitors a run left behind by a previous daemon instance until it exits.
+
+    Its output pipe died with the old daemon and it is not our child, so
+    only its exit can be observed; the row is finalized as ``unknown``.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        task: Dict[str, Any],
+        record: RunRecord,
+        pid_start_time: Optional[int],
+        on_exit: Optional[Callable[["AdoptedRun"], None]] = None,
+    ):
+        super().__init__(daemon=True)
+        self.db = db
+        self.task = task
+        self.record = record
+        self.record.runner = self  # type: ignore[assignment]
+        self.pid_start_time = pid_start_time
+        self.on_exit = on_exit
+        self.cancel_reason: Optional[str] = None
+
+    def run(self) -> None:
+        try:
+            wait_for_process_exit(self.record.pid, self.pid_start_time)  # type: ignore[arg-type]
+            if self.cancel_reason:
+                status, message = "cancelled", f"task cancelled: {self.cancel_reason}"
+            else:
+                status, message = "unknown", "run was adopted after a scheduler restart; exit status is unavailable"
+            self.db.finalize_result(self.record.result_id, status, message)  # type: ignore[arg-type]
+            self.db.update_last_run(self.record.task_id)
+        finally:
+            if self.on_exit:
+                self.on_exit(self)  # type: ignore[arg-type]
+
+    def cancel(self, reason: str) -> None:
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+        if read_process_start_time(self.record.pid) == self.pid_start_time:  # type: ignore[arg-type]
+            threading.Thread(target=terminate_pgid, args=(self.record.pid,), daemon=True).start()
+
+
 class TaskRunner(threading.Thread):
-    def __init__(self, db: Database, task: Dict[str, Any], trigger_reason: str):
+    def __init__(
+        self,
+        db: Database,
+        task: Dict[str, Any],
+        trigger_reason: str,
+        record: Optional[RunRecord] = None,
+        on_exit: Optional[Callable[["TaskRunner"], None]] = None,
+        wait_for: Optional[List["TaskRunner"]] = None,
+        resume: Optional[Dict[str, Any]] = None,
+        payload: Optional[Dict[str, Any]] = None,
+    ):
         super().__init__(daemon=True)
         self.db = db
         self.task = task
         self.trigger_reason = trigger_reason
+        self.payload = payload
+        self.record = record or RunRecord(task["id"], trigger_reason)
+        self.record.runner = self
+        self.on_exit = on_exit
+        self.wait_for = wait_for or []
+        # 第一个进程为进程组组长，流水线任务的其余阶段依次在后
+        self.processes: List[Any] = []
+        self.cancel_reason: Optional[str] = None
+        self._process_lock = threading.Lock()
+        # 热重启交接：resume 为旧进程移交的运行状态，handover_state 为移交给新进程的状态
+        self.resume = resume
+        self.handover_state: Optional[Dict[str, Any]] = None
+        self._detach = threading.Event()
+        # 流水线任务各阶段的退出码与日志，普通任务为 None
+        self.stage_results: Optional[List[Dict[str, Any]]] = None
 
     def run(self) -> None:
         task_id = self.task["id"]
-        logger.info("Executing task %s (%s)", task_id, self.trigger_reason)
-        result_id = self.db.record_result_start(task_id, self.trigger_reason)
+        status, log_text = "failed", ""
         try:
-            log_text, status = self._execute_script(self.task["script_body"], TASK_TIMEOUT)
-        except Exception as exc:  # pylint: disable=broad-except
-            status = "failed"
-            log_text = f"task execution exception: {exc!r}"
+            if self.resume is None:
+                # replace 策略：等待被替换的旧实例退出后再启动
+                for previous in self.wait_for:
+                    previous.join()
+                logger.info("Executing task %s (%s)", task_id, self.trigger_reason)
+                self.record.result_id = self.db.record_result_start(task_id, self.trigger_reason)
+            try:
+                if self.resume is None:
+                    waited = SPAWN_LIMITER.acquire()
+                    if waited >= 1:
+                        logger.info("Task %s delayed %.1fs by spawn rate limit", task_id, waited)
+                    timeout = self.task.get("timeout_seconds") or TASK_TIMEOUT
+                    log_text, status = self._execute_script(self.task["script_body"], timeout)
+                else:
+                    log_text, status = self._resume_process()
+            except Exception as exc:  # pylint: disable=broad-except
+                status = "failed"
+                log_text = f"task execution exception: {exc!r}"
+            finally:
+                if self.handover_state is None:
+                    self.db.finalize_result(
+                        self.record.result_id, status, log_text, self.stage_results  # type: ignore[arg-type]
+                    )
+                    self.db.update_last_run(task_id)
         finally:
-            self.db.finalize_result(result_id, status, log_text)
-            self.db.update_last_run(task_id)
+            if self.on_exit:
+                self.on_exit(self)
+
+    def detach(self) -> None:
+        """Stop collecting output so the run can be handed to a re-exec'd daemon."""
+
+        with self._process_lock:
+            self._detach.set()
+
+    def cancel(self, reason: str) -> None:
+        """Stop this run: terminate its process group, or prevent it from starting."""
+
+        with self._process_lock:
+            if self.cancel_reason is None:
+                self.cancel_reason = reason
+            procs = self.processes
+        if any(proc.poll() is None for proc in procs):
+            threading.Thread(target=terminate_process_group, args=(procs[0], TASK_KILL_GRACE, procs[1:]), daemon=True).start()
 
     def _execute_script(self, script: str, timeout: int) -> tuple[str, str]:
-        cmd = self._build_command(script)
         env = os.environ.copy()
         preexec_fn, home_dir = self._prepare_account_context()
         if home_dir:
@@ -871,23 +2742,235 @@ class TaskRunner(threading.Thread):
                 "SCHEDULER_TRIGGER": self.trigger_reason,
             }
         )
+        stdin_file = None
+        if self.payload is not None:
+            event = self.trigger_reason
+            if event.startswith(EVENT_TRIGGER_PREFIX):
+                event = event[len(EVENT_TRIGGER_PREFIX) :]
+            env.update(event_environment(event, self.payload))
+            # 载荷先写入匿名临时文件再作为 stdin，脚本不读取 stdin 时也不会阻塞调度线程
+            stdin_file = tempfile.TemporaryFile()
+            stdin_file.write(json.dumps(self.payload).encode("utf-8"))
+            stdin_file.seek(0)
+        stages = self.task.get("pipeline_stages")
+        if stages:
+            if os.name != "posix":
+                return "pipeline tasks require a POSIX system", "failed"
+            try:
+                stage_names, scripts = self._resolve_stages(stages)
+            except ValueError as exc:
+                return str(exc), "failed"
+        else:
+            stage_names, scripts = None, [script]
         try:
-            completed: CompletedProcess[str] = run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                check=False,
-                env=env,
-                preexec_fn=preexec_fn,
-            )
-        except TimeoutExpired as exc:
-            return f"task execution timeout (> {timeout}s): {exc}", "failed"
-        except Exception as exc:  # pylint: disable=broad-except
-            return str(exc), "failed"
-        output = (completed.stdout or "") + (completed.stderr or "")
-        status = "success" if completed.returncode == 0 else "failed"
-        return output.strip(), status
+            return self._spawn_and_wait(scripts, stage_names, env, preexec_fn, stdin_file, timeout)
+        finally:
+            if stdin_file is not None:
+                stdin_file.close()
+
+    def _spawn_and_wait(
+        self,
+        scripts: List[str],
+        stage_names: Optional[List[str]],
+        env: Dict[str, str],
+        preexec_fn: Optional[Callable[[], None]],
+        stdin_file: Optional[IO[bytes]],
+        timeout: int,
+    ) -> tuple[str, str]:
+        preexec = self._build_preexec(preexec_fn)
+        procs: List[Popen] = []
+        with self._process_lock:
+            if self.cancel_reason:
+                return f"task was not started: {self.cancel_reason}", "cancelled"
+            if self._detach.is_set():
+                return "task was not started: scheduler restarted", "cancelled"
+            try:
+                for index, stage_script in enumerate(scripts):
+                    if stage_names:
+                        env["SCHEDULER_PIPELINE_STAGE"] = str(index + 1)
+                    # 相邻阶段直接以管道相连，中间数据不经过调度器
+                    stdin = procs[-1].stdout if procs else stdin_file
+                    if not stage_names:
+                        # 独立会话/进程组，超时后可连同脚本的后台子进程一起终止
+                        group: Dict[str, Any] = {"start_new_session": os.name == "posix"}
+                    else:
+                        # setpgid 不能跨会话，流水线各阶段留在本会话内，共用以第一个阶段 pid 为号的进程组
+                        group = {"process_group": procs[0].pid if procs else 0}
+                    proc = Popen(
+                        self._build_command(stage_script),
+                        stdin=stdin,
+                        stdout=PIPE,
+                        stderr=PIPE,
+                        env=env,
+                        preexec_fn=preexec,
+                        **group,
+                    )
+                    if procs:
+                        procs[-1].stdout.close()  # type: ignore[union-attr]
+                    procs.append(proc)
+            except Exception as exc:  # pylint: disable=broad-except
+                if procs:
+                    terminate_process_group(procs[0], members=procs[1:])
+                    for started in procs:
+                        started.wait()
+                return str(exc), "failed"
+            self.processes = procs
+            self.record.pid = procs[0].pid
+        if self.record.result_id is not None:
+            self.db.record_result_pid(self.record.result_id, procs[0].pid, read_process_start_time(procs[0].pid))
+        if os.name != "posix":
+            return self._communicate(procs[0], timeout)
+        streams = [procs[-1].stdout] + [proc.stderr for proc in procs]
+        return self._await_processes(procs, streams, [b""] * len(streams), stage_names, time.monotonic() + timeout, timeout)
+
+    def _resolve_stages(self, stages: List[Dict[str, Any]]) -> tuple[List[str], List[str]]:
+        names: List[str] = []
+        scripts: List[str] = []
+        for index, stage in enumerate(stages, start=1):
+            if stage.get("task_id") is not None:
+                source = self.db.get_task(int(stage["task_id"]))
+                if not source:
+                    raise ValueError(f"pipeline stage {index} refers to missing task {stage['task_id']}")
+                if source.get("pipeline_stages"):
+                    raise ValueError(f"pipeline stage {index} refers to pipeline task {source['id']}")
+                names.append(stage.get("name") or source["name"])
+                scripts.append(source["script_body"])
+            else:
+                names.append(stage.get("name") or f"stage {index}")
+                scripts.append(stage["script"])
+        return names, scripts
+
+    def _communicate(self, proc: Popen, timeout: float) -> tuple[str, str]:
+        # Windows 管道不支持 select，也不参与热重启交接
+        timed_out = False
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except TimeoutExpired:
+            timed_out = True
+            proc.kill()
+            stdout, stderr = proc.communicate()
+        output = (_decode_output(stdout) + _decode_output(stderr)).strip()
+        return self._format_result(output, proc.returncode, timed_out, timeout)
+
+    def _resume_process(self) -> tuple[str, str]:
+        state = self.resume or {}
+        procs = [InheritedProcess(pid) for pid in state["pids"]]
+        streams = []
+        for fd in state["stream_fds"]:
+            os.set_inheritable(fd, False)
+            streams.append(os.fdopen(fd, "rb", buffering=0))
+        with self._process_lock:
+            self.processes = procs
+            self.record.pid = procs[0].pid
+        captured = [text.encode("latin-1") for text in state["output"]]
+        deadline = time.monotonic() + state["remaining"]
+        return self._await_processes(procs, streams, captured, state.get("stages"), deadline, state["timeout"])
+
+    def _await_processes(
+        self,
+        procs: List[Any],
+        streams: List[Any],
+        captured: List[bytes],
+        stage_names: Optional[List[str]],
+        deadline: float,
+        timeout: float,
+    ) -> tuple[str, str]:
+        """Collect output of ``procs`` until they exit, time out or are detached.
+
+        ``streams`` is the final stdout followed by the stderr of each
+        process; ``procs[0]`` leads the process group.
+        """
+
+        fds = [stream.fileno() for stream in streams]
+        buffers = {fd: [data] for fd, data in zip(fds, captured)}
+        outcome = collect_output(buffers, deadline, self._detach)
+        if outcome == "detached":
+            self.handover_state = {
+                "task_id": self.task["id"],
+                "trigger_reason": self.trigger_reason,
+                "result_id": self.record.result_id,
+                "started_at": isoformat(self.record.started_at),
+                "pids": [proc.pid for proc in procs],
+                "stream_fds": fds,
+                # latin-1 可无损往返任意字节，避免截断的多字节字符被替换
+                "output": [b"".join(buffers[fd]).decode("latin-1") for fd in fds],
+                "stages": stage_names,
+                "remaining": max(0.0, deadline - time.monotonic()),
+                "timeout": timeout,
+            }
+            return "", "detached"
+        timed_out = outcome == "timeout"
+        if timed_out:
+            terminate_process_group(procs[0], members=procs[1:])
+            if collect_output(buffers, time.monotonic() + 5) == "timeout":
+                # 有子进程脱离了进程组并继续持有输出管道，放弃剩余输出
+                for proc in procs:
+                    proc.kill()
+        for stream in streams:
+            stream.close()
+        for proc in procs:
+            proc.wait()
+        outputs = [_decode_output(b"".join(buffers[fd])) for fd in fds]
+        if not stage_names:
+            return self._format_result((outputs[0] + outputs[1]).strip(), procs[0].returncode, timed_out, timeout)
+        # 流水线：各阶段的 stderr 与退出码分别记录，任一阶段失败即整体失败
+        self.stage_results = [
+            {"name": name, "exit_code": proc.returncode, "log": log.strip()}
+            for name, proc, log in zip(stage_names, procs, outputs[1:])
+        ]
+        lines = []
+        for index, stage in enumerate(self.stage_results, start=1):
+            lines.append(f"[stage {index}/{len(stage_names)}: {stage['name']}] exit code {stage['exit_code']}")
+            if stage["log"]:
+                lines.append(stage["log"])
+        if outputs[0].strip():
+            lines.extend(["[output]", outputs[0].strip()])
+        failed = any(stage["exit_code"] != 0 for stage in self.stage_results)
+        return self._format_result("\n".join(lines), 1 if failed else 0, timed_out, timeout)
+
+    def _format_result(self, output: str, returncode: Optional[int], timed_out: bool, timeout: float) -> tuple[str, str]:
+        if self.cancel_reason:
+            message = f"task cancelled: {self.cancel_reason}"
+            return (f"{output}\n{message}" if output else message), "cancelled"
+        if timed_out:
+            message = f"task execution timeout (> {timeout:g}s), process group terminated"
+            return (f"{output}\n{message}" if output else message), "failed"
+        status = "success" if returncode == 0 else "failed"
+        return output, status
+
+    def _build_preexec(self, changer: Optional[Callable[[], None]]) -> Optional[Callable[[], None]]:
+        limits = []
+        if resource is not None:
+            for key, limit_name, scale in (
+                ("rlimit_as_mb", "RLIMIT_AS", 1024 * 1024),
+                ("rlimit_cpu_seconds", "RLIMIT_CPU", 1),
+                ("rlimit_nofile", "RLIMIT_NOFILE", 1),
+            ):
+                value = self.task.get(key)
+                if value and hasattr(resource, limit_name):
+                    limits.append((getattr(resource, limit_name), int(value) * scale))
+        priority = resolve_priority_settings(self.task) if os.name == "posix" else {}
+        if not limits and not priority:
+            return changer
+        if priority.get("ioprio_class"):
+            if platform.machine().lower() in IOPRIO_SET_SYSCALLS:
+                # 在父进程中预先加载 libc，避免 fork 后的子进程里做动态加载
+                _libc()
+            else:
+                # 未知架构没有 ioprio_set 调用号，只跳过 I/O 优先级，其余设置照常生效
+                _warn_ioprio_unsupported()
+                priority = {key: value for key, value in priority.items() if key not in ("ioprio_class", "ioprio_level")}
+
+        def _preexec() -> None:
+            # 在切换账户之前设置，软硬限制相同，脚本无法自行调高；
+            # 负的 nice 值也只有 root 才能设置
+            for limit, value in limits:
+                resource.setrlimit(limit, (value, value))  # type: ignore[union-attr]
+            apply_priority_settings(priority)
+            if changer:
+                changer()
+
+        return _preexec
 
     @staticmethod
     def _build_command(script: str) -> List[str]:
@@ -941,87 +3024,987 @@ class TaskRunner(threading.Thread):
         return (_changer, pw_record.pw_dir)
 
 
-class SchedulerEngine:
+class ProbeSnapshot:
+    """System facts read by condition probes, memoized for one scheduler tick."""
+
+    def __init__(self):
+        self._free: Dict[str, Optional[float]] = {}
+        self._comms: Optional[Set[str]] = None
+        self._processes: Optional[List[tuple[str, str, str]]] = None
+        self._ports: Optional[Set[int]] = None
+        self._psi: Dict[str, Optional[float]] = {}
+
+    @staticmethod
+    def _pids() -> List[str]:
+        try:
+            return [entry for entry in os.listdir("/proc") if entry.isdigit()]
+        except OSError:
+            return []
+
+    def comms(self) -> Set[str]:
+        if self._comms is None:
+            comms = set()
+            for pid in self._pids():
+                try:
+                    with open(f"/proc/{pid}/comm", "rb") as fh:
+                        comms.add(fh.read().decode("utf-8", "replace").rstrip("\n"))
+                except OSError:
+                    continue
+            self._comms = comms
+        return self._comms
+
+    def processes(self) -> List[tuple[str, str, str]]:
+        """``(comm, argv[0] file name, cmdline)`` of every process that has a command line."""
+
+        if self._processes is None:
+            processes = []
+            for pid in self._pids():
+                try:
+                    with open(f"/proc/{pid}/cmdline", "rb") as fh:
+                        raw = fh.read()
+                    if not raw:
+                        continue
+                    with open(f"/proc/{pid}/comm", "rb") as fh:
+                        comm = fh.read().decode("utf-8", "replace").rstrip("\n")
+                except OSError:
+                    continue
+                args = raw.rstrip(b"\0")
+                argv0 = os.path.basename(args.split(b"\0", 1)[0]).decode("utf-8", "replace")
+                processes.append((comm, argv0, args.replace(b"\0", b" ").decode("utf-8", "replace")))
+            self._processes = processes
+        return self._processes
+
+    def listening_ports(self) -> Optional[Set[int]]:
+        """TCP ports in LISTEN state, or None when ``/proc/net/tcp`` is unavailable."""
+
+        if self._ports is None:
+            ports: Set[int] = set()
+            found = False
+            for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+                try:
+                    with open(table, "r", encoding="ascii") as fh:
+                        next(fh, None)
+                        for line in fh:
+                            fields = line.split()
+                            # 第 4 列为连接状态，0A 表示 LISTEN
+                            if len(fields) > 3 and fields[3] == "0A":
+                                ports.add(int(fields[1].rsplit(":", 1)[1], 16))
+                    found = True
+                except (OSError, ValueError):
+                    continue
+            if not found:
+                return None
+            self._ports = ports
+        return self._ports
+
+    def free_percent(self, path: str) -> Optional[float]:
+        if path not in self._free:
+            try:
+                st = os.statvfs(path)
+                self._free[path] = st.f_bavail * 100.0 / st.f_blocks if st.f_blocks else None
+            except OSError:
+                self._free[path] = None
+        return self._free[path]
+
+    def psi(self, resource_name: str) -> Optional[float]:
+        if resource_name not in self._psi:
+            self._psi[resource_name] = AdmissionController.read_psi(resource_name)
+        return self._psi[resource_name]
+
+
+class ProbeEvaluator:
+    """Evaluates declarative condition probes in-process, without spawning commands."""
+
+    def __init__(self):
+        # path_changed 的基线：(task_id, path) -> 文件签名
+        self._signatures: Dict[tuple[int, str], Optional[tuple[int, int, int]]] = {}
+
+    def evaluate(self, probe: Dict[str, Any], task_id: int, snapshot: ProbeSnapshot) -> bool:
+        kind = probe.get("type")
+        if kind == "all":
+            return all(self.evaluate(item, task_id, snapshot) for item in probe["probes"])
+        if kind == "any":
+            return any(self.evaluate(item, task_id, snapshot) for item in probe["probes"])
+        if kind == "not":
+            return not self.evaluate(probe["probe"], task_id, snapshot)
+        if kind == "path_exists":
+            return os.path.exists(probe["path"])
+        if kind == "path_changed":
+            return self._path_changed(task_id, probe["path"])
+        if kind == "disk_free":
+            return self._compare(snapshot.free_percent(probe["path"]), probe)
+        if kind == "process":
+            name = probe.get("name")
+            pattern = probe.get("cmdline")
+            long_name = bool(name) and len(name) > PROCESS_COMM_MAX
+            if not pattern and not long_name:
+                return name in snapshot.comms()
+            # 名称与命令行须由同一个进程满足
+            return any(
+                (not name or (argv0 if long_name else comm) == name)
+                and (not pattern or fnmatch.fnmatchcase(cmdline, pattern))
+                for comm, argv0, cmdline in snapshot.processes()
+            )
+        if kind == "port_open":
+            ports = snapshot.listening_ports()
+            if ports is not None:
+                return probe["port"] in ports
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                sock.settimeout(0.5)
+                return sock.connect_ex(("127.0.0.1", probe["port"])) == 0
+        if kind == "load":
+            try:
+                return self._compare(os.getloadavg()[0], probe)
+            except (AttributeError, OSError):
+                return False
+        if kind == "pressure":
+            return self._compare(snapshot.psi(probe["resource"]), probe)
+        return False
+
+    def prune(self, probes: Dict[int, Dict[str, Any]]) -> None:
+        """Drop ``path_changed`` baselines no longer referenced by ``probes`` (task id -> probe)."""
+
+        live: Set[tuple[int, str]] = set()
+        for task_id, probe in probes.items():
+            pending = [probe]
+            while pending:
+                item = pending.pop()
+                if item.get("type") == "path_changed":
+                    live.add((task_id, item["path"]))
+                pending.extend(item.get("probes") or ())
+                if item.get("probe"):
+                    pending.append(item["probe"])
+        self._signatures = {key: value for key, value in self._signatures.items() if key in live}
+
+    def _path_changed(self, task_id: int, path: str) -> bool:
+        try:
+            st = os.stat(path)
+            signature: Optional[tuple[int, int, int]] = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            signature = None
+        key = (task_id, path)
+        # 首次检查只记录基线
+        changed = key in self._signatures and self._signatures[key] != signature
+        self._signatures[key] = signature
+        return changed
+
+    @staticmethod
+    def _compare(value: Optional[float], probe: Dict[str, Any]) -> bool:
+        if value is None:
+            return False
+        if "below" in probe and not value < probe["below"]:
+            return False
+        if "above" in probe and not value > probe["above"]:
+            return False
+        return True
+
+
+class ConditionCache:
+    """Results of condition scripts shared by every task with the same check.
+
+    Entries are keyed by account and normalized script text, so N tasks
+    polling the same condition cost one fork per window.
+    """
+
+    def __init__(self, ttl: float = CONDITION_CACHE_TTL):
+        self.ttl = ttl
+        # 多个 condition-check 线程会同时写入
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple[str, str], tuple[float, bool]] = {}
+
+    @staticmethod
+    def key(task: Dict[str, Any]) -> tuple[str, str]:
+        script = task.get("condition_script") or ""
+        # 忽略换行风格、行尾空白与空行的差异
+        lines = [line.rstrip() for line in script.replace("\r\n", "\n").split("\n")]
+        return (task.get("account") or "", "\n".join(line for line in lines if line))
+
+    def get(self, key: tuple[str, str], max_age: float) -> Optional[bool]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] >= min(self.ttl, max_age):
+            return None
+        return entry[1]
+
+    def put(self, key: tuple[str, str], ok: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for expired in [k for k, v in self._entries.items() if now - v[0] >= self.ttl]:
+                del self._entries[expired]
+            self._entries[key] = (now, ok)
+
+
+class AdmissionController:
+    """Decides whether deferrable tasks may start given current system pressure.
+
+    Reads ``/proc/pressure/{cpu,io,memory}`` (Linux PSI) and the load
+    average, at most once per second.
+    """
+
+    PSI_RESOURCES = ("cpu", "io", "memory")
+
+    def __init__(self):
+        self.thresholds = {
+            "cpu": PRESSURE_CPU_MAX,
+            "io": PRESSURE_IO_MAX,
+            "memory": PRESSURE_MEMORY_MAX,
+        }
+        self.loadavg_max = LOADAVG_PER_CPU_MAX
+        self._lock = threading.Lock()
+        self._sampled_at = 0.0
+        self._sample: Dict[str, float] = {}
+
+    @staticmethod
+    def read_psi(resource_name: str) -> Optional[float]:
+        """Return the ``some avg10`` percentage for a PSI resource, or None."""
+
+        try:
+            with open(f"/proc/pressure/{resource_name}", "r", encoding="ascii") as fh:
+                for line in fh:
+                    if line.startswith("some "):
+                        for field in line.split()[1:]:
+                            if field.startswith("avg10="):
+                                return float(field[6:])
+        except (OSError, ValueError):
+            return None
+        return None
+
+    def sample(self) -> Dict[str, float]:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._sampled_at < 1.0:
+                return self._sample
+            sample: Dict[str, float] = {}
+            for name in self.PSI_RESOURCES:
+                value = self.read_psi(name)
+                if value is not None:
+                    sample[name] = value
+            try:
+                sample["loadavg"] = os.getloadavg()[0] / (os.cpu_count() or 1)
+            except (AttributeError, OSError):
+                pass
+            self._sample = sample
+            self._sampled_at = now
+            return sample
+
+    def pressure_reason(self) -> Optional[str]:
+        """Describe which threshold is exceeded, or None when the system is idle enough."""
+
+        sample = self.sample()
+        for name in self.PSI_RESOURCES:
+            limit = self.thresholds[name]
+            value = sample.get(name)
+            if limit > 0 and value is not None and value > limit:
+                return f"{name} pressure {value:.1f}% > {limit:.1f}%"
+        value = sample.get("loadavg")
+        if self.loadavg_max > 0 and value is not None and value > self.loadavg_max:
+            return f"load average per cpu {value:.2f} > {self.loadavg_max:.2f}"
+        return None
+
+
+def _unescape_mount_field(value: str) -> str:
+    # mountinfo 以八进制转义空格、制表符、换行与反斜杠，udev 标签以 \xNN 转义
+    if "\\" not in value:
+        return value
+    raw = value.encode("utf-8", "surrogateescape").decode("unicode_escape")
+    return raw.encode("latin-1").decode("utf-8", "replace")
+
+
+def read_mount_table(path: str = MOUNTINFO_PATH) -> Dict[tuple[str, str, str, str], Dict[str, str]]:
+    """Parse ``mountinfo`` into entries keyed by (mount id, mountpoint, source, fstype)."""
+
+    table: Dict[tuple[str, str, str, str], Dict[str, str]] = {}
+    with open(path, "r", encoding="utf-8", errors="surrogateescape") as fh:
+        for line in fh:
+            fields = line.split()
+            try:
+                separator = fields.index("-", 6)
+            except ValueError:
+                continue
+            if len(fields) < separator + 3:
+                continue
+            entry = {
+                "mountpoint": _unescape_mount_field(fields[4]),
+                "fstype": fields[separator + 1],
+                "source": _unescape_mount_field(fields[separator + 2]),
+                "options": fields[5],
+            }
+            table[(fields[0], entry["mountpoint"], entry["source"], entry["fstype"])] = entry
+    return table
+
+
+def read_disk_labels(directory: str = DISK_LABEL_DIR) -> Dict[str, str]:
+    """Map resolved block device paths to filesystem labels."""
+
+    labels: Dict[str, str] = {}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return labels
+    for name in names:
+        device = os.path.realpath(os.path.join(directory, name))
+        labels[device] = _unescape_mount_field(name)
+    return labels
+
+
+class MountWatcher(threading.Thread):
+    """Waits for mount table changes and reports mounted/unmounted entries.
+
+    The kernel flags ``/proc/self/mountinfo`` with POLLPRI/POLLERR whenever
+    the mount table changes, so no periodic scan or fork is needed.
+    """
+
+    def __init__(self, on_change: Callable[[str, Dict[str, str]], None], stop_event: threading.Event):
+        super().__init__(daemon=True, name="mount-watcher")
+        self.on_change = on_change
+        self.stop_event = stop_event
+        self._table: Dict[tuple[str, str, str, str], Dict[str, str]] = {}
+
+    @staticmethod
+    def supported() -> bool:
+        return hasattr(select, "poll") and os.path.exists(MOUNTINFO_PATH)
+
+    def run(self) -> None:
+        # 该描述符只用于等待变化通知，内容由 read_mount_table 重新读取
+        with open(MOUNTINFO_PATH, "rb") as fh:
+            # 内核在打开时记录挂载表的事件计数，基线须在打开之后读取，
+            # 否则两者之间发生的挂载/卸载不会触发 POLLPRI
+            self._table = read_mount_table()
+            self._attach_labels(self._table.values())
+            poller = select.poll()
+            poller.register(fh.fileno(), select.POLLPRI | select.POLLERR)
+            while not self.stop_event.is_set():
+                # 超时仅用于检查退出标志
+                if not poller.poll(1000):
+                    continue
+                try:
+                    self._diff()
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.warning("Mount table diff failed: %s", exc)
+
+    @staticmethod
+    def _attach_labels(entries: Iterable[Dict[str, str]]) -> None:
+        # 卷标在首次发现挂载时记录：设备拔出后 by-label 链接已消失，卸载事件沿用记录的卷标
+        labels = read_disk_labels()
+        for entry in entries:
+            entry["label"] = labels.get(os.path.realpath(entry["source"]), "")
+
+    def _diff(self) -> None:
+        table = read_mount_table()
+        removed = [self._table[key] for key in self._table.keys() - table.keys()]
+        added = [table[key] for key in table.keys() - self._table.keys()]
+        for key in table.keys() & self._table.keys():
+            table[key]["label"] = self._table[key]["label"]
+        if added:
+            self._attach_labels(added)
+        self._table = table
+        if not removed and not added:
+            return
+        for action, entries in (("unmount", removed), ("mount", added)):
+            for entry in entries:
+                details = {"action": action, **entry}
+                logger.info("Detected %s of %s (%s, %s)", action, entry["mountpoint"], entry["fstype"], entry["source"])
+                self.on_change(action, details)
+
+
+class EventIndex:
+    """Named event -> subscribed tasks, rebuilt only when task definitions change."""
+
     def __init__(self, db: Database):
         self.db = db
+        self._lock = threading.Lock()
+        self._generation: Optional[tuple] = None
+        self._subscribers: Dict[str, List[Dict[str, Any]]] = {}
+        self._mount_tasks: List[Dict[str, Any]] = []
+
+    def _current(self) -> Dict[str, List[Dict[str, Any]]]:
+        generation = self.db.generation("task_defs")
+        with self._lock:
+            if generation != self._generation:
+                index: Dict[str, List[Dict[str, Any]]] = {}
+                for task in self.db.fetch_event_tasks(event_type=EVENT_TYPE_NAMED):
+                    index.setdefault(task["event_name"], []).append(task)
+                self._subscribers = index
+                self._mount_tasks = self.db.fetch_event_tasks(event_type=EVENT_TYPE_MOUNT)
+                self._generation = generation
+            return self._subscribers
+
+    def subscribers(self, name: str) -> List[Dict[str, Any]]:
+        return list(self._current().get(name, ()))
+
+    def mount_tasks(self) -> List[Dict[str, Any]]:
+        self._current()
+        return list(self._mount_tasks)
+
+    def summary(self) -> Dict[str, List[int]]:
+        return {name: [task["id"] for task in tasks] for name, tasks in self._current().items()}
+
+
+class TimerEntry:
+    """A task tracked by :class:`PreciseTimer` with its next monotonic deadline."""
+
+    __slots__ = ("task", "cron", "period", "deadline", "slot")
+
+    def __init__(self, task: Dict[str, Any], cron: Optional[CronExpression], period: Optional[float]):
+        self.task = task
+        self.cron = cron
+        self.period = period
+        self.deadline = 0.0
+        # 本次 deadline 对应的墙上时间（秒级 cron 以此为基准推算下一槽位）
+        self.slot = time_now()
+
+    def signature(self) -> tuple:
+        task = self.task
+        return (task.get("schedule_expression"), task.get("interval_seconds"), task.get("splay_seconds"), task.get("name"))
+
+
+class PreciseTimer(threading.Thread):
+    """Fires interval and seconds-resolution cron tasks on monotonic deadlines.
+
+    Interval deadlines advance from the previous deadline (``next = previous
+    + period``) rather than from the dispatch time, so they do not drift;
+    cron deadlines are derived from the wall-clock slot that just fired.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        on_fire: Callable[[Dict[str, Any], str, datetime, datetime], None],
+        stop_event: threading.Event,
+    ):
+        super().__init__(daemon=True, name="precise-timer")
+        self.db = db
+        self.on_fire = on_fire
+        self.stop_event = stop_event
+        self._generation: Optional[tuple] = None
+        self._entries: Dict[int, TimerEntry] = {}
+        # (deadline, task_id)；定义变更后旧条目通过与 entry.deadline 比较惰性丢弃
+        self._heap: List[tuple[float, int]] = []
+        self.heartbeat = time.monotonic()
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            profile_checkpoint()
+            self.heartbeat = time.monotonic()
+            try:
+                self._reload()
+                self._fire_due()
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.exception("Precise timer error: %s", exc)
+            delay = self._heap[0][0] - CLOCK.monotonic() if self._heap else 1.0
+            # 最长等待 1 秒，以便及时感知任务定义变更
+            self.stop_event.wait(min(max(delay, 0.0), 1.0))
+
+    def next_deadline(self) -> Optional[float]:
+        """Earliest pending deadline on the :data:`CLOCK` monotonic scale."""
+
+        while self._heap:
+            deadline, task_id = self._heap[0]
+            entry = self._entries.get(task_id)
+            if entry is not None and entry.deadline == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def _reload(self, since: Optional[datetime] = None) -> None:
+        generation = self.db.generation("task_defs")
+        if generation == self._generation:
+            return
+        self._generation = generation
+        entries: Dict[int, TimerEntry] = {}
+        for task in self.db.fetch_timer_tasks():
+            entry = TimerEntry(
+                task,
+                task.cron if task.trigger_type == "schedule" else None,
+                float(task["interval_seconds"]) if task["trigger_type"] == "interval" else None,
+            )
+            previous = self._entries.get(task["id"])
+            if previous is not None and previous.signature() == entry.signature():
+                # 定义未影响调度的修改保留原有相位
+                entry.deadline, entry.slot = previous.deadline, previous.slot
+            else:
+                self._arm(entry, since)
+            entries[task["id"]] = entry
+        self._entries = entries
+        self._heap = [(entry.deadline, task_id) for task_id, entry in entries.items()]
+        heapq.heapify(self._heap)
+
+    def _arm(self, entry: TimerEntry, since: Optional[datetime] = None) -> None:
+        # since：cron 槽位从该时刻之后推算（--simulate 传入起点前一秒，使起点槽位也被包含）
+        now, mono = time_now(), CLOCK.monotonic()
+        if entry.cron is not None:
+            entry.slot = next_fire_time(entry.cron, since or now, task_splay_offset(entry.task))
+        else:
+            # 沿用持久化的 next_run_at 保持重启前的相位；已过期则从现在起算一个周期
+            stored = parse_iso(entry.task.get("next_run_at"))
+            horizon = now + timedelta(seconds=(entry.period or 0) + task_splay_offset(entry.task))
+            if stored is not None and now < stored <= horizon:
+                entry.slot = stored
+            else:
+                entry.slot = now + timedelta(seconds=entry.period or 0)
+        entry.deadline = mono + (entry.slot - now).total_seconds()
+
+    def _fire_due(self) -> None:
+        while self._heap and self._heap[0][0] <= CLOCK.monotonic():
+            deadline, task_id = heapq.heappop(self._heap)
+            entry = self._entries.get(task_id)
+            if entry is None or entry.deadline != deadline:
+                continue
+            slot = entry.slot
+            mono = CLOCK.monotonic()
+            if entry.period is not None:
+                entry.deadline = deadline + entry.period
+                if entry.deadline <= mono:
+                    # 落后超过一个周期（例如系统挂起），跳过错过的周期而不是连续补跑
+                    missed = int((mono - entry.deadline) // entry.period) + 1
+                    entry.deadline += missed * entry.period
+                    logger.info("Task %s skipped %d missed interval(s)", task_id, missed)
+                entry.slot = time_now() + timedelta(seconds=entry.deadline - mono)
+                reason = "interval"
+            else:
+                entry.slot = next_fire_time(entry.cron, max(slot, time_now()), task_splay_offset(entry.task))  # type: ignore[arg-type]
+                entry.deadline = mono + (entry.slot - time_now()).total_seconds()
+                reason = "schedule"
+            heapq.heappush(self._heap, (entry.deadline, task_id))
+            self.on_fire(entry.task, reason, slot, entry.slot)
+
+
+class SchedulerEngine:
+    def __init__(self, db: Database, shutdown_deadline: float = SHUTDOWN_DEADLINE):
+        self.db = db
+        self.shutdown_deadline = shutdown_deadline
         self.stop_event = threading.Event()
-        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread = threading.Thread(target=self._loop, daemon=True, name="scheduler-loop")
         # 记录服务启动时间，用于跳过重启前已过期的定时任务
         self.started_at: Optional[datetime] = None
-
-    def start(self) -> None:
+        self.admission = AdmissionController()
+        self.conditions = ConditionCache()
+        self.probes = ProbeEvaluator()
+        self._probes_generation: Optional[tuple] = None
+        self.events = EventIndex(db)
+        self.timer = PreciseTimer(db, self._fire_timer_task, self.stop_event)
+        # 创建执行器的工厂，模拟模式下替换为不启动进程的 SimulatedRunner
+        self.runner_factory: Callable[..., Any] = TaskRunner
+        # 因系统压力被推迟的任务：task_id -> 首次推迟时间
+        self._deferred: Dict[int, datetime] = {}
+        # 正在后台线程中执行的条件脚本：ConditionCache 键 -> 等待该结果的任务
+        self._conditions_running: Dict[tuple[str, str], List[Dict[str, Any]]] = {}
+        self._conditions_lock = threading.Lock()
+        self.runs = RunRegistry()
+        # 主循环心跳：每轮结束时的单调时钟，以及本轮开始相对预期唤醒的延迟与本轮耗时
+        self.heartbeat = time.monotonic()
+        self.loop_lag = 0.0
+        self.loop_duration = 0.0
+
+    def start(self, handover: Optional[Dict[str, Any]] = None) -> None:
         # 标记启动时刻，之后复核过期任务时会基于此时间跳过历史遗留的执行
         self.started_at = time_now()
+        resumed = self._resume_handover(handover) if handover else set()
+        self._reconcile_running_results(resumed)
         self.thread.start()
-        self._trigger_system_event(EVENT_TYPE_BOOT)
+        self.timer.start()
+        LoopWatchdog(self, self.stop_event).start()
+        if MountWatcher.supported():
+            MountWatcher(self._dispatch_mount, self.stop_event).start()
+        # 热重启不是开机，不触发开机事件任务
+        if handover is None:
+            self._trigger_system_event(EVENT_TYPE_BOOT)
 
     def stop(self) -> None:
         self.stop_event.set()
-        self._trigger_system_event(EVENT_TYPE_SHUTDOWN)
+        self._run_shutdown_tasks(self.shutdown_deadline)
+        self.thread.join(timeout=5)
+
+    def handover(self, timeout: float = TASK_KILL_GRACE) -> Dict[str, Any]:
+        """Stop scheduling and detach live runs for a re-exec'd daemon.
+
+        The returned state lists each detached run (pid, pipe descriptors,
+        output captured so far, remaining timeout) and the queued dispatches.
+        """
+
+        self.stop_event.set()
         self.thread.join(timeout=5)
+        # 先取出排队项：执行线程退出释放槽位时会把它们出队丢弃
+        pending = [[task["id"], trigger_reason, payload] for task, trigger_reason, payload in self.runs.pending_items()]
+        runners = [record.runner for record in self.runs.records() if isinstance(record.runner, TaskRunner)]
+        for runner in runners:
+            runner.detach()
+        runs = []
+        for runner in runners:
+            runner.join(timeout)
+            if runner.handover_state is not None:
+                runs.append(runner.handover_state)
+        return {"runs": runs, "pending": pending}
+
+    def launch(
+        self, task: Dict[str, Any], trigger_reason: str, payload: Optional[Dict[str, Any]] = None
+    ) -> tuple[str, Optional[TaskRunner]]:
+        """Start ``task`` subject to its concurrency policy.
+
+        Returns the outcome (``started``, ``replaced``, ``queued``,
+        ``coalesced`` or ``skipped``) and the runner that was started, if any.
+        ``payload`` is the named-event payload handed to the script.
+        """
+
+        task_id = task["id"]
+        if self.stop_event.is_set() and trigger_reason != "system_shutdown":
+            return "skipped", None
+        policy = task.get("concurrency_policy") or "skip"
+        limit = max(1, int(task.get("concurrency_limit") or 1))
+        with self.runs.lock:
+            active = self.runs.running(task_id)
+            replaced: List[TaskRunner] = []
+            if active and not (policy == "parallel" and len(active) < limit):
+                if policy == "replace":
+                    replaced = [record.runner for record in active if record.runner]
+                elif trigger_reason.startswith(EVENT_TRIGGER_PREFIX):
+                    # 同一事件最多保留一个待运行实例；skip/parallel 策略下事件也不丢弃，当前运行结束后执行一次
+                    if self.runs.coalesce(task_id, trigger_reason, payload):
+                        return "coalesced", None
+                    pending_limit = limit if policy == "queue" else 1
+                    return ("queued" if self.runs.enqueue(task, trigger_reason, pending_limit, payload) else "skipped"), None
+                elif policy == "queue":
+                    return ("queued" if self.runs.enqueue(task, trigger_reason, limit, payload) else "skipped"), None
+                else:
+                    return "skipped", None
+            runner = self._start_runner(task, trigger_reason, replaced, payload)
+        for previous in replaced:
+            previous.cancel("replaced by a newer run")
+        return ("replaced" if replaced else "started"), runner
+
+    def _start_runner(
+        self,
+        task: Dict[str, Any],
+        trigger_reason: str,
+        wait_for: Optional[List[TaskRunner]] = None,
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> TaskRunner:
+        record = RunRecord(task["id"], trigger_reason)
+        runner = self.runner_factory(
+            self.db, task, trigger_reason, record=record, on_exit=self._on_run_exit, wait_for=wait_for, payload=payload
+        )
+        self.runs.add(record)
+        runner.start()
+        return runner
+
+    def publish(self, name: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, List[int]]:
+        """Dispatch named event ``name`` to its subscribers; returns task ids per outcome."""
+
+        result: Dict[str, List[int]] = {}
+        trigger_reason = f"{EVENT_TRIGGER_PREFIX}{name}"
+        for task in self.events.subscribers(name):
+            if not self._dependencies_met(task):
+                outcome = "blocked"
+            else:
+                outcome, _ = self.launch(task, trigger_reason, payload)
+            result.setdefault(outcome, []).append(task["id"])
+        return result
+
+    def health(self) -> Dict[str, Any]:
+        """Liveness of the scheduling loops and the dispatch backlog, from memory only."""
+
+        mono, now = time.monotonic(), time_now()
+        age = mono - self.heartbeat
+        load = self.runs.load()
+        oldest_queued = load.pop("oldest_queued")
+        deferred = list(self._deferred.values())
+        return {
+            "loop": {
+                "heartbeat_age_seconds": round(age, 3),
+                "lag_seconds": round(self.loop_lag, 3),
+                "last_iteration_seconds": round(self.loop_duration, 3),
+                "stalled": age > LOOP_STALL_SECONDS,
+            },
+            "timer": {"heartbeat_age_seconds": round(mono - self.timer.heartbeat, 3)},
+            "runs": load,
+            "oldest_queued_seconds": round(mono - oldest_queued, 3) if oldest_queued is not None else None,
+            "oldest_deferred_seconds": round((now - min(deferred)).total_seconds(), 3) if deferred else None,
+        }
+
+    def _dispatch_mount(self, action: str, details: Dict[str, str]) -> None:
+        for task in self.events.mount_tasks():
+            spec = task.get("mount_filter") or {}
+            if spec.get("on", "mount") not in (action, "both"):
+                continue
+            if not all(fnmatch.fnmatchcase(details.get(key, ""), spec[key]) for key in MOUNT_FILTER_FIELDS if key in spec):
+                continue
+            if not self._dependencies_met(task):
+                continue
+            self.launch(task, action, details)
+
+    def cancel_run(self, task_id: int, result_id: int, reason: str) -> Optional[RunRecord]:
+        """Cancel the live run that owns ``result_id``; ``None`` if it is not running."""
+
+        record = self.runs.find(task_id, result_id)
+        if record is not None:
+            self._cancel_record(record, reason)
+        return record
+
+    def cancel_task(self, task_id: int, reason: str) -> int:
+        """Cancel every live run of ``task_id`` and drop its queued runs."""
+
+        with self.runs.lock:
+            self.runs.drop_pending(task_id)
+            records = self.runs.running(task_id)
+        for record in records:
+            self._cancel_record(record, reason)
+        return len(records)
+
+    def _cancel_record(self, record: RunRecord, reason: str) -> None:
+        if record.runner:
+            record.runner.cancel(reason)
+        # 不等待进程组退出，立即释放并发槽位；结果行由执行线程在进程退出后落库
+        self._release(record)
+
+    def _on_run_exit(self, runner: TaskRunner) -> None:
+        self._release(runner.record)
+
+    def _release(self, record: RunRecord) -> None:
+        with self.runs.lock:
+            queued = self.runs.remove(record)
+            if queued is not None and not self.stop_event.is_set():
+                task, trigger_reason, payload = queued
+                logger.info("Starting queued run of task %s", task["id"])
+                self._start_runner(task, trigger_reason, payload=payload)
 
     # Internal ------------------------------------------------------------
+    def _resume_handover(self, state: Dict[str, Any]) -> Set[int]:
+        """Take over the runs detached by the previous process; returns their result ids."""
+
+        resumed: Set[int] = set()
+        for item in state.get("runs", []):
+            task = self.db.get_task(item["task_id"]) or {"id": item["task_id"]}
+            record = RunRecord(item["task_id"], item["trigger_reason"])
+            record.result_id = item["result_id"]
+            record.started_at = parse_iso(item.get("started_at")) or record.started_at
+            runner = TaskRunner(
+                self.db, task, item["trigger_reason"], record=record, on_exit=self._on_run_exit, resume=item
+            )
+            self.runs.add(record)
+            runner.start()
+            resumed.add(item["result_id"])
+        for task_id, trigger_reason, *payload in state.get("pending", []):
+            task = self.db.get_task(task_id)
+            if task:
+                self.launch(task, trigger_reason, payload[0] if payload else None)
+        logger.info("Resumed %d running task(s) from the previous scheduler process", len(resumed))
+        return resumed
+
+    def _reconcile_running_results(self, skip: Optional[Set[int]] = None) -> None:
+        """Resolve ``running`` rows left by a previous daemon instance.
+
+        Rows whose process is gone (or whose pid was reused) are marked
+        ``aborted`` in one batch; rows whose process still lives are
+        registered again and watched until it exits. Rows in ``skip`` were
+        handed over and are already tracked.
+        """
+
+        rows = [row for row in self.db.fetch_running_results() if row["id"] not in (skip or ())]
+        if not rows:
+            return
+        aborted: List[int] = []
+        adopted = 0
+        for row in rows:
+            pid = row.get("pid")
+            start_time = row.get("pid_start_time")
+            task = self.db.get_task(row["task_id"])
+            if not task or not pid or start_time is None or read_process_start_time(pid) != start_time:
+                aborted.append(row["id"])
+                continue
+            record = RunRecord(row["task_id"], row["trigger_reason"])
+            record.result_id = row["id"]
+            record.pid = pid
+            record.started_at = parse_iso(row.get("started_at")) or record.started_at
+            monitor = AdoptedRun(self.db, task, record, start_time, on_exit=self._on_run_exit)
+            self.runs.add(record)
+            monitor.start()
+            adopted += 1
+        self.db.abort_results(aborted, "scheduler stopped while the task was running")
+        logger.info("Reconciled running results: %d aborted, %d re-adopted", len(aborted), adopted)
+
     def _loop(self) -> None:
         while not self.stop_event.is_set():
+            profile_checkpoint()
+            tick = time.monotonic()
+            self.loop_lag = max(0.0, tick - self.heartbeat - 1.0)
             now = time_now()
             try:
                 self._process_due_tasks(now)
                 self._process_event_tasks(now)
             except Exception as exc:  # pylint: disable=broad-except
                 logger.exception("Scheduler loop error: %s", exc)
+            self.heartbeat = time.monotonic()
+            self.loop_duration = self.heartbeat - tick
             self.stop_event.wait(1)
 
     def _process_due_tasks(self, moment: datetime) -> None:
         for task in self.db.fetch_due_tasks(moment):
-            # 跳过那些在服务启动之前就已经过期的任务（避免重启后回放执行）
+            if timer_driven(task):
+                continue
+            self._dispatch_scheduled(task, moment)
+
+    def _dispatch_scheduled(self, task: Dict[str, Any], moment: datetime) -> tuple[str, Optional[str]]:
+        """Handle one due occurrence of a cron task.
+
+        Returns the outcome (``expired``, ``blocked``, ``deferred`` or a
+        :meth:`launch` outcome) and the rescheduled ``next_run_at``.
+        """
+
+        # 跳过那些在服务启动之前就已经过期的任务（避免重启后回放执行）
+        try:
+            next_run_dt = parse_iso(task.get("next_run_at"))
+        except Exception:
+            next_run_dt = None
+        if self.started_at and next_run_dt and next_run_dt < self.started_at:
+            logger.info(
+                "Skipping expired task %s scheduled at %s (service started at %s)",
+                task.get("id"),
+                task.get("next_run_at"),
+                isoformat(self.started_at),
+            )
+            # 重新安排到下一个可用时间，但不执行错过的运行
             try:
-                next_run_dt = parse_iso(task.get("next_run_at"))
-            except Exception:
-                next_run_dt = None
-            if self.started_at and next_run_dt and next_run_dt < self.started_at:
-                logger.info(
-                    "Skipping expired task %s scheduled at %s (service started at %s)",
-                    task.get("id"),
-                    task.get("next_run_at"),
-                    isoformat(self.started_at),
+                return "expired", self.db.schedule_next_run(
+                    task["id"], task["schedule_expression"], self.started_at, task_splay_offset(task)
                 )
-                # 重新安排到下一个可用时间，但不执行错过的运行
-                try:
-                    self.db.schedule_next_run(task["id"], task["schedule_expression"], self.started_at)
-                except Exception:
-                    logger.exception("Failed to reschedule expired task %s", task.get("id"))
-                continue
-            if self.db.has_running_instance(task["id"]):
-                logger.info("Task %s still running, skip", task["id"])
-                continue
+            except Exception:
+                logger.exception("Failed to reschedule expired task %s", task.get("id"))
+                return "expired", None
+        if not self._dependencies_met(task):
+            logger.info("Task %s waiting for dependencies", task["id"])
+            # re-schedule shortly in future to retry
+            return "blocked", self.db.schedule_next_run(
+                task["id"], task["schedule_expression"], moment + timedelta(minutes=1), task_splay_offset(task)
+            )
+        if self._should_defer(task, "schedule", next_run_dt or moment, moment):
+            return "deferred", task.get("next_run_at")
+        outcome, _ = self.launch(task, "schedule")
+        if outcome == "skipped":
+            logger.info("Task %s still running, skip this occurrence", task["id"])
+        return outcome, self.db.schedule_next_run(task["id"], task["schedule_expression"], moment, task_splay_offset(task))
+
+    def _fire_timer_task(self, task: Dict[str, Any], trigger_reason: str, slot: datetime, next_slot: datetime) -> str:
+        moment = time_now()
+        try:
             if not self._dependencies_met(task):
-                logger.info("Task %s waiting for dependencies", task["id"])
-                # re-schedule shortly in future to retry
-                self.db.schedule_next_run(task["id"], task["schedule_expression"], moment + timedelta(minutes=1))
-                continue
-            TaskRunner(self.db, task, "schedule").start()
-            self.db.schedule_next_run(task["id"], task["schedule_expression"], moment)
+                logger.info("Task %s waiting for dependencies, skip this occurrence", task["id"])
+                return "blocked"
+            if self._should_defer(task, trigger_reason, slot, moment):
+                return "deferred"
+            outcome, _ = self.launch(task, trigger_reason)
+            if outcome == "skipped":
+                logger.info("Task %s still running, skip this occurrence", task["id"])
+            return outcome
+        finally:
+            self.db.set_next_run(task["id"], next_slot)
 
     def _process_event_tasks(self, moment: datetime) -> None:
-        for task in self.db.fetch_event_tasks(event_type=EVENT_TYPE_SCRIPT):
+        # 按条件分组：同一轮中到期的相同条件只执行一次，结果分发给所有订阅任务
+        due: Dict[tuple[str, str], List[Dict[str, Any]]] = {}
+        checked: List[int] = []
+        snapshot: Optional[ProbeSnapshot] = None
+        generation = self.db.generation("task_defs")
+        tasks = self.db.fetch_event_tasks(event_type=EVENT_TYPE_SCRIPT)
+        if generation != self._probes_generation:
+            # 任务定义变更后清理已删除任务或已移除路径的 path_changed 基线
+            self.probes.prune({task["id"]: task["condition_probe"] for task in tasks if task.get("condition_probe")})
+            self._probes_generation = generation
+        for task in tasks:
             last_check = parse_iso(task.get("last_condition_check_at"))
             interval = task.get("condition_interval", 60)
             if last_check and (moment - last_check).total_seconds() < interval:
                 continue
-            self.db.update_condition_check(task["id"])
+            checked.append(task["id"])
+            probe = task.get("condition_probe")
+            if probe:
+                # 内置探测在进程内求值；与条件脚本同时存在时先判断探测，失败则不再 fork
+                snapshot = snapshot or ProbeSnapshot()
+                try:
+                    ok = self.probes.evaluate(probe, task["id"], snapshot)
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.warning("Condition probe for task %s failed: %s", task["id"], exc)
+                    ok = False
+                if not ok or not task.get("condition_script"):
+                    self._on_condition(task, ok, moment)
+                    continue
             if not task.get("condition_script"):
                 continue
-            ok = self._run_condition(task)
-            if not ok:
+            due.setdefault(ConditionCache.key(task), []).append(task)
+        self.db.update_condition_checks(checked)
+        for key, tasks in due.items():
+            max_age = min(task.get("condition_interval") or 60 for task in tasks)
+            ok = self.conditions.get(key, max_age)
+            if ok is not None:
+                for task in tasks:
+                    self._on_condition(task, ok, moment)
                 continue
-            if self.db.has_running_instance(task["id"]):
-                continue
-            if not self._dependencies_met(task):
-                continue
-            TaskRunner(self.db, task, "condition").start()
+            with self._conditions_lock:
+                running = self._conditions_running.get(key)
+                if running is not None:
+                    # 同一条件正在执行：任务并入这次检查，结果出来后一并分发
+                    known = {task["id"] for task in running}
+                    running.extend(task for task in tasks if task["id"] not in known)
+                    continue
+                self._conditions_running[key] = tasks
+            # 条件脚本在工作线程中执行，等待派生令牌与脚本运行都不阻塞主循环
+            threading.Thread(
+                target=self._evaluate_condition, args=(key, tasks, moment), daemon=True, name="condition-check"
+            ).start()
+
+    def _evaluate_condition(self, key: tuple[str, str], tasks: List[Dict[str, Any]], moment: datetime) -> None:
+        try:
+            ok = self._run_condition(tasks[0])
+            self.conditions.put(key, ok)
+        finally:
+            with self._conditions_lock:
+                subscribers = self._conditions_running.pop(key, tasks)
+        if not self.stop_event.is_set():
+            for task in subscribers:
+                self._on_condition(task, ok, moment)
+
+    def _on_condition(self, task: Dict[str, Any], ok: bool, moment: datetime) -> None:
+        if not ok:
+            self._deferred.pop(task["id"], None)
+            return
+        if not self._dependencies_met(task):
+            return
+        if self._should_defer(task, "condition", moment, moment):
+            return
+        self.launch(task, "condition")
+
+    def _should_defer(self, task: Dict[str, Any], trigger_reason: str, due_at: datetime, moment: datetime) -> bool:
+        """Hold back a deferrable task while the system is under pressure.
+
+        The delay is bounded by the task's ``max_defer_seconds`` counted from the
+        first deferral (or from ``due_at`` for schedule tasks); the first
+        deferral of each episode is recorded as a ``deferred`` result.
+        """
+
+        task_id = task["id"]
+        if not task.get("is_deferrable"):
+            return False
+        reason = self.admission.pressure_reason()
+        first_deferred = self._deferred.get(task_id)
+        if reason is None:
+            if first_deferred is not None:
+                logger.info("Task %s released after %.0fs deferral", task_id, (moment - first_deferred).total_seconds())
+                self._deferred.pop(task_id, None)
+            return False
+        since = min(due_at, first_deferred) if first_deferred else due_at
+        max_defer = task.get("max_defer_seconds") or DEFAULT_MAX_DEFER_SECONDS
+        if (moment - since).total_seconds() >= max_defer:
+            logger.info("Task %s reached max deferral (%ss), running despite %s", task_id, max_defer, reason)
+            self._deferred.pop(task_id, None)
+            return False
+        if first_deferred is None:
+            self._deferred[task_id] = moment
+            logger.info("Task %s deferred: %s", task_id, reason)
+            self.db.record_deferral(task_id, trigger_reason, f"deferred: {reason} (max {max_defer}s)")
+        return True
 
     def _run_condition(self, task: Dict[str, Any]) -> bool:
         command = TaskRunner._build_command(task["condition_script"])
+        SPAWN_LIMITER.acquire()
         try:
             completed = run(
                 command,
@@ -1054,25 +4037,923 @@ class SchedulerEngine:
         trigger_reason = "system_boot" if event_type == EVENT_TYPE_BOOT else "system_shutdown"
         runners: List[TaskRunner] = []
         for task in self.db.fetch_event_tasks(event_type=event_type):
-            if self.db.has_running_instance(task["id"]):
-                continue
             if not self._dependencies_met(task):
                 continue
-            runner = TaskRunner(self.db, task, trigger_reason)
-            runner.start()
-            runners.append(runner)
+            _, runner = self.launch(task, trigger_reason)
+            if runner:
+                runners.append(runner)
         for runner in runners:
             runner.join()
 
+    def _run_shutdown_tasks(self, deadline: float) -> None:
+        """Run shutdown tasks in parallel within ``deadline`` seconds.
+
+        A task whose ``pre_task_ids`` name other shutdown tasks starts only
+        after those have finished (and succeeded). Runs still active when the
+        deadline expires are terminated and recorded as cancelled; tasks that
+        never got to start are recorded as well.
+        """
+
+        tasks = {task["id"]: task for task in self.db.fetch_event_tasks(event_type=EVENT_TYPE_SHUTDOWN)}
+        if not tasks:
+            return
+        expires = time.monotonic() + deadline
+        waiting = dict(tasks)
+        active: Dict[int, TaskRunner] = {}
+        while True:
+            for task_id, task in list(waiting.items()):
+                if any(dep in waiting or dep in active for dep in task.get("pre_task_ids") or [] if dep in tasks):
+                    continue
+                del waiting[task_id]
+                if not self._dependencies_met(task):
+                    continue
+                _, runner = self.launch(task, "system_shutdown")
+                if runner:
+                    active[task_id] = runner
+            if not active:
+                # 剩余任务的前置依赖构成环，无法启动
+                break
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(0.1, remaining))
+            for task_id in [task_id for task_id, runner in active.items() if not runner.is_alive()]:
+                del active[task_id]
+            if not active and not waiting:
+                return
+
+        reason = f"shutdown deadline ({deadline:g}s) exceeded"
+        if active:
+            logger.warning("Terminating %d shutdown task(s): %s", len(active), reason)
+            for runner in active.values():
+                runner.cancel(reason)
+            for runner in active.values():
+                runner.join(timeout=TASK_KILL_GRACE + 5)
+        for task_id in waiting:
+            message = reason if time.monotonic() >= expires else "pre_task_ids form a cycle among shutdown tasks"
+            logger.warning("Shutdown task %s was not started: %s", task_id, message)
+            self.db.record_skip(task_id, "system_shutdown", f"task was not started: {message}")
+
+
+###############################################################################
+# Simulation
+###############################################################################
+
+class IdleAdmission(AdmissionController):
+    """Admission controller that never reports pressure (no PSI in a replay)."""
+
+    def pressure_reason(self) -> Optional[str]:
+        return None
+
+
+class SimulationDatabase(Database):
+    """In-memory copy of a scheduler database for ``--simulate``.
+
+    The engine reads tasks from the registry, so the per-dispatch writes
+    (``next_run_at``, run results) stay in memory instead of going through
+    SQLite; results keep only what the dependency check reads.
+    """
+
+    def __init__(self, db_path: str):
+        super().__init__(":memory:")
+        self.load_copy(db_path)
+        self._result_ids = itertools.count(1)
+        self._results: Dict[int, Dict[str, Any]] = {}
+        # task_id -> 模拟中最近一次运行；尚未运行的任务沿用库中的历史结果
+        self._latest: Dict[int, Dict[str, Any]] = {}
+
+    def set_next_run(self, task_id: int, next_dt: datetime) -> Optional[str]:
+        next_iso = isoformat(next_dt)
+        self.tasks.touch(task_id, next_run_at=next_iso)
+        return next_iso
+
+    def record_result_start(self, task_id: int, trigger_reason: str) -> int:
+        result_id = next(self._result_ids)
+        result = {"id": result_id, "task_id": task_id, "status": "running", "trigger_reason": trigger_reason}
+        self._results[result_id] = self._latest[task_id] = result
+        return result_id
+
+    def finalize_result(
+        self, result_id: int, status: str, log_text: str, stage_results: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        self._results.pop(result_id)["status"] = status
+
+    def get_latest_result(self, task_id: int) -> Optional[Dict[str, Any]]:
+        result = self._latest.get(task_id)
+        return dict(result) if result is not None else super().get_latest_result(task_id)
+
+
+class SimulatedRunner:
+    """Stands in for :class:`TaskRunner` during ``--simulate``: no process is
+    started, the run ends after a duration drawn from the task's history."""
+
+    def __init__(
+        self,
+        db: Database,
+        task: Dict[str, Any],
+        trigger_reason: str,
+        record: Optional[RunRecord] = None,
+        on_exit: Optional[Callable[["SimulatedRunner"], None]] = None,
+        wait_for: Optional[List[Any]] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        simulator: Optional["Simulator"] = None,
+    ):
+        self.db = db
+        self.task = task
+        self.trigger_reason = trigger_reason
+        self.record = record or RunRecord(task["id"], trigger_reason)
+        self.record.runner = self  # type: ignore[assignment]
+        self.on_exit = on_exit
+        self.simulator = simulator
+        self.cancel_reason: Optional[str] = None
+        # 启动时抽样决定的最终状态
+        self.status = "success"
+        self.finished = False
+
+    def start(self) -> None:
+        self.simulator._run_started(self)  # type: ignore[union-attr]
+
+    def cancel(self, reason: str) -> None:
+        if not self.finished:
+            self.cancel_reason = reason
+            self.simulator._run_finished(self, "cancelled")  # type: ignore[union-attr]
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        return None
+
+    def is_alive(self) -> bool:
+        return not self.finished
+
+
+class Simulator:
+    """Replays the scheduler engine over a virtual time range.
+
+    The engine runs unmodified against a :class:`SimulationDatabase` while
+    a :class:`VirtualClock` jumps from one event (cron slot, timer deadline,
+    run completion) to the next. Runners are :class:`SimulatedRunner`
+    instances whose duration and status are sampled from the task's
+    finished runs; each start first takes a token from a virtual copy of
+    the spawn rate limit. Event-triggered tasks are not replayed.
+    """
+
+    def __init__(self, db_path: str, start: datetime, end: datetime, seed: int = 0):
+        if not os.path.exists(db_path):
+            raise ValueError(f"database not found: {db_path}")
+        if end <= start:
+            raise ValueError("simulation end must be after its start")
+        self.start, self.end = start, end
+        self.clock = VirtualClock(start)
+        install_clock(self.clock)
+        self.db = SimulationDatabase(db_path)
+        self.spawn_limiter = TokenBucket(SPAWN_RATE, SPAWN_BURST, monotonic=self.clock.monotonic)
+        self.spawn_delays: Counter = Counter()
+        self.engine = SchedulerEngine(self.db)
+        self.engine.admission = IdleAdmission()
+        self.engine.runner_factory = functools.partial(SimulatedRunner, simulator=self)
+        self.engine.timer.on_fire = self._fire_timer
+        self.engine.started_at = start
+        self.random = random.Random(seed)
+        self.samples = self.db.fetch_run_samples()
+        tasks = self.db.fetch_scheduled_tasks()
+        # 只有被其他任务依赖的任务需要把结果写回库（依赖检查读取最近一次结果）
+        self.dependencies = {dep for task in tasks for dep in task.get("pre_task_ids") or []}
+        self.tasks = [task for task in tasks if not timer_driven(task)]
+        self.timer_task_count = len(tasks) - len(self.tasks)
+        self.excluded = len(self.db.fetch_event_tasks())
+        # (finish, seq, runner)；被取消的运行在弹出时按 runner.finished 惰性丢弃
+        self._completions: List[tuple[datetime, int, SimulatedRunner]] = []
+        self._sequence = itertools.count()
+        self._slot: Optional[datetime] = None
+        self._queued: Dict[int, Deque[datetime]] = {}
+        self._running = 0
+        self.peak = (0, start)
+        self.outcomes: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.lateness_ms: Counter = Counter()
+        self.task_lateness: Dict[int, float] = {}
+        # 按小时统计启动次数，键为距 _hour_origin 的小时数
+        self.hourly: Counter = Counter()
+        self._hour_origin = start.replace(minute=0, second=0, microsecond=0)
+        self._timeline: Optional[Any] = None
+
+    def run(self, timeline_path: Optional[str] = None) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self._timeline = open(timeline_path, "w", encoding="utf-8") if timeline_path else None
+        try:
+            self._loop()
+        finally:
+            if self._timeline is not None:
+                self._timeline.close()
+        return self._summary(time.perf_counter() - started)
+
+    def _loop(self) -> None:
+        timer = self.engine.timer
+        # 模拟窗口为半开区间 [start, end)，与 /api/schedule/forecast 一致
+        timer._reload(self.start - timedelta(seconds=1))
+        # 以模拟起点重新推算下一次运行，忽略库中按真实时间保存的 next_run_at
+        due: List[tuple[datetime, int]] = []
+        tasks = {}
+        for task in self.tasks:
+            next_iso = self.db.schedule_next_run(
+                task["id"], task["schedule_expression"], self.start - timedelta(seconds=1), task_splay_offset(task)
+            )
+            if next_iso:
+                tasks[task["id"]] = task
+                due.append((parse_iso(next_iso), task["id"]))  # type: ignore[arg-type]
+        heapq.heapify(due)
+        origin = self.start
+        while True:
+            candidates = []
+            if due:
+                candidates.append(due[0][0])
+            if self._completions:
+                candidates.append(self._completions[0][0])
+            deadline = timer.next_deadline()
+            if deadline is not None:
+                # 向上取整到微秒，保证推进后 deadline <= monotonic
+                candidates.append(origin + timedelta(microseconds=math.ceil(deadline * 1_000_000)))
+            if not candidates:
+                return
+            moment = min(candidates)
+            if moment >= self.end:
+                return
+            self.clock.advance_to(moment)
+            while self._completions and self._completions[0][0] <= moment:
+                _, _, runner = heapq.heappop(self._completions)
+                if not runner.finished:
+                    self._run_finished(runner, runner.status)
+            timer._fire_due()
+            while due and due[0][0] <= moment:
+                slot, task_id = heapq.heappop(due)
+                task = tasks[task_id]
+                self._slot = slot
+                outcome, next_iso = self.engine._dispatch_scheduled(task, moment)
+                self._dispatched(task, "schedule", slot, outcome)
+                if next_iso:
+                    heapq.heappush(due, (parse_iso(next_iso), task_id))  # type: ignore[arg-type]
+
+    def _fire_timer(self, task: Dict[str, Any], trigger_reason: str, slot: datetime, next_slot: datetime) -> None:
+        self._slot = slot
+        outcome = self.engine._fire_timer_task(task, trigger_reason, slot, next_slot)
+        self._dispatched(task, trigger_reason, slot, outcome)
+
+    def _dispatched(self, task: Dict[str, Any], trigger_reason: str, slot: datetime, outcome: str) -> None:
+        self._slot = None
+        self.outcomes[outcome] += 1
+        if outcome == "queued":
+            self._queued.setdefault(task["id"], deque()).append(slot)
+        if self._timeline is not None:
+            self._write(event="dispatch", task_id=task["id"], trigger=trigger_reason, slot=isoformat(slot), outcome=outcome)
+
+    def _run_started(self, runner: SimulatedRunner) -> None:
+        moment = time_now()
+        task_id = runner.task["id"]
+        if self._slot is not None:
+            slot, self._slot = self._slot, None
+        else:
+            # 排队实例在前一个运行结束时启动，按入队顺序对应各自的槽位
+            queued = self._queued.get(task_id)
+            slot = queued.popleft() if queued else moment
+        # 与 TaskRunner 一样先取派生令牌，令牌不足时推迟启动
+        delay = self.spawn_limiter.reserve()
+        if delay:
+            self.spawn_delays[int(delay * 1000)] += 1
+            moment += timedelta(seconds=delay)
+        samples = self.samples.get(task_id)
+        duration, status = self.random.choice(samples) if samples else (SIMULATE_DEFAULT_DURATION, "success")
+        timeout = runner.task.get("timeout_seconds") or TASK_TIMEOUT
+        if duration > timeout:
+            duration, status = float(timeout), "failed"
+        runner.status = status
+        if task_id in self.dependencies:
+            runner.record.result_id = self.db.record_result_start(task_id, runner.trigger_reason)
+        heapq.heappush(self._completions, (moment + timedelta(seconds=duration), next(self._sequence), runner))
+        late = max(0.0, (moment - slot).total_seconds())
+        self.lateness_ms[int(late * 1000)] += 1
+        if late > self.task_lateness.get(task_id, -1.0):
+            self.task_lateness[task_id] = late
+        self.hourly[int((moment - self._hour_origin).total_seconds()) // 3600] += 1
+        self._running += 1
+        if self._running > self.peak[0]:
+            self.peak = (self._running, moment)
+        if self._timeline is not None:
+            self._write(
+                event="start", task_id=task_id, slot=isoformat(slot), lateness=round(late, 3), duration=round(duration, 3)
+            )
+
+    def _run_finished(self, runner: SimulatedRunner, status: str) -> None:
+        runner.finished = True
+        self._running -= 1
+        self.statuses[status] += 1
+        if runner.record.result_id is not None:
+            message = f"task cancelled: {runner.cancel_reason}" if runner.cancel_reason else "simulated run"
+            self.db.finalize_result(runner.record.result_id, status, message)
+        if self._timeline is not None:
+            self._write(event="finish", task_id=runner.task["id"], status=status)
+        if runner.on_exit:
+            runner.on_exit(runner)
+
+    def _write(self, **event: Any) -> None:
+        self._timeline.write(json.dumps({"at": isoformat(time_now()), **event}) + "\n")  # type: ignore[union-attr]
+
+    def _summary(self, elapsed: float) -> Dict[str, Any]:
+        starts = sum(self.lateness_ms.values())
+        lateness: Dict[str, Any] = {"runs": starts}
+        if starts:
+            ordered = sorted(self.lateness_ms.items())
+            lateness["mean_seconds"] = round(sum(ms * count for ms, count in ordered) / starts / 1000, 3)
+            for label, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                rank, seen = fraction * starts, 0
+                for ms, count in ordered:
+                    seen += count
+                    if seen >= rank:
+                        lateness[f"{label}_seconds"] = ms / 1000
+                        break
+            lateness["max_seconds"] = ordered[-1][0] / 1000
+        late_tasks = sorted(self.task_lateness.items(), key=lambda item: item[1], reverse=True)[:10]
+        return {
+            "from": isoformat(self.start),
+            "to": isoformat(self.end),
+            "tasks": {
+                "schedule": len(self.tasks),
+                "timer": self.timer_task_count,
+                "excluded_event_tasks": self.excluded,
+            },
+            "dispatches": dict(self.outcomes),
+            "runs": dict(self.statuses),
+            "still_running": self._running,
+            "lateness": lateness,
+            "most_late_tasks": [
+                {"task_id": task_id, "max_lateness_seconds": round(late, 3)} for task_id, late in late_tasks if late > 0
+            ],
+            "spawn_rate_limit": {
+                "delayed_runs": sum(self.spawn_delays.values()),
+                "max_delay_seconds": max(self.spawn_delays, default=0) / 1000,
+            },
+            "peak_concurrency": {"runs": self.peak[0], "at": isoformat(self.peak[1])},
+            "busiest_hours": [
+                {"hour": isoformat(self._hour_origin + timedelta(hours=hour)), "starts": count}
+                for hour, count in self.hourly.most_common(5)
+            ],
+            "elapsed_seconds": round(elapsed, 3),
+        }
+
+
+def run_simulation(
+    db_path: str, start: datetime, end: datetime, seed: int = 0, timeline_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """Simulate the schedule of ``db_path`` between ``start`` and ``end``; returns a summary."""
+
+    previous = CLOCK
+    try:
+        return Simulator(db_path, start, end, seed).run(timeline_path)
+    finally:
+        install_clock(previous)
+
+
+###############################################################################
+# Diagnostics
+###############################################################################
+
+# 进行中的 cProfile 会话；未在分析时各检查点只读取这个全局变量与线程局部属性
+PROFILE_SESSION: Optional["CProfileSession"] = None
+_PROFILE_LOCAL = threading.local()
+
+
+def profile_checkpoint() -> None:
+    """Attach the calling thread to the active cProfile session, or detach it.
+
+    cProfile can only be enabled and disabled from the profiled thread, so
+    the engine loop, the precise timer, request handling and output
+    collection call this once per iteration.
+    """
+
+    session = PROFILE_SESSION
+    profile = getattr(_PROFILE_LOCAL, "profile", None)
+    if profile is None:
+        if session is not None:
+            _PROFILE_LOCAL.profile = session.attach()
+    elif session is None or not session.owns(profile):
+        profile.disable()
+        _PROFILE_LOCAL.profile = None
+
+
+class _StatsSnapshot:
+    """Profile stats copied without ``create_stats()``, which would disable the
+    profiler on the calling thread instead of the one being profiled."""
+
+    def __init__(self, profile: cProfile.Profile):
+        profile.snapshot_stats()
+        self.stats = profile.stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class CProfileSession:
+    """A cProfile run made of one profiler per attached thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles: List[cProfile.Profile] = []
+
+    def attach(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+        return profile
+
+    def owns(self, profile: cProfile.Profile) -> bool:
+        with self._lock:
+            return any(item is profile for item in self._profiles)
+
+    def report(self, sort: str, limit: int) -> str:
+        with self._lock:
+            snapshots = [_StatsSnapshot(profile) for profile in self._profiles]
+        if not snapshots:
+            return "no thread reached a profiling checkpoint during the session\n"
+        stream = io.StringIO()
+        stats = pstats.Stats(*snapshots, stream=stream)  # type: ignore[arg-type]
+        stream.write(f"{len(snapshots)} thread(s) profiled\n")
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class StackSampler(threading.Thread):
+    """Samples the stacks of all threads from ``sys._current_frames()``.
+
+    Produces collapsed stacks (``thread;outer;...;inner count``) as consumed
+    by flame graph tools. Blocked threads are sampled too, so this is a
+    wall-clock profile.
+    """
+
+    def __init__(self, interval: float, stop_event: threading.Event, skip: Set[int]):
+        super().__init__(daemon=True, name="stack-sampler")
+        self.interval = interval
+        self.stop_event = stop_event
+        self.skip = skip
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def run(self) -> None:
+        self.skip.add(threading.get_ident())
+        labels: Dict[Any, str] = {}
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name.replace(";", ":") for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if ident in self.skip:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident) or f"thread-{ident}")
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def thread_kind(thread: threading.Thread) -> str:
+    if isinstance(thread, (TaskRunner, AdoptedRun)):
+        return "runner"
+    if thread.name.endswith("(process_request_thread)"):
+        return "handler"
+    return "other"
+
+
+def dump_threads(kinds: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+    """Current stack of every thread, with the run it executes for task runners."""
+
+    frames = sys._current_frames()  # pylint: disable=protected-access
+    threads = []
+    for thread in threading.enumerate():
+        kind = thread_kind(thread)
+        if kinds and kind not in kinds:
+            continue
+        item: Dict[str, Any] = {
+            "name": thread.name,
+            "ident": thread.ident,
+            "native_id": thread.native_id,
+            "daemon": thread.daemon,
+            "kind": kind,
+        }
+        record = getattr(thread, "record", None)
+        if kind == "runner" and record is not None:
+            item.update(record.to_dict())
+        frame = frames.get(thread.ident)  # type: ignore[arg-type]
+        item["stack"] = [line.rstrip("\n") for line in traceback.format_stack(frame)] if frame is not None else []
+        threads.append(item)
+    return threads
+
+
+class LoopWatchdog(threading.Thread):
+    """Logs every thread's stack once when the engine loop stops beating."""
+
+    def __init__(self, engine: "SchedulerEngine", stop_event: threading.Event):
+        super().__init__(daemon=True, name="loop-watchdog")
+        self.engine = engine
+        self.stop_event = stop_event
+
+    def run(self) -> None:
+        # 停滞开始时的最后一次心跳，None 表示当前未停滞
+        stalled_since: Optional[float] = None
+        while not self.stop_event.wait(WATCHDOG_INTERVAL):
+            heartbeat = self.engine.heartbeat
+            age = time.monotonic() - heartbeat
+            if age <= LOOP_STALL_SECONDS:
+                if stalled_since is not None:
+                    logger.warning("Scheduler loop recovered after a %.0fs stall", heartbeat - stalled_since)
+                stalled_since = None
+                continue
+            if stalled_since is not None:
+                continue
+            stalled_since = heartbeat
+            # 停滞的循环线程放在最前，其余线程用于排查锁的持有者
+            threads = sorted(dump_threads(), key=lambda item: item["name"] != self.engine.thread.name)
+            stacks = "\n".join(f"--- {item['name']} ({item['kind']})\n" + "\n".join(item["stack"]) for item in threads)
+            logger.warning("Scheduler loop stalled: no heartbeat for %.0fs\n%s", age, stacks)
+
+
+class Diagnostics:
+    """State behind ``/api/debug``: one profiling run at a time and the
+    tracemalloc baseline used for diffs."""
+
+    TRACEMALLOC_FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self):
+        self._profile_lock = threading.Lock()
+        self._profile_stop: Optional[threading.Event] = None
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at: Optional[datetime] = None
+
+    def profile(self, mode: str, seconds: float, interval: float, sort: str, limit: int) -> Optional[str]:
+        """Profile the daemon for ``seconds`` (or until :meth:`stop_profile`).
+
+        Returns pstats text or collapsed stacks; None if a run is already active.
+        """
+
+        global PROFILE_SESSION  # pylint: disable=global-statement
+        if not self._profile_lock.acquire(blocking=False):
+            return None
+        stop = self._profile_stop = threading.Event()
+        try:
+            if mode == "cprofile":
+                session = CProfileSession()
+                PROFILE_SESSION = session
+                try:
+                    stop.wait(seconds)
+                finally:
+                    PROFILE_SESSION = None
+                return session.report(sort, limit)
+            sampler = StackSampler(interval, stop, {threading.get_ident()})
+            sampler.start()
+            stop.wait(seconds)
+            stop.set()
+            sampler.join()
+            return sampler.collapsed()
+        finally:
+            self._profile_stop = None
+            self._profile_lock.release()
+
+    def stop_profile(self) -> bool:
+        stop = self._profile_stop
+        if stop is None:
+            return False
+        stop.set()
+        return True
+
+    def start_tracemalloc(self, frames: int) -> None:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._baseline = self._baseline_at = None
+        tracemalloc.start(frames)
+
+    def stop_tracemalloc(self) -> None:
+        tracemalloc.stop()
+        self._baseline = self._baseline_at = None
+
+    def tracemalloc_report(self, key: str, limit: int, diff: bool) -> Dict[str, Any]:
+        """Top allocations now, or their change since the previous report when ``diff``."""
+
+        if not tracemalloc.is_tracing():
+            raise ValueError("tracemalloc is not running; POST /api/debug/tracemalloc {\"action\": \"start\"} first")
+        snapshot = tracemalloc.take_snapshot().filter_traces(self.TRACEMALLOC_FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+        payload: Dict[str, Any] = {
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "key": key,
+        }
+        top: List[Dict[str, Any]] = []
+        if diff and self._baseline is not None:
+            payload["baseline_at"] = isoformat(self._baseline_at)  # type: ignore[arg-type]
+            for stat in snapshot.compare_to(self._baseline, key)[:limit]:
+                top.append(
+                    {
+                        "location": stat.traceback.format() if key == "traceback" else str(stat.traceback),
+                        "size": stat.size,
+                        "size_diff": stat.size_diff,
+                        "count": stat.count,
+                        "count_diff": stat.count_diff,
+                    }
+                )
+        else:
+            for stat in snapshot.statistics(key)[:limit]:
+                top.append(
+                    {
+                        "location": stat.traceback.format() if key == "traceback" else str(stat.traceback),
+                        "size": stat.size,
+                        "count": stat.count,
+                    }
+                )
+        payload["top"] = top
+        # 每次报告都成为下一次 diff 的基线
+        self._baseline, self._baseline_at = snapshot, time_now()
+        return payload
+
 
 ###############################################################################
 # HTTP layer
 ###############################################################################
 
+class DirectoryListingCache:
+    """Short-lived cache of sorted directory listings keyed by directory mtime.
+
+    Each listing keeps the ``os.DirEntry`` objects so that ``is_dir()`` and
+    ``stat()`` results cached by ``scandir`` are reused across pages.
+    """
+
+    def __init__(self, ttl: float = FS_LIST_CACHE_TTL, max_entries: int = FS_LIST_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._listings: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, path: str) -> tuple[List[tuple], List[os.DirEntry]]:
+        st = os.stat(path)
+        stamp = (st.st_ino, st.st_mtime_ns)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._listings.get(path)
+            if cached and cached[0] == stamp and now - cached[1] < self.ttl:
+                self._listings.move_to_end(path)
+                return cached[2], cached[3]
+        keys, entries = self._scan(path)
+        with self._lock:
+            self._listings[path] = (stamp, now, keys, entries)
+            self._listings.move_to_end(path)
+            while len(self._listings) > self.max_entries:
+                self._listings.popitem(last=False)
+        return keys, entries
+
+    @staticmethod
+    def _scan(path: str) -> tuple[List[tuple], List[os.DirEntry]]:
+        rows = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                # 排序键：目录在前，名称不区分大小写，原名兜底保证顺序稳定
+                rows.append(((not is_dir, entry.name.lower(), entry.name), entry))
+        rows.sort(key=lambda row: row[0])
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    @staticmethod
+    def encode_cursor(key: tuple) -> str:
+        return ("f:" if key[0] else "d:") + key[2]
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        kind, sep, name = cursor.partition(":")
+        if not sep or kind not in ("d", "f"):
+            raise ValueError("invalid cursor")
+        return (kind == "f", name.lower(), name)
+
+
+class ResponseCache:
+    """Pre-serialized JSON responses of read-only endpoints.
+
+    Entries are keyed by route and query string and tagged with the data
+    generation they were built from; a lookup with a newer generation misses.
+    Compressed variants are produced once per entry and reused.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, tuple[Any, Dict[str, bytes]]]" = OrderedDict()
+
+    def get(self, key: tuple, generation: Any) -> Optional[Dict[str, bytes]]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] != generation:
+                return None
+            self._entries.move_to_end(key)
+            return cached[1]
+
+    def put(self, key: tuple, generation: Any, body: bytes) -> Dict[str, bytes]:
+        variants = {"identity": body}
+        with self._lock:
+            self._entries[key] = (generation, variants)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return variants
+
+    @staticmethod
+    def variant(variants: Dict[str, bytes], encoding: Optional[str]) -> tuple[bytes, Optional[str]]:
+        body = variants["identity"]
+        if not encoding or len(body) < HTTP_COMPRESS_MIN_SIZE:
+            return body, None
+        compressed = variants.get(encoding)
+        if compressed is None:
+            compressed = variants[encoding] = compress_body(body, encoding)
+        return compressed, encoding
+
+
+class StaticAsset:
+    __slots__ = (
+        "source",
+        "path",
+        "gz_path",
+        "size",
+        "gz_size",
+        "stamp",
+        "digest",
+        "content_type",
+        "last_modified",
+        "deps",
+    )
+
+    def __init__(self, source: str, content_type: str):
+        self.source = source
+        self.path = source
+        self.content_type = content_type
+        self.gz_path: Optional[str] = None
+        self.size = 0
+        self.gz_size = 0
+        self.stamp: tuple[int, int] = (0, 0)
+        self.digest = ""
+        self.last_modified = ""
+        # 页面引用的资源及生成页面时它们的摘要
+        self.deps: Dict[str, str] = {}
+
+
+class StaticAssetStore:
+    """Static files of app/www served by the backend itself.
+
+    Every file is hashed once at startup to build a strong ETag, and text
+    assets get a gzip variant written to ``cache_dir`` so requests only need
+    a ``sendfile`` of a precompressed file.  HTML pages are served from a
+    rendered copy whose local asset URLs carry ``?v=<digest prefix>``, which
+    is what lets those assets be cached as immutable.
+    """
+
+    def __init__(self, root: str, cache_dir: str):
+        self.root = os.path.abspath(root)
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._assets: Dict[str, StaticAsset] = {}
+        self._build()
+
+    def _build(self) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        pages: List[tuple[str, str]] = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if filename.startswith(".") or filename.endswith(".gz"):
+                    continue
+                full = os.path.join(dirpath, filename)
+                rel = "/" + os.path.relpath(full, self.root).replace(os.sep, "/")
+                if os.path.splitext(filename)[1].lower() in STATIC_PAGE_EXTS:
+                    # 页面需要引用资源的摘要，放到最后处理
+                    pages.append((full, rel))
+                    continue
+                self._add(full, rel)
+        for full, rel in pages:
+            self._add(full, rel)
+        # 清理不再被引用的旧压缩文件与页面副本
+        referenced = {os.path.basename(a.gz_path) for a in self._assets.values() if a.gz_path}
+        referenced.update(os.path.basename(a.path) for a in self._assets.values() if a.path != a.source)
+        for name in os.listdir(self.cache_dir):
+            if name.endswith((".gz", *STATIC_PAGE_EXTS)) and name not in referenced:
+                try:
+                    os.unlink(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        logger.info("Static assets loaded from %s (%d files)", self.root, len(self._assets))
+
+    def _add(self, full: str, rel: str) -> None:
+        try:
+            self._assets[rel] = self._load(full, rel)
+        except OSError as exc:
+            logger.warning("Failed to load static asset %s: %s", full, exc)
+
+    def _write_cache(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.cache_dir, name)
+        if not os.path.exists(path):
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            os.replace(tmp_path, path)
+        return path
+
+    def _version_refs(self, data: bytes, rel: str, asset: StaticAsset) -> bytes:
+        base = posixpath.dirname(rel)
+
+        def replace(match: re.Match[str]) -> str:
+            ref = match.group(3)
+            if ref.startswith("//"):
+                return match.group(0)
+            target = posixpath.normpath(posixpath.join(base, ref))
+            if os.path.splitext(target)[1].lower() in STATIC_PAGE_EXTS:
+                return match.group(0)
+            dep = self._current(target)
+            if dep is None:
+                return match.group(0)
+            asset.deps[target] = dep.digest
+            quote = match.group(2)
+            return f"{match.group(1)}{quote}{ref}?v={dep.digest[:STATIC_VERSION_LENGTH]}{quote}"
+
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            return data
+        return STATIC_ASSET_REF_RE.sub(replace, text).encode("utf-8")
+
+    def _load(self, full: str, rel: str) -> StaticAsset:
+        ext = os.path.splitext(full)[1].lower()
+        asset = StaticAsset(full, STATIC_MIME_TYPES.get(ext, "application/octet-stream"))
+        with open(full, "rb") as fh:
+            st = os.fstat(fh.fileno())
+            data = fh.read()
+        asset.stamp = (st.st_mtime_ns, st.st_size)
+        asset.last_modified = datetime.fromtimestamp(st.st_mtime, timezone.utc).strftime("%a, %d %b %Y %H:%M:%S GMT")
+        if ext in STATIC_PAGE_EXTS:
+            data = self._version_refs(data, rel, asset)
+        asset.size = len(data)
+        asset.digest = hashlib.sha256(data).hexdigest()[:32]
+        if asset.deps:
+            asset.path = self._write_cache(f"{asset.digest}{ext}", data)
+        if ext in STATIC_COMPRESSIBLE_EXTS and asset.size >= HTTP_COMPRESS_MIN_SIZE:
+            gz_path = self._write_cache(f"{asset.digest}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+            gz_size = os.path.getsize(gz_path)
+            if gz_size < asset.size:
+                asset.gz_path = gz_path
+                asset.gz_size = gz_size
+        return asset
+
+    def _current(self, rel_path: str) -> Optional[StaticAsset]:
+        asset = self._assets.get(rel_path)
+        if asset is None:
+            return None
+        try:
+            st = os.stat(asset.source)
+        except OSError:
+            return None
+        stale = (st.st_mtime_ns, st.st_size) != asset.stamp
+        if not stale and asset.deps:
+            # 引用的资源变化后页面里的版本号也要更新
+            stale = any(
+                (dep := self._current(ref)) is None or dep.digest != digest for ref, digest in asset.deps.items()
+            )
+        if stale:
+            # 文件在启动后被替换，重新计算校验值与压缩文件
+            try:
+                asset = self._assets[rel_path] = self._load(asset.source, rel_path)
+            except OSError:
+                return None
+        return asset
+
+    def lookup(self, rel_path: str) -> Optional[StaticAsset]:
+        with self._lock:
+            return self._current(rel_path)
+
+
 class SchedulerContext:
-    def __init__(self, db: Database, engine: SchedulerEngine):
+    def __init__(self, db: Database, engine: SchedulerEngine, static_assets: Optional[StaticAssetStore] = None):
         self.db = db
         self.engine = engine
+        self.fs_listing = DirectoryListingCache()
+        self.static_assets = static_assets
+        self.response_cache = ResponseCache()
+        self.diagnostics = Diagnostics()
 
 
 class SchedulerHTTPServer(ThreadingHTTPServer):
@@ -1085,16 +4966,30 @@ class SchedulerHTTPServer(ThreadingHTTPServer):
         prefer_ipv6: bool = False,
         unix_socket_path: Optional[str] = None,
         bind_and_activate: bool = True,
+        listen_fd: Optional[int] = None,
     ):
         host = server_address[0] if server_address else ""
         port = server_address[1] if len(server_address) > 1 else 0
 
         self.base_path = base_path or "/"
-
-        # If unix_socket_path is provided, create a UNIX domain socket and
+        # 关闭时进入排空状态：不再受理新请求，等待在途请求完成
+        self.draining = False
+        self._in_flight = 0
+        self._idle = threading.Condition()
+
+        # If listen_fd is provided, adopt the listening socket inherited from
+        # the previous process across a handover re-exec. Else if
+        # unix_socket_path is provided, create a UNIX domain socket and
         # initialize the HTTP server without binding/activating the default
         # TCP socket. Otherwise, behave as normal TCP server.
-        if unix_socket_path:
+        if listen_fd is not None:
+            super().__init__(("", 0), handler_class, bind_and_activate=False)
+            self.socket.close()
+            self.socket = socket.socket(fileno=listen_fd)
+            self.socket.set_inheritable(False)
+            self.address_family = self.socket.family
+            self.server_address = unix_socket_path or self.socket.getsockname()
+        elif unix_socket_path:
             # Initialize without binding so we can replace the socket.
             super().__init__(("", 0), handler_class, bind_and_activate=False)
             # ensure old socket file removed
@@ -1130,8 +5025,37 @@ class SchedulerHTTPServer(ThreadingHTTPServer):
                 except OSError:
                     pass
 
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def begin_request(self) -> bool:
+        with self._idle:
+            if self.draining:
+                return False
+            self._in_flight += 1
+            return True
+
+    def end_request(self) -> None:
+        with self._idle:
+            self._in_flight -= 1
+            self._idle.notify_all()
+
+    def drain(self, timeout: float = HTTP_DRAIN_TIMEOUT) -> bool:
+        """Refuse further requests and wait up to ``timeout`` for in-flight ones."""
+
+        with self._idle:
+            self.draining = True
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+
 
 class SchedulerRequestHandler(BaseHTTPRequestHandler):
+    # 使用 HTTP/1.1 长连接，空闲超过 timeout 秒后由服务端关闭
+    protocol_version = "HTTP/1.1"
+    timeout = HTTP_KEEPALIVE_TIMEOUT
+    _body_consumed = True
+    _in_flight = False
+
     def do_GET(self) -> None:  # noqa: N802
         if not self._require_auth():
             return
@@ -1140,7 +5064,7 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
         if self.path.startswith("/api/"):
             self._handle_api("GET")
             return
-        self.send_error(HTTPStatus.NOT_FOUND, "Unsupported path")
+        self._serve_static()
 
     def do_HEAD(self) -> None:  # noqa: N802
         if not self._require_auth():
@@ -1150,7 +5074,7 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
         if self.path.startswith("/api/"):
             self.send_error(HTTPStatus.METHOD_NOT_ALLOWED, "HEAD not supported for API")
             return
-        self.send_error(HTTPStatus.NOT_FOUND, "Unsupported path")
+        self._serve_static()
 
     def do_POST(self) -> None:  # noqa: N802
         if not self._require_auth():
@@ -1193,7 +5117,12 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
                 return
             resource = segments[0]
             if resource == "health" and method == "GET":
-                self._health()
+                if segments[1:] == ["live"]:
+                    self._health_live()
+                elif segments[1:] == ["ready"]:
+                    self._health_ready()
+                else:
+                    self._health()
                 return
             if resource == "accounts" and method == "GET":
                 self._list_accounts()
@@ -1208,6 +5137,19 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
             if resource == "tasks":
                 self._handle_tasks(method, segments[1:])
                 return
+            if resource == "events":
+                self._handle_events(method, segments[1:])
+                return
+            if resource == "schedule" and segments[1:] == ["forecast"] and method == "GET":
+                self._schedule_forecast()
+                return
+            if resource == "debug":
+                self._handle_debug(method, segments[1:])
+                return
+            if resource == "runs" and method == "GET" and len(segments) == 1:
+                ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
+                self._json_response(ctx.engine.runs.snapshot())
+                return
             if resource == "results" and len(segments) >= 2:
                 task_id = int(segments[1])
                 if len(segments) == 2 and method == "GET":
@@ -1220,23 +5162,85 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
             logger.exception("API error: %s", exc)
             self._json_response({"error": "internal server error"}, status=HTTPStatus.INTERNAL_SERVER_ERROR)
 
+    def _handle_events(self, method: str, remainder: List[str]) -> None:
+        ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
+        # 支持：GET /api/events（事件名 -> 订阅任务），POST /api/events/{name}（触发事件）
+        if method == "GET" and not remainder:
+            self._json_response({"data": ctx.engine.events.summary()})
+            return
+        if method != "POST" or len(remainder) != 1:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        name = validate_event_name(unquote(remainder[0]))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > EVENT_PAYLOAD_MAX:
+            self._json_response(
+                {"error": f"event payload exceeds {EVENT_PAYLOAD_MAX} bytes"},
+                status=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            )
+            return
+        payload = self._read_json()
+        if payload is None:
+            return
+        if not isinstance(payload, dict):
+            raise ValueError("event payload must be a JSON object")
+        result = ctx.engine.publish(name, payload)
+        self._json_response({"event": name, "subscribers": sum(len(ids) for ids in result.values()), "result": result})
+
+    def _schedule_forecast(self) -> None:
+        ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
+        query = parse_qs(urlparse(self.path).query)
+        start = parse_iso(query["from"][0]) if query.get("from") else time_now().replace(microsecond=0)
+        if start is None:
+            raise ValueError("from must be an ISO date/time")
+        end = parse_iso(query["to"][0]) if query.get("to") else start + timedelta(days=1)
+        if end is None:
+            raise ValueError("to must be an ISO date/time")
+        if end <= start or end - start > timedelta(days=FORECAST_MAX_DAYS):
+            raise ValueError(f"forecast window must be positive and at most {FORECAST_MAX_DAYS} days")
+        mode = query.get("mode", ["list"])[0]
+        if mode not in FORECAST_MODES:
+            raise ValueError(f"mode must be one of {', '.join(FORECAST_MODES)}")
+        limit = min(max(1, int(query.get("limit", [FORECAST_DEFAULT_LIMIT])[0])), FORECAST_MAX_LIMIT)
+        # 默认窗口起点随时间变化，显式 from 之外按分钟划分缓存
+        generation = (*ctx.db.generation("tasks", "task_results"), isoformat(start.replace(second=0)))
+        self._cached_json_response(
+            "forecast",
+            generation,
+            lambda: build_forecast(
+                ctx.db.fetch_scheduled_tasks(), ctx.db.fetch_mean_durations(), start, end, mode, limit
+            ),
+        )
+
     def _list_accounts(self) -> None:
-        payload = {
-            "data": list_allowed_accounts(),
-            "meta": {
-                "posix_supported": POSIX_ACCOUNT_SUPPORT,
-                "default_account": DEFAULT_ACCOUNT_NAME,
+        generation = []
+        for account_file in ("/etc/passwd", "/etc/group"):
+            try:
+                generation.append(os.stat(account_file).st_mtime_ns)
+            except OSError:
+                generation.append(None)
+        self._cached_json_response(
+            "accounts",
+            tuple(generation),
+            lambda: {
+                "data": list_allowed_accounts(),
+                "meta": {
+                    "posix_supported": POSIX_ACCOUNT_SUPPORT,
+                    "default_account": DEFAULT_ACCOUNT_NAME,
+                },
             },
-        }
-        self._json_response(payload)
+        )
 
     def _handle_tasks(self, method: str, remainder: List[str]) -> None:
         ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
         if method == "GET" and not remainder:
-            tasks = ctx.db.list_tasks()
-            for task in tasks:
-                task["latest_result"] = ctx.db.get_latest_result(task["id"])
-            self._json_response({"data": tasks})
+            def _build() -> Dict[str, Any]:
+                tasks = ctx.db.list_tasks()
+                for task in tasks:
+                    task["latest_result"] = ctx.db.get_latest_result(task["id"])
+                return {"data": tasks}
+
+            self._cached_json_response("tasks", ctx.db.generation("tasks", "task_results"), _build)
             return
         if remainder and remainder[0] == "batch":
             if method != "POST":
@@ -1305,6 +5309,9 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
                 self._toggle_task(task_id, payload)
                 return
             if action == "results":
+                if len(remainder) == 4 and remainder[3] == "cancel" and method == "POST":
+                    self._cancel_result(task_id, int(remainder[2]))
+                    return
                 if method == "GET":
                     self._list_results(task_id)
                     return
@@ -1321,13 +5328,15 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
         # POST /api/templates/import (import mapping), POST /api/templates (create),
         # GET/PUT/DELETE /api/templates/{id}
         if method == "GET" and not remainder:
-            templates = ctx.db.list_templates()
-            self._json_response({"data": templates})
+            self._cached_json_response(
+                "templates",
+                ctx.db.generation("templates"),
+                lambda: {"data": ctx.db.list_templates()},
+            )
             return
         if remainder and remainder[0] == "export" and method == "GET":
-            mapping = ctx.db.export_templates()
             # 返回为原生对象，保持与 templates.json 兼容
-            self._json_response(mapping)
+            self._cached_json_response("templates/export", ctx.db.generation("templates"), ctx.db.export_templates)
             return
         if remainder and remainder[0] == "import" and method == "POST":
             payload = self._read_json()
@@ -1411,11 +5420,10 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
         if not task_ids:
             raise ValueError("task_ids must contain valid task ids")
 
-        if action not in {"delete", "enable", "disable", "run"}:
+        if action not in {"delete", "enable", "disable", "run", "cancel"}:
             raise ValueError("action is not supported")
 
         result: Dict[str, List[int]] = {"missing": []}
-        runners: List[TaskRunner] = []
 
         for task_id in task_ids:
             task = ctx.db.get_task(task_id)
@@ -1440,16 +5448,21 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
                 continue
 
             if action == "run":
-                if ctx.db.has_running_instance(task_id):
-                    result.setdefault("running", []).append(task_id)
-                    continue
                 if not ctx.engine._dependencies_met(task):  # pylint: disable=protected-access
                     result.setdefault("blocked", []).append(task_id)
                     continue
-                runner = TaskRunner(ctx.db, task, "manual")
-                runner.start()
-                runners.append(runner)
+                outcome, _ = ctx.engine.launch(task, "manual")
+                if outcome == "skipped":
+                    result.setdefault("running", []).append(task_id)
+                    continue
                 result.setdefault("queued", []).append(task_id)
+                continue
+
+            if action == "cancel":
+                if ctx.engine.cancel_task(task_id, "cancelled by user"):
+                    result.setdefault("cancelled", []).append(task_id)
+                else:
+                    result.setdefault("not_running", []).append(task_id)
 
         payload = {"action": action, "result": result}
         self._json_response(payload)
@@ -1460,14 +5473,34 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
         if not task:
             self.send_error(HTTPStatus.NOT_FOUND)
             return
-        if ctx.db.has_running_instance(task_id):
-            self._json_response({"error": "task is running"}, status=HTTPStatus.CONFLICT)
-            return
         if not ctx.engine._dependencies_met(task):  # pylint: disable=protected-access
             self._json_response({"error": "dependencies are not met"}, status=HTTPStatus.BAD_REQUEST)
             return
-        TaskRunner(ctx.db, task, "manual").start()
-        self._json_response({"queued": True})
+        outcome, _ = ctx.engine.launch(task, "manual")
+        if outcome == "skipped":
+            self._json_response({"error": "task is running"}, status=HTTPStatus.CONFLICT)
+            return
+        self._json_response({"queued": True, "outcome": outcome})
+
+    def _cancel_result(self, task_id: int, result_id: int) -> None:
+        ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
+        record = ctx.engine.cancel_run(task_id, result_id, "cancelled by user")
+        if record is None:
+            result = ctx.db.fetch_result(task_id, result_id)
+            if not result:
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+            self._json_response({"error": "result is not running", "result": result}, status=HTTPStatus.CONFLICT)
+            return
+        # 进程组通常在 SIGTERM 后很快退出，稍作等待以便直接返回落库后的结果
+        if record.runner:
+            record.runner.join(timeout=1)
+        result = ctx.db.fetch_result(task_id, result_id)
+        finished = bool(result) and result["status"] != "running"
+        self._json_response(
+            {"cancelled": True, "result": result},
+            status=HTTPStatus.OK if finished else HTTPStatus.ACCEPTED,
+        )
 
     def _toggle_task(self, task_id: int, payload: Dict[str, Any]) -> None:
         ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
@@ -1537,7 +5570,7 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
             pass
 
         if action == "list":
-            self._list_fs(target)
+            self._list_fs(target, query)
             return
         if action == "read":
             self._read_fs(target)
@@ -1547,24 +5580,75 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
             return
         self.send_error(HTTPStatus.NOT_FOUND)
 
-    def _list_fs(self, target: str) -> None:
+    def _list_fs(self, target: str, query: Dict[str, List[str]]) -> None:
         # Return JSON listing for directory
+        # 可选参数：limit/cursor 分页，prefix 前缀过滤，pattern 通配符过滤，fields=size,mtime 附加属性
         if not os.path.exists(target):
             self.send_error(HTTPStatus.NOT_FOUND, "Path not found")
             return
         if not os.path.isdir(target):
             self.send_error(HTTPStatus.BAD_REQUEST, "Not a directory")
             return
+        ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
+        try:
+            limit = int(query.get("limit", [0])[0] or 0)
+        except ValueError:
+            self._json_response({"error": "invalid limit"}, status=HTTPStatus.BAD_REQUEST)
+            return
+        if limit <= 0 and "limit" in query:
+            limit = FS_LIST_MAX_LIMIT
+        limit = min(limit, FS_LIST_MAX_LIMIT)
+        cursor = query.get("cursor", [""])[0]
+        prefix = (query.get("prefix", [""])[0] or "").lower()
+        pattern = query.get("pattern", [""])[0] or ""
+        fields = {f.strip() for f in ",".join(query.get("fields", [])).split(",") if f.strip()}
         try:
+            keys, dir_entries = ctx.fs_listing.get(target)
+            start = 0
+            if cursor:
+                try:
+                    start = bisect.bisect_right(keys, DirectoryListingCache.decode_cursor(cursor))
+                except ValueError:
+                    self._json_response({"error": "invalid cursor"}, status=HTTPStatus.BAD_REQUEST)
+                    return
+            name_match = re.compile(fnmatch.translate(pattern)).match if pattern else None
+
+            def matches(key: tuple) -> bool:
+                if prefix and not key[1].startswith(prefix):
+                    return False
+                return name_match is None or name_match(key[2]) is not None
+
             entries = []
-            with os.scandir(target) as it:
-                for entry in sorted(it, key=lambda e: (not e.is_dir(), e.name.lower())):
-                    entries.append({
-                        "name": entry.name,
-                        "path": os.path.join(target, entry.name),
-                        "isdir": entry.is_dir(),
-                    })
-            self._json_response({"files": entries})
+            next_cursor = None
+            for index in range(start, len(keys)):
+                key = keys[index]
+                if not matches(key):
+                    continue
+                if limit and len(entries) >= limit:
+                    next_cursor = DirectoryListingCache.encode_cursor(keys[index - 1])
+                    break
+                entry = dir_entries[index]
+                item: Dict[str, Any] = {
+                    "name": entry.name,
+                    "path": os.path.join(target, entry.name),
+                    "isdir": not key[0],
+                }
+                if fields & {"size", "mtime"}:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        st = None
+                    if "size" in fields:
+                        item["size"] = st.st_size if st else None
+                    if "mtime" in fields:
+                        item["mtime"] = isoformat(datetime.fromtimestamp(st.st_mtime)) if st else None
+                entries.append(item)
+            payload: Dict[str, Any] = {"files": entries}
+            if limit:
+                payload["next_cursor"] = next_cursor
+                # total 只统计符合 prefix/pattern 过滤条件的条目
+                payload["total"] = sum(1 for key in keys if matches(key)) if prefix or pattern else len(keys)
+            self._json_response(payload)
         except PermissionError:
             self._json_response({"error": "permission denied"}, status=HTTPStatus.FORBIDDEN)
         except Exception as exc:
@@ -1582,6 +5666,7 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
         try:
             # attempt to read as text
             with open(target, "rb") as fh:
+                etag = file_etag(os.fstat(fh.fileno()))
                 data = fh.read()
             # Try to decode as UTF-8, fall back to latin-1 to avoid decode errors
             try:
@@ -1589,11 +5674,7 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
             except Exception:
                 text = data.decode("latin-1")
             body = text.encode("utf-8")
-            self.send_response(HTTPStatus.OK)
-            self.send_header("Content-Type", "text/plain; charset=utf-8")
-            self.send_header("Content-Length", str(len(body)))
-            self.end_headers()
-            self.wfile.write(body)
+            self._send_body(body, "text/plain; charset=utf-8", headers={"ETag": etag})
         except PermissionError:
             self.send_error(HTTPStatus.FORBIDDEN, "Permission denied")
         except Exception as exc:
@@ -1601,53 +5682,350 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
             self._json_response({"error": "internal error"}, status=HTTPStatus.INTERNAL_SERVER_ERROR)
 
     def _write_fs(self, target: str) -> None:
-        # Write provided content (JSON body {"content": "..."}) to target path
+        # Write provided content to target path. Two body formats are accepted:
+        #   - application/json: {"content": "..."} (utf-8 text)
+        #   - application/octet-stream: raw bytes, streamed to disk in chunks
+        # The file is written to a temp file in the same directory, fsynced and
+        # atomically renamed over the target. An optional If-Match header holding
+        # the ETag returned by /api/fs/read guards against lost updates.
         try:
-            payload = self._read_json()
-            if payload is None:
-                return
-            if not isinstance(payload, dict) or 'content' not in payload:
-                self._json_response({"error": "missing content"}, status=HTTPStatus.BAD_REQUEST)
-                return
-            content = payload.get('content', '')
-            if not isinstance(content, str):
-                self._json_response({"error": "content must be a string"}, status=HTTPStatus.BAD_REQUEST)
+            content_type = (self.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+            raw_mode = content_type == "application/octet-stream"
+            if raw_mode:
+                try:
+                    length = int(self.headers.get("Content-Length", ""))
+                except ValueError:
+                    self._json_response({"error": "Content-Length required"}, status=HTTPStatus.LENGTH_REQUIRED)
+                    return
+                if length < 0:
+                    self._json_response({"error": "Content-Length required"}, status=HTTPStatus.LENGTH_REQUIRED)
+                    return
+                chunks = self._iter_body(length)
+            else:
+                payload = self._read_json()
+                if payload is None:
+                    return
+                if not isinstance(payload, dict) or 'content' not in payload:
+                    self._json_response({"error": "missing content"}, status=HTTPStatus.BAD_REQUEST)
+                    return
+                content = payload.get('content', '')
+                if not isinstance(content, str):
+                    self._json_response({"error": "content must be a string"}, status=HTTPStatus.BAD_REQUEST)
+                    return
+                chunks = iter((content.encode('utf-8'),))
+            # 目标是符号链接时写入其指向的文件，而不是把链接本身替换成普通文件
+            real_target = os.path.realpath(target)
+            if not self._check_if_match(real_target):
+                self._discard_body(chunks)
                 return
-            parent = os.path.dirname(target) or '/'
+            parent = os.path.dirname(real_target) or '/'
             # Ensure parent directory exists (try to create)
             if not os.path.exists(parent):
                 try:
                     os.makedirs(parent, exist_ok=True)
                 except Exception:
+                    self._discard_body(chunks)
                     self._json_response({"error": "parent directory missing and cannot be created"}, status=HTTPStatus.BAD_REQUEST)
                     return
-            # write file (utf-8)
             try:
-                with open(target, 'wb') as fh:
-                    fh.write(content.encode('utf-8'))
-                self._json_response({"written": True, "path": target})
+                written = self._atomic_write(real_target, parent, chunks)
             except PermissionError:
+                self._discard_body(chunks)
                 self._json_response({"error": "permission denied"}, status=HTTPStatus.FORBIDDEN)
+                return
+            except ConnectionError:
+                self._discard_body(chunks)
+                self._json_response({"error": "incomplete request body"}, status=HTTPStatus.BAD_REQUEST)
+                return
             except Exception as exc:
                 logger.exception("_write_fs error: %s", exc)
+                self._discard_body(chunks)
                 self._json_response({"error": "internal error"}, status=HTTPStatus.INTERNAL_SERVER_ERROR)
+                return
+            if written is None:
+                # target changed while the body was being received
+                self._json_response({"error": "file was modified by someone else"}, status=HTTPStatus.PRECONDITION_FAILED)
+                return
+            self._json_response({"written": True, "path": target, "size": written[0], "etag": written[1]})
         except Exception as exc:
             logger.exception("_write_fs top-level error: %s", exc)
             self._json_response({"error": "internal error"}, status=HTTPStatus.INTERNAL_SERVER_ERROR)
 
+    def _iter_body(self, length: int):
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(FS_WRITE_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise ConnectionError("client closed connection before sending full body")
+            remaining -= len(chunk)
+            yield chunk
+        self._body_consumed = True
+
+    @staticmethod
+    def _discard_body(chunks) -> None:
+        try:
+            for _ in chunks:
+                pass
+        except Exception:
+            pass
+
+    def _check_if_match(self, target: str) -> bool:
+        expected = (self.headers.get("If-Match") or "").strip()
+        if not expected:
+            return True
+        try:
+            current = file_etag(os.stat(target))
+        except FileNotFoundError:
+            current = None
+        if current is not None and (expected == "*" or current in [tag.strip() for tag in expected.split(",")]):
+            return True
+        self._json_response({"error": "file was modified by someone else", "etag": current}, status=HTTPStatus.PRECONDITION_FAILED)
+        return False
+
+    def _atomic_write(self, target: str, parent: str, chunks) -> Optional[tuple[int, str]]:
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(target)}.", suffix=".tmp", dir=parent)
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+                    size += len(chunk)
+                fh.flush()
+                os.fsync(fh.fileno())
+            try:
+                # 保留原文件的权限与属主（例如脚本的可执行位）
+                st = os.stat(target)
+                os.chmod(tmp_path, st.st_mode & 0o7777)
+                if hasattr(os, "chown") and os.geteuid() == 0:
+                    os.chown(tmp_path, st.st_uid, st.st_gid)
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o644)
+            expected = (self.headers.get("If-Match") or "").strip()
+            if expected and expected != "*":
+                try:
+                    current = file_etag(os.stat(target))
+                except FileNotFoundError:
+                    current = None
+                if current not in [tag.strip() for tag in expected.split(",")]:
+                    os.unlink(tmp_path)
+                    return None
+            os.replace(tmp_path, target)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        try:
+            dir_fd = os.open(parent, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+        return size, file_etag(os.stat(target))
+
+    def _serve_static(self) -> None:
+        ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
+        store = ctx.static_assets
+        if store is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "Unsupported path")
+            return
+        parsed = urlsplit(self.path)
+        rel_path = unquote(parsed.path)
+        if rel_path in ("", "/"):
+            rel_path = "/index.html"
+        asset = store.lookup(rel_path)
+        if asset is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+        use_gz = asset.gz_path is not None and negotiate_encoding(self.headers.get("Accept-Encoding")) == "gzip"
+        etag = f'"{asset.digest}-gz"' if use_gz else f'"{asset.digest}"'
+        # 带 ?v=<内容摘要前缀> 的请求视为版本化资源，可被浏览器永久缓存
+        version = parse_qs(parsed.query).get("v", [""])[0]
+        if version and len(version) >= 8 and asset.digest.startswith(version):
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            cache_control = "no-cache"
+        headers = {
+            "ETag": etag,
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": cache_control,
+        }
+        if asset.gz_path is not None:
+            headers["Vary"] = "Accept-Encoding"
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            candidates = {tag.strip() for tag in if_none_match.split(",")}
+            if etag in candidates or "*" in candidates:
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+        file_path = asset.gz_path if use_gz else asset.path
+        size = asset.gz_size if use_gz else asset.size
+        try:
+            fh = open(file_path, "rb")  # type: ignore[arg-type]
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+        with fh:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", asset.content_type)
+            self.send_header("Content-Length", str(size))
+            if use_gz:
+                self.send_header("Content-Encoding", "gzip")
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            if self.command == "HEAD":
+                return
+            try:
+                self.connection.sendfile(fh, 0, size)
+            except (AttributeError, OSError):
+                fh.seek(0)
+                self.wfile.write(fh.read(size))
+
+    def _handle_debug(self, method: str, remainder: List[str]) -> None:
+        ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
+        # 支持：POST /api/debug/profile[/stop]，GET/POST /api/debug/tracemalloc，GET /api/debug/threads
+        if not self._require_debug_access():
+            return
+        query = parse_qs(urlparse(self.path).query)
+        if remainder == ["threads"] and method == "GET":
+            kinds = {kind for value in query.get("kind", []) for kind in value.split(",") if kind}
+            self._json_response({"data": dump_threads(kinds or None)})
+            return
+        if remainder == ["profile", "stop"] and method == "POST":
+            self._json_response({"stopped": ctx.diagnostics.stop_profile()})
+            return
+        if remainder == ["profile"] and method == "POST":
+            payload = self._read_json()
+            if payload is None:
+                return
+            mode = payload.get("mode", "sample")
+            if mode not in DEBUG_PROFILE_MODES:
+                raise ValueError(f"mode must be one of {', '.join(DEBUG_PROFILE_MODES)}")
+            seconds = float(payload.get("seconds", 10))
+            if not 0 < seconds <= DEBUG_PROFILE_MAX_SECONDS:
+                raise ValueError(f"seconds must be between 0 and {DEBUG_PROFILE_MAX_SECONDS}")
+            interval = float(payload.get("interval", DEBUG_SAMPLE_INTERVAL))
+            if not 0.001 <= interval <= 1:
+                raise ValueError("interval must be between 0.001 and 1 seconds")
+            sort = payload.get("sort", "cumulative")
+            if sort not in pstats.Stats.sort_arg_dict_default:
+                raise ValueError(f"unsupported sort key: {sort}")
+            limit = min(max(1, int(payload.get("limit", 50))), 1000)
+            report = ctx.diagnostics.profile(mode, seconds, interval, sort, limit)
+            if report is None:
+                self._json_response({"error": "a profiling run is already active"}, status=HTTPStatus.CONFLICT)
+                return
+            self._send_body(report.encode("utf-8"), "text/plain; charset=utf-8")
+            return
+        if remainder == ["tracemalloc"] and method == "POST":
+            payload = self._read_json()
+            if payload is None:
+                return
+            action = payload.get("action")
+            if action == "start":
+                frames = int(payload.get("frames", 1))
+                if not 1 <= frames <= 64:
+                    raise ValueError("frames must be between 1 and 64")
+                ctx.diagnostics.start_tracemalloc(frames)
+            elif action == "stop":
+                ctx.diagnostics.stop_tracemalloc()
+            else:
+                raise ValueError("action must be start or stop")
+            self._json_response({"tracing": tracemalloc.is_tracing()})
+            return
+        if remainder == ["tracemalloc"] and method == "GET":
+            key = query.get("key", ["lineno"])[0]
+            if key not in DEBUG_TRACEMALLOC_KEYS:
+                raise ValueError(f"key must be one of {', '.join(DEBUG_TRACEMALLOC_KEYS)}")
+            limit = min(max(1, int(query.get("limit", [25])[0])), 1000)
+            diff = query.get("diff", ["0"])[0] in ("1", "true")
+            self._json_response(ctx.diagnostics.tracemalloc_report(key, limit, diff))
+            return
+        self.send_error(HTTPStatus.NOT_FOUND, "Endpoint not found")
+
+    def _require_debug_access(self) -> bool:
+        # 只接受直接连到 unix socket 的 root 或服务自身用户；经 UI 代理转发（带 X-Forwarded-For）或 TCP 的请求一律拒绝
+        if self.connection.family != socket.AF_UNIX or self.headers.get("X-Forwarded-For"):
+            self._json_response(
+                {"error": "debug api is only served to local clients of the unix socket"}, status=HTTPStatus.FORBIDDEN
+            )
+            return False
+        try:
+            credentials = self.connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+            _, uid, _ = struct.unpack("3i", credentials)
+        except (AttributeError, OSError):
+            uid = -1
+        if uid not in (0, os.geteuid()):
+            self._json_response({"error": "debug api requires root"}, status=HTTPStatus.FORBIDDEN)
+            return False
+        return True
+
     def _health(self) -> None:
         ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
-        tasks = ctx.db.list_tasks()
+        # 响应中包含当前时间，不做整体缓存；任务数量用 COUNT 查询代替反序列化全部任务
         payload = {
             "time": isoformat(time_now()),
-            "task_count": len(tasks),
+            "task_count": ctx.db.count_tasks(),
         }
         self._json_response(payload)
 
+    def _health_live(self) -> None:
+        ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
+        # 只读内存状态，不触碰数据库；主循环停滞时返回 503
+        health = ctx.engine.health()
+        alive = not health["loop"]["stalled"]
+        payload = {
+            "status": "ok" if alive else "stalled",
+            "time": isoformat(time_now()),
+            "loop": health["loop"],
+            "timer": health["timer"],
+        }
+        self._json_response(payload, status=HTTPStatus.OK if alive else HTTPStatus.SERVICE_UNAVAILABLE)
+
+    def _health_ready(self) -> None:
+        ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
+        health = ctx.engine.health()
+        database: Dict[str, Any] = {"ok": True}
+        try:
+            database["latency_ms"] = round(ctx.db.ping() * 1000, 3)
+        except (TimeoutError, sqlite3.Error) as exc:
+            database = {"ok": False, "error": str(exc)}
+        spawn_tokens = SPAWN_LIMITER.available()
+        workers = {
+            **health["runs"],
+            "spawn_tokens": round(spawn_tokens, 2),
+            "spawn_waiting": SPAWN_LIMITER.waiting,
+            "http_in_flight": self.server.in_flight,  # type: ignore[attr-defined]
+            # 有任务在等进程启动令牌即视为饱和
+            "saturated": SPAWN_LIMITER.waiting > 0,
+        }
+        draining = bool(getattr(self.server, "draining", False))
+        ready = not health["loop"]["stalled"] and database["ok"] and not draining
+        payload = {
+            "ready": ready,
+            "time": isoformat(time_now()),
+            "loop": health["loop"],
+            "timer": health["timer"],
+            "database": database,
+            "draining": draining,
+            "workers": workers,
+            "oldest_queued_seconds": health["oldest_queued_seconds"],
+            "oldest_deferred_seconds": health["oldest_deferred_seconds"],
+        }
+        self._json_response(payload, status=HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE)
+
     # Utilities -----------------------------------------------------------
     def _read_json(self) -> Optional[Dict[str, Any]]:
         length = int(self.headers.get("Content-Length", "0"))
         raw = self.rfile.read(length) if length else b""
+        self._body_consumed = True
         if not raw:
             return {}
         try:
@@ -1658,11 +6036,89 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
 
     def _json_response(self, payload: Any, status: HTTPStatus | int = HTTPStatus.OK) -> None:
         body = json.dumps(payload).encode("utf-8")
+        self._send_body(body, "application/json; charset=utf-8", status=status)
+
+    def _send_body(
+        self,
+        body: bytes,
+        content_type: str,
+        status: HTTPStatus | int = HTTPStatus.OK,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        encoding = None
+        vary = len(body) >= HTTP_COMPRESS_MIN_SIZE
+        if vary:
+            encoding = negotiate_encoding(self.headers.get("Accept-Encoding"))
+            if encoding:
+                body = compress_body(body, encoding)
+        self._send_encoded(body, content_type, encoding, vary, status=status, headers=headers)
+
+    def _send_encoded(
+        self,
+        body: bytes,
+        content_type: str,
+        encoding: Optional[str],
+        vary: bool,
+        status: HTTPStatus | int = HTTPStatus.OK,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
         self.send_response(status)
-        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Type", content_type)
         self.send_header("Content-Length", str(len(body)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if vary:
+            self.send_header("Vary", "Accept-Encoding")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(body)
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _cached_json_response(self, route: str, generation: Any, build: Callable[[], Any]) -> None:
+        """Answer from the response cache, calling ``build`` only on a miss."""
+
+        ctx: SchedulerContext = self.server.app_context  # type: ignore[attr-defined]
+        key = (route, urlsplit(self.path).query)
+        variants = ctx.response_cache.get(key, generation)
+        if variants is None:
+            body = json.dumps(build()).encode("utf-8")
+            variants = ctx.response_cache.put(key, generation, body)
+        identity_size = len(variants["identity"])
+        encoding = negotiate_encoding(self.headers.get("Accept-Encoding"))
+        body, encoding = ResponseCache.variant(variants, encoding)
+        self._send_encoded(body, "application/json; charset=utf-8", encoding, identity_size >= HTTP_COMPRESS_MIN_SIZE)
+
+    def handle_one_request(self) -> None:
+        profile_checkpoint()
+        self._in_flight = False
+        try:
+            super().handle_one_request()
+        finally:
+            if self._in_flight:
+                self.server.end_request()  # type: ignore[attr-defined]
+
+    def parse_request(self) -> bool:
+        self._body_consumed = False
+        if not super().parse_request():
+            return False
+        if not self.server.begin_request():  # type: ignore[attr-defined]
+            self.close_connection = True
+            self.send_error(HTTPStatus.SERVICE_UNAVAILABLE, "Scheduler is shutting down")
+            return False
+        self._in_flight = True
+        return True
+
+    def end_headers(self) -> None:
+        # 长连接下若请求体未被读取，会被误当作下一个请求解析，此时改为关闭连接
+        if not self.close_connection and not self._body_consumed and getattr(self, "headers", None) is not None:
+            try:
+                pending = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                pending = 1
+            if pending > 0 or self.headers.get("Transfer-Encoding"):
+                self.send_header("Connection", "close")
+        super().end_headers()
 
     def log_message(self, format_: str, *args: Any) -> None:  # noqa: D401
         ca = getattr(self, "client_address", None)
@@ -1680,6 +6136,7 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
         self.send_response(HTTPStatus.UNAUTHORIZED)
         self.send_header("WWW-Authenticate", f'Basic realm="{realm}", charset="UTF-8"')
         self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", "23")
         self.end_headers()
         self.wfile.write(b"Authentication required")
 
@@ -1704,18 +6161,78 @@ class SchedulerRequestHandler(BaseHTTPRequestHandler):
 # Entrypoint
 ###############################################################################
 
+def exec_handover(state: Dict[str, Any], keep_fds: List[int]) -> None:
+    """Re-exec this daemon in place, passing ``state`` through an inherited file.
+
+    Running children stay children of the same pid, so their exit status is
+    still collected, and the pid file written by ``cmd/main`` stays valid.
+    Only returns if ``execv`` fails.
+    """
+
+    handover = tempfile.TemporaryFile()
+    handover.write(json.dumps(state).encode("utf-8"))
+    handover.flush()
+    handover.seek(0)
+    for fd in [*keep_fds, handover.fileno()]:
+        os.set_inheritable(fd, True)
+    os.environ[HANDOVER_FD_ENV] = str(handover.fileno())
+    try:
+        os.execv(sys.executable, [sys.executable, *sys.argv])
+    finally:
+        os.environ.pop(HANDOVER_FD_ENV, None)
+        handover.close()
+
+
+def load_handover_state() -> Optional[Dict[str, Any]]:
+    """Read the state left by :func:`exec_handover`, if this process was started by one."""
+
+    raw = os.environ.pop(HANDOVER_FD_ENV, None)
+    if not raw:
+        return None
+    try:
+        with os.fdopen(int(raw), "rb") as handover:
+            return json.loads(handover.read())
+    except (OSError, ValueError) as exc:
+        logger.warning("Ignoring invalid handover state: %s", exc)
+        return None
+
+
+def handover_restart(httpd: "SchedulerHTTPServer", engine: SchedulerEngine, database: Database) -> None:
+    """Hand the listener and live runs over to a fresh copy of this daemon."""
+
+    if not httpd.drain():
+        logger.warning("HTTP requests still in flight after %ss, continuing handover", HTTP_DRAIN_TIMEOUT)
+    state = engine.handover()
+    state["listen_fd"] = httpd.fileno()
+    keep_fds = [httpd.fileno()] + [fd for run in state["runs"] for fd in run["stream_fds"]]
+    logger.info("Handing over %d running task(s) to a new scheduler process", len(state["runs"]))
+    database.close()
+    try:
+        exec_handover(state, keep_fds)
+    except OSError:
+        logger.exception("Handover re-exec failed; detached runs will be reconciled on next start")
+
+
 def run_server(
     db_path: str,
     base_path: str = "/",
     prefer_ipv6: bool = False,
     unix_socket: Optional[str] = None,
+    www_root: Optional[str] = None,
+    shutdown_deadline: float = SHUTDOWN_DEADLINE,
 ) -> None:
     db_path = strip_wrapping_quotes(db_path) or DEFAULT_DB_PATH
     base_path = strip_wrapping_quotes(base_path) or "/"
 
+    handover = load_handover_state()
     database = Database(db_path)
-    engine = SchedulerEngine(database)
-    ctx = SchedulerContext(database, engine)
+    engine = SchedulerEngine(database, shutdown_deadline=shutdown_deadline)
+    static_assets = None
+    www_root = strip_wrapping_quotes(www_root)
+    if www_root:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), "www-cache")
+        static_assets = StaticAssetStore(www_root, cache_dir)
+    ctx = SchedulerContext(database, engine, static_assets)
     handler_class = SchedulerRequestHandler
     normalized_base = normalize_base_path(base_path)
 
@@ -1732,6 +6249,7 @@ def run_server(
             prefer_ipv6=prefer_ipv6,
             unix_socket_path=unix_socket,
             bind_and_activate=False,
+            listen_fd=handover.get("listen_fd") if handover else None,
         )
     else:
         httpd = SchedulerHTTPServer(
@@ -1739,6 +6257,7 @@ def run_server(
             handler_class,
             base_path=normalized_base,
             prefer_ipv6=prefer_ipv6,
+            listen_fd=handover.get("listen_fd") if handover else None,
         )
     httpd.app_context = ctx  # type: ignore[attr-defined]
 
@@ -1746,6 +6265,7 @@ def run_server(
     scheme = "http"
 
     shutdown_event = threading.Event()
+    restart_requested = threading.Event()
     created_unix_socket = unix_socket if unix_socket else None
 
     def _handle_signal(signum: int, _: Any | None) -> None:
@@ -1755,9 +6275,19 @@ def run_server(
         logger.info("Received signal %s, shutting down scheduler...", signum)
         threading.Thread(target=httpd.shutdown, daemon=True).start()
 
+    def _handle_restart(signum: int, _: Any | None) -> None:
+        if shutdown_event.is_set():
+            return
+        shutdown_event.set()
+        restart_requested.set()
+        logger.info("Received signal %s, restarting scheduler with handover...", signum)
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
     for sig_name in ("SIGINT", "SIGTERM"):
         if hasattr(signal, sig_name):
             signal.signal(getattr(signal, sig_name), _handle_signal)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, _handle_restart)
 
     if unix_socket:
         logger.info(
@@ -1776,15 +6306,23 @@ def run_server(
             normalized_base,
             db_path,
         )
-    engine.start()
+    engine.start(handover)
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
         logger.info("Shutting down scheduler...")
     finally:
-        engine.stop()
-        database.close()
-        httpd.server_close()
+        if restart_requested.is_set():
+            # exec 成功时不会返回；失败时按普通退出处理，监听套接字不再保留
+            handover_restart(httpd, engine, database)
+            httpd.server_close()
+        else:
+            # 先关闭监听并排空在途请求，避免关机任务执行期间继续受理新的操作
+            httpd.server_close()
+            if not httpd.drain():
+                logger.warning("HTTP requests still in flight after %ss, continuing shutdown", HTTP_DRAIN_TIMEOUT)
+            engine.stop()
+            database.close()
         # cleanup unix socket file if we created one
         if created_unix_socket:
             try:
@@ -1811,14 +6349,76 @@ def parse_args() -> argparse.Namespace:
         default=os.environ.get("SCHEDULER_BASE_PATH", "/"),
         help="Base URL path to mount the scheduler under (default '/')",
     )
+    parser.add_argument(
+        "--www-root",
+        dest="www_root",
+        default=os.environ.get("SCHEDULER_WWW_ROOT"),
+        help="Serve static UI files from this directory (default: disabled)",
+    )
+    parser.add_argument(
+        "--shutdown-deadline",
+        dest="shutdown_deadline",
+        type=float,
+        default=SHUTDOWN_DEADLINE,
+        help="Seconds allowed for shutdown event tasks before they are terminated (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Replay the schedule of --db on a virtual clock, print a JSON summary and exit",
+    )
+    parser.add_argument(
+        "--sim-from",
+        dest="sim_from",
+        help="Start of the simulated range, ISO 8601 (default: now)",
+    )
+    parser.add_argument(
+        "--sim-to",
+        dest="sim_to",
+        help="End of the simulated range, ISO 8601 (default: 7 days after --sim-from)",
+    )
+    parser.add_argument(
+        "--sim-seed",
+        dest="sim_seed",
+        type=int,
+        default=0,
+        help="Seed for sampling run durations (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--sim-timeline",
+        dest="sim_timeline",
+        help="Write every simulated dispatch, start and finish to this JSON Lines file",
+    )
     return parser.parse_args()
 
 
+def simulate_main(args: argparse.Namespace) -> int:
+    try:
+        start = parse_iso(args.sim_from) if args.sim_from else time_now().replace(microsecond=0)
+        if start is None:
+            raise ValueError(f"invalid --sim-from: {args.sim_from}")
+        end = parse_iso(args.sim_to) if args.sim_to else start + timedelta(days=7)
+        if end is None:
+            raise ValueError(f"invalid --sim-to: {args.sim_to}")
+        summary = run_simulation(args.db, start, end, args.sim_seed, args.sim_timeline)
+    except ValueError as exc:
+        print(f"simulation failed: {exc}", file=sys.stderr)
+        return 2
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
 if __name__ == "__main__":
     args = parse_args()
+    if args.simulate:
+        # 模拟过程中的逐条调度日志没有意义，只保留警告
+        logger.setLevel(logging.WARNING)
+        sys.exit(simulate_main(args))
     run_server(
         args.db,
         base_path=args.base_path,
         prefer_ipv6=False,
         unix_socket=args.unix_socket,
+        www_root=args.www_root,
+        shutdown_deadline=args.shutdown_deadline,
     )
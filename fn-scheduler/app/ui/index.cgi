@@ -58,12 +58,14 @@ if [[ $REL_PATH == /api* ]]; then
 
   # 收集所有 HTTP 请求头
   curl_args=(-sS -D "$HDR_TMP" -o "$OUT_BODY" -X "$REQUEST_METHOD")
-  for hdr in CONTENT_TYPE HTTP_AUTHORIZATION REDIRECT_HTTP_AUTHORIZATION HTTP_ACCEPT HTTP_COOKIE HTTP_USER_AGENT HTTP_REFERER; do
+  for hdr in CONTENT_TYPE HTTP_AUTHORIZATION REDIRECT_HTTP_AUTHORIZATION HTTP_ACCEPT HTTP_ACCEPT_ENCODING HTTP_IF_MATCH HTTP_COOKIE HTTP_USER_AGENT HTTP_REFERER; do
     val="${!hdr}"
     case "$hdr" in
       CONTENT_TYPE) [ -n "$val" ] && curl_args+=(-H "Content-Type: $val") ;;
       HTTP_AUTHORIZATION | REDIRECT_HTTP_AUTHORIZATION) [ -n "$val" ] && curl_args+=(-H "Authorization: $val") ;;
       HTTP_ACCEPT) [ -n "$val" ] && curl_args+=(-H "Accept: $val") ;;
+      HTTP_ACCEPT_ENCODING) [ -n "$val" ] && curl_args+=(-H "Accept-Encoding: $val") ;;
+      HTTP_IF_MATCH) [ -n "$val" ] && curl_args+=(-H "If-Match: $val") ;;
       HTTP_COOKIE) [ -n "$val" ] && curl_args+=(-H "Cookie: $val") ;;
       HTTP_USER_AGENT) [ -n "$val" ] && curl_args+=(-H "User-Agent: $val") ;;
       HTTP_REFERER) [ -n "$val" ] && curl_args+=(-H "Referer: $val") ;;
@@ -101,7 +103,8 @@ if [[ $REL_PATH == /api* ]]; then
   fi
 
   # 透传部分响应头
-  grep -i -E '^(Set-Cookie:|Cache-Control:|Expires:|Access-Control-Allow-|Content-Disposition:)' "$HDR_TMP" | while read -r h; do
+  # 后端按 Accept-Encoding 压缩的响应体原样转发（curl 未加 --compressed，不会解压）
+  grep -i -E '^(Set-Cookie:|Cache-Control:|Expires:|Access-Control-Allow-|Content-Disposition:|Content-Encoding:|Vary:|ETag:)' "$HDR_TMP" | while read -r h; do
     echo "$h"
   done
 